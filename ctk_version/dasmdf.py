@@ -5,7 +5,7 @@ CustomTkinter Version - Multi Engine Integration
 A simple GUI application for converting Markdown files to PDF format.
 """
 
-import asyncio
+import multiprocessing
 import os
 import subprocess
 import sys
@@ -17,16 +17,22 @@ from pathlib import Path
 from tkinter import filedialog, messagebox
 
 import customtkinter as ctk
-import markdown2
-import pdfkit
-from playwright.async_api import async_playwright
-from pygments.formatters import HtmlFormatter
-from weasyprint import HTML
+
+# Make the shared dasmdf core package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dasmdf import (  # noqa: E402
+    ConversionJob, WorkerPool, find_wkhtmltopdf, isolate_parses, render_html
+)
+from uiqueue import UiQueue  # noqa: E402
 
 
 class MarkdownToPDFConverter:
     def __init__(self):
-        self.wkhtmltopdf_path = self.find_wkhtmltopdf()
+        self.wkhtmltopdf_path = find_wkhtmltopdf()
+        self.converter = WorkerPool(
+            wkhtmltopdf_path=self.wkhtmltopdf_path, timeout=600
+        )
         self.engine = "playwright"
         self.setup_window()
         self.create_widgets()
@@ -173,6 +179,9 @@ class MarkdownToPDFConverter:
             row=4, column=0, columnspan=2, padx=10, pady=(0, 10)
         )
 
+        # Conversion threads reach the widgets only through this queue
+        self.ui = UiQueue(self.root, self.progress_bar, self.status_label)
+
         # Add some default content
         self.add_default_content()
 
@@ -273,8 +282,9 @@ def hello_world():
         }"""
             self.css_textbox.insert("1.0", default_css)
 
-    def save_default_css(self):
-        css_content = self.css_textbox.get("0.0", "end-1c")
+    def save_default_css(self, css_content=None):
+        if css_content is None:
+            css_content = self.css_textbox.get("0.0", "end-1c")
         try:
             css_dir = os.path.expanduser("~/.dasmdf")
             os.makedirs(css_dir, exist_ok=True)
@@ -298,8 +308,7 @@ def hello_world():
                 messagebox.showerror("Error", f"Failed to load CSS: {str(e)}")
     
     def update_status(self, message):
-        self.status_label.configure(text=message)
-        self.root.update_idletasks()
+        self.ui.post_status(message)
 
     def load_md_file(self):
         file_path = filedialog.askopenfilename(
@@ -331,46 +340,6 @@ def hello_world():
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load file: {e}")
 
-    def md_to_html(self, md_content, css_content, pdfTitle="DasMDF Preview"):
-        """Convert markdown to HTML with CSS styling."""
-        # Convert markdown to HTML
-        html_body = markdown2.markdown(
-            md_content,
-            extras=[
-                'strike', 'fenced-code-blocks', 'codehilite', 'tables',
-                'toc', 'attr_list', 'latex'
-            ]
-        )
-        pygments_css = HtmlFormatter(style="default").get_style_defs(
-            '.codehilite'
-        )
-
-        # Create full HTML document
-        html_content = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{pdfTitle}</title>
-    <style>
-    pre, code {{
-            white-space: pre-wrap;
-            word-break: break-word;
-            overflow-wrap: anywhere;
-            }}
-        {css_content}
-        {pygments_css}
-    </style>
-    <script src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>
-
-</head>
-<body>
-    {html_body}
-</body>
-</html>"""
-
-        return html_content
-
     def preview_doc(self):
         """Preview the markdown document in browser."""
         md_content = self.md_textbox.get("1.0", tk.END).strip()
@@ -384,7 +353,7 @@ def hello_world():
 
         try:
             # Convert to HTML
-            html_content = self.md_to_html(md_content, css_content)
+            html_content = render_html(md_content, css_content)
 
             # Create temporary HTML file
             with tempfile.NamedTemporaryFile(
@@ -402,9 +371,6 @@ def hello_world():
 
     def convert_pdf(self):
         """Convert markdown to PDF using the selected engine."""
-        self.update_status("Starting PDF conversion...")
-        self.progress_bar.set(0.1)
-
         self.engine = self.engine_var.get()
         if self.engine not in ["playwright", "weasyprint", "wkhtml"]:
             messagebox.showerror(
@@ -412,7 +378,9 @@ def hello_world():
             )
             return
 
+        # Widgets are read here; the conversion thread gets plain strings
         md_content = self.md_textbox.get("0.0", "end-1c").strip()
+        css_content = self.css_textbox.get("0.0", "end-1c").strip()
         if not md_content:
             messagebox.showerror(
                 "Error", "No markdown content to convert!"
@@ -442,276 +410,76 @@ def hello_world():
             return
 
         if output_path:
-            if self.engine == "weasyprint":
-                thread = threading.Thread(
-                    target=self.convert_to_pdf_thread_weasyprint,
-                    args=(output_path, pdfTitle)
-                )
-                thread.daemon = True
-                thread.start()
-            elif self.engine == "wkhtml":
-                thread = threading.Thread(
-                    target=self.convert_to_pdf_thread_wkhtml,
-                    args=(output_path, pdfTitle)
-                )
-                thread.daemon = True
-                thread.start()
-            elif self.engine == "playwright":
-                thread = threading.Thread(
-                    target=self.convert_to_pdf_thread_playwright,
-                    args=(output_path, pdfTitle)
-                )
-                thread.daemon = True
-                thread.start()
-
-    def find_wkhtmltopdf(self):
-        """Find the wkhtmltopdf executable in the system PATH."""
-        # First, try searching in PATH
-        for path in os.environ["PATH"].split(os.pathsep):
-            exe_path = Path(path) / "wkhtmltopdf"
-            if exe_path.exists() and exe_path.is_file():
-                return str(exe_path)
-
-        # Then, try common installation paths (Windows)
-        common_paths = [
-            r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            "wkhtmltopdf"  # If in PATH as a command
-        ]
-        for path in common_paths:
-            try:
-                if os.path.exists(path):
-                    return path
-                elif path == "wkhtmltopdf":
-                    subprocess.run(
-                        [path, "--version"], capture_output=True, check=True
-                    )
-                    return path
-            except Exception:
-                continue
-        return None
-
-    def convert_to_pdf_thread_wkhtml(self, output_path, pdfTitle):
-        """Convert markdown to PDF using wkhtmltopdf."""
-        md_content = self.md_textbox.get("1.0", tk.END).strip()
-        css_content = self.css_textbox.get("1.0", tk.END).strip()
-
-        self.progress_bar.set(0.3)
-        self.update_status("Preparing conversion with wkhtmltopdf...")
-
-        if not md_content:
-            messagebox.showwarning(
-                "Warning", "Please add some markdown content!"
-            )
-            return
-
-        file_path = output_path
-
-        if not file_path:
-            return
-
-        try:
-            # Convert to HTML
-            self.progress_bar.set(0.5)
-            self.update_status(
-                "[WKHTMLTOPDF] Converting Markdown to HTML..."
-            )
-
-            html_content = self.md_to_html(md_content, css_content, pdfTitle)
-
-            self.progress_bar.set(0.8)
-            self.update_status(
-                "Generating high-quality PDF with wkhtmltopdf..."
-            )
-            # Configure wkhtmltopdf options
-            options = {
-                'page-size': 'A4',
-                # 'margin-top': '20mm',
-                # 'margin-right': '20mm',
-                # 'margin-bottom': '20mm',
-                # 'margin-left': '20mm',
-                'encoding': "UTF-8",
-                'no-outline': None,
-                'enable-local-file-access': None,
-                'print-media-type': None,
-                'disable-smart-shrinking': None,
-                'dpi': 300,
-                'image-dpi': 300,
-                'image-quality': 100,
-                'lowquality': False,
-                'minimum-font-size': 8,
-                'zoom': 1.0
-            }
-
-            options['enable-javascript'] = None
-            options['javascript-delay'] = 1000
-
-            # Set the path to wkhtmltopdf if we found it
-            config = (
-                pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf_path)
-                if self.wkhtmltopdf_path != "wkhtmltopdf"
-                else None
-            )
-
-            # Convert to PDF using pdfkit
-            pdfkit.from_string(
-                html_content, file_path, options=options, configuration=config
-            )
-
-            self.progress_bar.set(1.0)
-            self.update_status(
-                f"PDF saved successfully: {Path(file_path).name}"
-            )
-
-            save_default_css = self.css_textbox.get("0.0", "end-1c")
-            if save_default_css.strip():    
-                self.save_default_css()
-
-            if messagebox.askyesno(
-                "Success",
-                f"PDF created successfully!\n\nFile: {Path(file_path).name}\n\nOpen the file now?"
-            ):
-                if os.name == 'nt':
-                    os.startfile(file_path)
-                elif sys.platform == 'darwin':
-                    subprocess.run(['open', file_path])
-                else:
-                    subprocess.run(['xdg-open', file_path])
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to convert to PDF: {e}")
-
-    def convert_to_pdf_thread_weasyprint(self, output_path, pdfTitle):
-        """Convert markdown to PDF using WeasyPrint."""
-        self.progress_bar.set(0.3)
-        self.update_status("Preparing conversion with weasyprint...")
-
-        md_content = self.md_textbox.get("1.0", tk.END).strip()
-        css_content = self.css_textbox.get("1.0", tk.END).strip()
-
-        if not md_content:
-            messagebox.showwarning(
-                "Warning", "Please add some markdown content!"
+            self.update_status("Starting PDF conversion...")
+            self.ui.post_progress(0.1)
+            thread = threading.Thread(
+                target=self.convert_to_pdf_thread,
+                args=(output_path, pdfTitle, md_content, css_content,
+                      self.engine)
             )
-            return
+            thread.daemon = True
+            thread.start()
 
-        self.progress_bar.set(0.5)
-        self.update_status("[WEASYPRINT] Converting Markdown to HTML...")
+    def convert_to_pdf_thread(self, output_path, pdfTitle, md_content,
+                              css_content, engine):
+        """Convert markdown to PDF with the selected engine.
 
-        if not output_path:
-            return
+        Runs off the main loop, so every widget update and dialog goes
+        through ``self.ui``.
+        """
+        def on_event(event):
+            self.ui.post_progress(event.progress)
+            self.ui.post_status(event.message)
 
         try:
-            self.progress_bar.set(0.7)
-            self.update_status("Generating PDF with WeasyPrint...")
-
-            # Convert to HTML
-            html_content = self.md_to_html(md_content, css_content, pdfTitle)
-
-            # Convert HTML to PDF using WeasyPrint
-            html_doc = HTML(string=html_content)
-            html_doc.write_pdf(output_path)
-
-            self.progress_bar.set(1.0)
-            self.update_status(
-                f"PDF saved successfully: {Path(output_path).name}"
+            self.converter.convert(
+                ConversionJob(
+                    md_content, output_path, engine, css_content, pdfTitle
+                ),
+                on_event
             )
-
-            save_default_css = self.css_textbox.get("0.0", "end-1c")
-            if save_default_css.strip():    
-                self.save_default_css()
-
-            if messagebox.askyesno(
-                "Success",
-                f"PDF created successfully!\n\nFile: {Path(output_path).name}\n\nOpen the file now?"
-            ):
-                if os.name == 'nt':
-                    os.startfile(output_path)
-                elif sys.platform == 'darwin':
-                    subprocess.run(['open', output_path])
-                else:
-                    subprocess.run(['xdg-open', output_path])
-
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to convert to PDF: {e}")
-
-    async def html_to_pdf_async(self, html_content, output_path):
-        """Convert HTML to PDF using Playwright asynchronously."""
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-
-            # Set HTML content and wait for network idle
-            await page.set_content(html_content, wait_until="networkidle")
-
-            # Generate PDF with options
-            await page.pdf(
-                path=output_path,
-                format='A4',
-                print_background=True
-            )
-
-            await browser.close()
-
-    def convert_to_pdf_thread_playwright(self, output_path, pdfTitle):
-        """Convert markdown to PDF using Playwright."""
-        md_content = self.md_textbox.get("1.0", tk.END).strip()
-        css_content = self.css_textbox.get("1.0", tk.END).strip()
-
-        self.progress_bar.set(0.3)
-        self.update_status("Preparing conversion with Playwright...")
-
-        if not md_content:
-            messagebox.showwarning(
-                "Warning", "Please add some markdown content!"
+            self.ui.post_progress(0)
+            self.ui.post_status("PDF conversion failed")
+            self.ui.call(
+                messagebox.showerror, "Error",
+                f"Failed to convert to PDF: {e}"
             )
             return
 
-        file_path = output_path
-
-        if not file_path:
-            return
-
-        try:
-            self.progress_bar.set(0.5)
-            self.update_status(
-                "[PLAYWRIGHT] Converting Markdown to HTML..."
-            )
-            # Convert to HTML
-            html_content = self.md_to_html(md_content, css_content, pdfTitle)
-
-            self.progress_bar.set(0.8)
-            self.update_status("Generating PDF with Playwright...")
-            # Run async conversion
-            asyncio.run(self.html_to_pdf_async(html_content, file_path))
-
-            self.progress_bar.set(1.0)
-            self.update_status(
-                f"PDF saved successfully: {Path(file_path).name}"
-            )
-
-            save_default_css = self.css_textbox.get("0.0", "end-1c")
-            if save_default_css.strip():    
-                self.save_default_css()
-
-            if messagebox.askyesno(
-                "Success",
-                f"PDF created successfully!\n\nFile: {Path(file_path).name}\n\nOpen the file now?"
-            ):
-                if os.name == 'nt':
-                    os.startfile(file_path)
-                elif sys.platform == 'darwin':
-                    subprocess.run(['open', file_path])
-                else:
-                    subprocess.run(['xdg-open', file_path])
+        self.ui.post_progress(1.0)
+        self.ui.post_status(
+            f"PDF saved successfully: {Path(output_path).name}"
+        )
+        self.ui.call(self.on_pdf_converted, output_path, css_content)
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to convert to PDF: {e}")
+    def on_pdf_converted(self, output_path, css_content):
+        """Keep the CSS as the default and offer to open the PDF."""
+        if css_content:
+            self.save_default_css(css_content)
+
+        if messagebox.askyesno(
+            "Success",
+            f"PDF created successfully!\n\nFile: {Path(output_path).name}\n\nOpen the file now?"
+        ):
+            if os.name == 'nt':
+                os.startfile(output_path)
+            elif sys.platform == 'darwin':
+                subprocess.Popen(['open', output_path])
+            else:
+                subprocess.Popen(['xdg-open', output_path])
 
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.converter.close()
 
 
 def main():
+    # Engine workers are spawned processes; needed for frozen builds
+    multiprocessing.freeze_support()
+    isolate_parses()
     app = MarkdownToPDFConverter()
     app.run()
 
@@ -0,0 +1,70 @@
+"""
+DasMDF - UI update queue
+
+Tk widgets may only be touched from the thread running the main loop.
+Worker threads post progress, status messages and callbacks (dialogs,
+follow-up steps) here instead; the main loop drains them every frame
+through ``root.after``. Progress and status posted within a frame are
+coalesced so only the latest values are drawn, while callbacks run in
+the order they were posted. Nothing here forces a redraw by hand. A
+callback that raises is logged and the rest of its batch still runs.
+"""
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger("dasmdf.uiqueue")
+
+
+class UiQueue:
+    """Marshal worker updates onto the Tk main loop, batched per frame."""
+
+    def __init__(self, root, progress_bar, status_label, fps=30):
+        """Drive ``progress_bar`` and ``status_label`` at ``fps``."""
+        self.root = root
+        self.progress_bar = progress_bar
+        self.status_label = status_label
+        self.frame_ms = max(1, int(1000 / fps))
+
+        self._lock = threading.Lock()
+        self._progress = None
+        self._status = None
+        self._calls = collections.deque()
+        self.root.after(self.frame_ms, self._drain)
+
+    def post_progress(self, value):
+        """Show ``value`` (0 to 1) on the next frame; safe from any thread."""
+        with self._lock:
+            self._progress = value
+
+    def post_status(self, message):
+        """Show ``message`` on the next frame; safe from any thread."""
+        with self._lock:
+            self._status = message
+
+    def call(self, func, *args, **kwargs):
+        """Run ``func`` on the main loop; safe from any thread."""
+        with self._lock:
+            self._calls.append((func, args, kwargs))
+
+    def _drain(self):
+        """Apply everything posted since the last frame."""
+        with self._lock:
+            progress, self._progress = self._progress, None
+            status, self._status = self._status, None
+            calls = list(self._calls)
+            self._calls.clear()
+
+        try:
+            if progress is not None:
+                self.progress_bar.set(progress)
+            if status is not None:
+                self.status_label.configure(text=status)
+            for func, args, kwargs in calls:
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    logger.exception("UI callback %r failed", func)
+        finally:
+            self.root.after(self.frame_ms, self._drain)
@@ -0,0 +1,93 @@
+"""
+DasMDF - Markdown to PDF conversion core
+
+The GUI-free conversion library shared by the PyQt6 and CustomTkinter
+front-ends. Importing it pulls in no GUI toolkit, and its modules are
+only loaded when first used.
+
+    import dasmdf
+
+    html = dasmdf.render_html("# Hello", css_content="h1 { color: red; }")
+    dasmdf.convert("# Hello", "hello.pdf", engine="weasyprint")
+
+    jobs = [dasmdf.ConversionJob(text, f"out/{i}.pdf", "wkhtml")
+            for i, text in enumerate(documents)]
+    for event in dasmdf.convert_many(jobs):
+        print(event.job, event.stage, event.message)
+
+    # Parse large documents in helper processes killed after a timeout;
+    # call from under ``if __name__ == "__main__":``
+    dasmdf.isolate_parses()
+
+    # Isolate engines in supervised worker processes
+    with dasmdf.WorkerPool(size=2, timeout=120, rss_limit="2G") as pool:
+        pool.convert(dasmdf.ConversionJob(text, "out.pdf", "weasyprint"))
+
+    # One parse, rendered as notes.A4.light.pdf, notes.Letter.dark.pdf...
+    variants = dasmdf.expand_variants(["A4", "Letter"], ["light", "dark"])
+    for event in dasmdf.iter_variants(job, variants):
+        print(event.output_path, event.stage)
+
+    # A durable queue shared by worker processes, possibly on many hosts
+    queue = dasmdf.JobQueue("/shared/campaign.sqlite3")
+    queue.add(dasmdf.ConversionJob(text, "/shared/out/notes.pdf"))
+    queue.work(exit_when_empty=True)
+
+    # Rebuild the outputs of a dasmdf.json project whose inputs changed
+    for result in dasmdf.Project("manual/dasmdf.json").build():
+        print(result.output, result.status, result.reason)
+"""
+
+import importlib
+
+# Public names and the submodules defining them. They are imported on
+# first access, so ``import dasmdf`` stays cheap for the command-line
+# client and engines are only loaded when used.
+_EXPORTS = {
+    "Converter": "converter",
+    "convert": "converter",
+    "convert_many": "converter",
+    "default_converter": "converter",
+    "iter_variants": "converter",
+    "iter_html": "document",
+    "render_html": "document",
+    "isolate_parses": "guard",
+    "ENGINES": "engines",
+    "Engine": "engines",
+    "register_engine": "engines",
+    "ConversionError": "jobs",
+    "ConversionJob": "jobs",
+    "ProgressEvent": "jobs",
+    "JobQueue": "jobqueue",
+    "PARSERS": "parsers",
+    "Parser": "parsers",
+    "get_parser": "parsers",
+    "register_parser": "parsers",
+    "make_reproducible": "pdf",
+    "source_date_epoch": "pdf",
+    "WorkerPool": "pool",
+    "Profile": "profiles",
+    "Project": "project",
+    "get_profile": "profiles",
+    "profile_names": "profiles",
+    "preview_job": "preview",
+    "Variant": "variants",
+    "expand_variants": "variants",
+    "find_wkhtmltopdf": "wkhtml",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import public names from their submodules on first access."""
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'dasmdf' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
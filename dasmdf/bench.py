@@ -0,0 +1,113 @@
+"""
+DasMDF - Engine benchmark
+
+Renders one document on each engine and reports the first render, which
+includes starting the engine, and the best of the warm renders that
+follow. The document defaults to the parser corpus repeated to about
+20 KB; pass a markdown file to measure your own.
+
+    python -m dasmdf.bench
+    python -m dasmdf.bench notes.md -e playwright,weasyprint -n 5
+
+Engines living in a GUI process, such as the PyQt6 app's Qt WebEngine
+engine, are benchmarked by their own module's entry point, which runs
+``main`` with the GUI's event loop going.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .converter import Converter
+from .engines import ENGINES
+from .jobs import ConversionJob
+from .parsers import CORPUS
+from .wkhtml import find_wkhtmltopdf
+
+# Size of the default benchmark document, in bytes
+BENCH_SIZE = 20 * 1024
+BENCH_RUNS = 3
+
+
+def sample_document(size=BENCH_SIZE):
+    """Return the parser corpus repeated to about ``size`` characters."""
+    sample = "\n\n".join(CORPUS.values())
+    return "\n\n".join([sample] * (size // len(sample) + 1))
+
+
+def benchmark(converter, engine, md_content, runs=BENCH_RUNS):
+    """Time ``runs`` renders of ``md_content`` with ``engine``.
+
+    Returns a dict with the ``first`` and best ``warm`` render times in
+    seconds, the ``pages`` and the PDF ``size`` in bytes. Raises
+    ConversionError if the engine fails.
+    """
+    times = []
+    with tempfile.TemporaryDirectory(prefix="dasmdf-bench-") as directory:
+        path = os.path.join(directory, f"{engine}.pdf")
+        for _ in range(max(1, runs)):
+            start = time.perf_counter()
+            event = converter.convert(
+                ConversionJob(md_content, path, engine, title="Benchmark")
+            )
+            times.append(time.perf_counter() - start)
+        size = os.path.getsize(path)
+    return {
+        "first": times[0],
+        "warm": min(times[1:]) if len(times) > 1 else None,
+        "pages": event.pages,
+        "size": size,
+    }
+
+
+def main(argv=None, converter=None):
+    """Benchmark the engines and print a table; returns the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="python -m dasmdf.bench", description=__doc__.split("\n\n")[1]
+    )
+    parser.add_argument("input", nargs="?", help="markdown file to render")
+    parser.add_argument(
+        "-e", "--engine",
+        help=f"comma-separated engines (default: {', '.join(ENGINES)})"
+    )
+    parser.add_argument("-n", "--runs", type=int, default=BENCH_RUNS,
+                        help="renders per engine (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            md_content = f.read()
+    else:
+        md_content = sample_document()
+    engines = (args.engine.split(",") if args.engine else list(ENGINES))
+
+    own = converter is None
+    if own:
+        converter = Converter(find_wkhtmltopdf())
+    failed = False
+    print(f"{'engine':14} {'first':>8} {'warm':>8} {'pages':>6} {'size':>9}")
+    try:
+        for engine in engines:
+            engine = engine.strip()
+            try:
+                result = benchmark(converter, engine, md_content, args.runs)
+            except Exception as e:
+                failed = True
+                print(f"{engine:14} failed: {e}")
+                continue
+            warm = result["warm"]
+            print(
+                f"{engine:14} {result['first']:7.2f}s "
+                f"{(f'{warm:7.2f}s' if warm is not None else '-'):>8} "
+                f"{result['pages'] or '-':>6} {result['size']:>9}"
+            )
+    finally:
+        if own:
+            converter.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+DasMDF - On-disk cache
+
+A small content-addressed cache under ``~/.dasmdf/cache`` for stages that
+memoize expensive work across conversions. Entries are plain text files
+written atomically, so concurrent conversions can share one cache.
+
+The whole cache is kept under ``DASMDF_CACHE_SIZE`` (256M by default, 0
+for no limit). Reading an entry marks it used; at most once every
+PRUNE_INTERVAL seconds a write prunes the least recently used entries,
+and ``python -m dasmdf cache --prune`` does so at once.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from .memory import parse_size
+
+CACHE_ROOT = os.environ.get("DASMDF_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~/.dasmdf"), "cache"
+)
+MAX_CACHE_SIZE = "256M"
+# Seconds between automatic prunes, and writes between checking the clock
+PRUNE_INTERVAL = 3600.0
+PRUNE_CHECK_WRITES = 64
+# Pruning goes this far below the limit, so it is not needed again soon
+PRUNE_TARGET = 0.8
+# Scratch files of interrupted writes older than this are removed
+STALE_TMP_SECONDS = 3600.0
+# Written at the cache root on every prune
+_STAMP = ".pruned"
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def max_cache_size():
+    """Return the cache size limit in bytes from DASMDF_CACHE_SIZE.
+
+    None means unlimited.
+    """
+    size = parse_size(os.environ.get("DASMDF_CACHE_SIZE") or MAX_CACHE_SIZE)
+    return size or None
+
+
+def _entries(root):
+    """Yield ``(mtime, size, path)`` for every file under ``root``."""
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if directory == root and name == _STAMP:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            yield info.st_mtime, info.st_size, path
+
+
+def cache_usage(root=None):
+    """Return ``{namespace: (entries, bytes)}`` for the cache at ``root``."""
+    root = root or CACHE_ROOT
+    usage = {}
+    for _, size, path in _entries(root):
+        namespace = os.path.relpath(path, root).split(os.sep)[0]
+        count, total = usage.get(namespace, (0, 0))
+        usage[namespace] = (count + 1, total + size)
+    return usage
+
+
+def prune(max_size=None, root=None, clear=False):
+    """Remove least recently used entries until the cache fits.
+
+    Shrinks the cache at ``root`` to PRUNE_TARGET of ``max_size``
+    (default ``max_cache_size()``), or empties it with ``clear``.
+    Returns ``(entries removed, bytes freed)``.
+    """
+    root = root or CACHE_ROOT
+    if max_size is None:
+        max_size = max_cache_size()
+    now = time.time()
+    entries = []
+    removed = freed = 0
+    for mtime, size, path in _entries(root):
+        stale = (path.endswith(".tmp")
+                 and now - mtime > STALE_TMP_SECONDS)
+        if clear or stale:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed, freed = removed + 1, freed + size
+        else:
+            entries.append((mtime, size, path))
+    total = sum(size for _, size, _ in entries)
+    if max_size and total > max_size:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_size * PRUNE_TARGET:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed, freed = removed + 1, freed + size
+    try:
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, _STAMP), 'w'):
+            pass
+    except OSError:
+        pass
+    return removed, freed
+
+
+def _maybe_prune(root):
+    """Prune ``root`` when the last prune is PRUNE_INTERVAL old.
+
+    The stamp is only looked at on the first write of a process and
+    every PRUNE_CHECK_WRITES writes after.
+    """
+    global _writes
+    with _writes_lock:
+        check = _writes % PRUNE_CHECK_WRITES == 0
+        _writes += 1
+    if not check:
+        return
+    try:
+        age = time.time() - os.stat(os.path.join(root, _STAMP)).st_mtime
+    except OSError:
+        age = None
+    if age is None or age > PRUNE_INTERVAL:
+        prune(root=root)
+
+
+def content_hash(*parts):
+    """Return a hex digest identifying the given string parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Text values stored one file per key in a cache namespace."""
+
+    def __init__(self, namespace, root=None, suffix=".txt"):
+        """Create a cache stored in ``<root>/<namespace>``."""
+        self.root = root or CACHE_ROOT
+        self.directory = os.path.join(self.root, namespace)
+        self.suffix = suffix
+
+    def path(self, key):
+        """Return the file path used for ``key``."""
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None on a miss."""
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # recently used, kept when pruning
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``; failures are silently ignored."""
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), suffix=".tmp"
+            )
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        _maybe_prune(self.root)
@@ -0,0 +1,598 @@
+"""
+DasMDF - Command line
+
+``python -m dasmdf convert notes.md`` converts a document from scripts and
+Makefiles. Conversions go through the background daemon where Unix
+sockets are available, starting it on demand, so only the first one pays
+for imports and engine startup; ``--no-daemon`` converts in-process.
+
+    python -m dasmdf convert notes.md -o notes.pdf -e weasyprint
+    python -m dasmdf convert notes.md -e weasyprint,playwright --timeout 60
+    python -m dasmdf convert notes.md --profile draft
+    SOURCE_DATE_EPOCH=1700000000 python -m dasmdf convert notes.md --verify
+    python -m dasmdf variants notes.md --page-size A4,Letter \
+        --theme light,dark
+    python -m dasmdf profiles
+    python -m dasmdf cache --prune
+    python -m dasmdf daemon --status
+    python -m dasmdf daemon --stop
+    python -m dasmdf queue add docs/*.md -d out/ --queue /shared/q.sqlite3
+    python -m dasmdf worker --queue /shared/q.sqlite3
+    python -m dasmdf queue status --queue /shared/q.sqlite3
+    python -m dasmdf build docs/dasmdf.json -j 4
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+from dataclasses import replace
+
+from . import daemon, guard, jobqueue
+from .jobs import ConversionError, ConversionJob
+from .pdf import source_date_epoch
+from .project import link_stylesheet
+from .variants import DEFAULT_PATTERN, expand_variants
+
+# The stylesheet saved by the apps, used when no --css is given
+DEFAULT_CSS = os.path.join(daemon.SETTINGS_DIR, "dcss.css")
+
+
+def _read(path):
+    """Read a text file, with ``-`` meaning standard input."""
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _split(value):
+    """Split a comma-separated option into its items."""
+    return [item.strip() for item in value.split(",")] if value else []
+
+
+def _build_job(args, engines, **fields):
+    """Return the ConversionJob described by the common options."""
+    if args.output:
+        output = args.output
+    elif args.input == "-":
+        output = "output.pdf"
+    else:
+        output = os.path.splitext(args.input)[0] + ".pdf"
+    css_path = args.css or (DEFAULT_CSS if os.path.exists(DEFAULT_CSS)
+                            else None)
+    css = ""
+    if css_path:
+        css = link_stylesheet(
+            _read(css_path), os.path.dirname(os.path.abspath(css_path))
+        )
+    # Relative links are resolved here, not where the daemon runs
+    base_dir = os.getcwd()
+    if args.input != "-":
+        base_dir = os.path.dirname(os.path.abspath(args.input))
+    return ConversionJob(
+        _read(args.input), os.path.abspath(output), engines[0], css,
+        args.title or ConversionJob.title, args.prune_css, args.parser,
+        timeouts=(dict.fromkeys(engines, args.timeout) if args.timeout
+                  else None),
+        profile=args.profile,
+        source_date=source_date_epoch() if args.reproducible else None,
+        base_dir=base_dir, **fields
+    )
+
+
+def _in_process(args):
+    """Whether to convert without the daemon."""
+    return args.no_daemon or not daemon.supported()
+
+
+def _convert_in_process(job, on_event):
+    """Convert without the daemon."""
+    from .converter import Converter
+    from .wkhtml import find_wkhtmltopdf
+
+    with Converter(find_wkhtmltopdf()) as converter:
+        return converter.convert(job, on_event)
+
+
+def _variants_in_process(job, variants, pattern, parallel):
+    """Render variants without the daemon, yielding their events."""
+    from .converter import Converter
+    from .wkhtml import find_wkhtmltopdf
+
+    with Converter(find_wkhtmltopdf()) as converter:
+        yield from converter.iter_variants(job, variants, pattern, parallel)
+
+
+def _sha256(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _verify(args, job):
+    """Convert ``job`` again and return whether both PDFs are identical.
+
+    The second conversion runs in a new interpreter, so output that only
+    repeats within one process, e.g. ordered by a per-process hash seed,
+    is caught.
+    """
+    fd, path = tempfile.mkstemp(
+        prefix=".", suffix=".pdf", dir=os.path.dirname(job.output_path)
+    )
+    os.close(fd)
+    context = multiprocessing.get_context("spawn")
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                1, mp_context=context) as executor:
+            executor.submit(
+                _convert_in_process, replace(job, output_path=path), None
+            ).result()
+        first, second = _sha256(job.output_path), _sha256(path)
+    finally:
+        os.remove(path)
+    if first != second:
+        print(f"dasmdf: two conversions differ: {first} and {second}",
+              file=sys.stderr)
+        return False
+    if not args.quiet:
+        print(f"Reproducible: both conversions hash to {first}",
+              file=sys.stderr)
+    return True
+
+
+def cmd_convert(args):
+    """Convert one markdown file to PDF."""
+    engines = _split(args.engine)
+    args.reproducible = args.reproducible or args.verify
+
+    def on_event(event):
+        if not args.quiet:
+            print(event.message, file=sys.stderr)
+
+    def convert(job):
+        if _in_process(args):
+            return _convert_in_process(job, on_event)
+        return daemon.convert(job, on_event, args.socket, args.idle_timeout)
+
+    try:
+        job = _build_job(
+            args, engines, fallback=tuple(engines[1:]), race=args.race,
+            page_size=args.page_size
+        )
+        event = convert(job)
+        if args.verify and not _verify(args, job):
+            return 1
+    except ConversionError as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    print(event.output_path)
+    return 0
+
+
+def cmd_variants(args):
+    """Render one markdown file in several page sizes, themes and engines."""
+    engines = _split(args.engine)
+    try:
+        job = _build_job(args, engines)
+    except ConversionError as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    variants = expand_variants(
+        _split(args.page_size), _split(args.theme),
+        engines if len(engines) > 1 else ()
+    )
+    if _in_process(args):
+        events = _variants_in_process(
+            job, variants, args.pattern, args.parallel
+        )
+    else:
+        events = daemon.iter_variants(
+            job, variants, args.pattern, args.parallel, args.socket,
+            args.idle_timeout
+        )
+
+    status = 0
+    shown = None
+    try:
+        for event in events:
+            if event.stage == "done":
+                print(event.output_path)
+            elif event.stage == "failed":
+                print(f"dasmdf: {event.output_path}: {event.error}",
+                      file=sys.stderr)
+                status = 1
+            elif not args.quiet and event.message != shown:
+                # Stages shared by all variants are reported once
+                print(event.message, file=sys.stderr)
+                shown = event.message
+    except ConversionError as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    return status
+
+
+def cmd_profiles(args):
+    """List the quality profiles."""
+    from .profiles import BUILTIN_PROFILES, PROFILES_PATH, load_profiles
+
+    try:
+        profiles = load_profiles()
+    except ConversionError as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    for name, profile in profiles.items():
+        source = PROFILES_PATH
+        if profile == BUILTIN_PROFILES.get(name):
+            source = "built-in"
+        print(f"{name:12} javascript {profile.javascript:6}  {source}")
+    return 0
+
+
+def cmd_cache(args):
+    """Show the size of the on-disk caches, or prune them."""
+    from . import cache
+
+    if args.prune or args.clear:
+        removed, freed = cache.prune(clear=args.clear)
+        print(f"Removed {removed} entries ({freed:,} bytes) from "
+              f"{cache.CACHE_ROOT}")
+        return 0
+    usage = cache.cache_usage()
+    for namespace, (entries, size) in sorted(usage.items()):
+        print(f"{namespace:12} {entries:8} entries {size:>14,} bytes")
+    total = sum(size for _, size in usage.values())
+    limit = cache.max_cache_size()
+    print(f"{'total':12} {total:>31,} bytes, limit "
+          f"{f'{limit:,} bytes' if limit else 'none'}  ({cache.CACHE_ROOT})")
+    return 0
+
+
+def cmd_daemon(args):
+    """Run, query or stop the background daemon."""
+    if not daemon.supported():
+        print("dasmdf: the daemon needs Unix domain sockets",
+              file=sys.stderr)
+        return 1
+    if args.stop:
+        return 0 if daemon.stop(args.socket) else 1
+    if args.status:
+        status = daemon.ping(args.socket)
+        if status is None:
+            print("not running")
+            return 1
+        print(f"running, pid {status['pid']}, {status['jobs']} jobs served")
+        return 0
+    daemon.serve(args.socket, args.idle_timeout)
+    return 0
+
+
+def _plural(count, noun):
+    """Return ``count`` followed by ``noun``, pluralised as needed."""
+    return f"{count} {noun}{'' if count == 1 else 's'}"
+
+
+def _queue_add(args, queue):
+    """Queue one job per input file; prints their ids."""
+    engines = _split(args.engine)
+    try:
+        for path in args.inputs:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            output = None
+            if args.output_dir:
+                output = os.path.join(args.output_dir, stem + ".pdf")
+            job = _build_job(
+                argparse.Namespace(**vars(args), input=path, output=output),
+                engines, fallback=tuple(engines[1:]),
+                page_size=args.page_size
+            )
+            job_id = queue.add(job, args.attempts)
+            if not args.quiet:
+                print(f"{job_id}\t{job.output_path}")
+    except (ConversionError, OSError) as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _queue_status(args, queue):
+    """Print the queue's backlog, workers and throughput."""
+    from .converter import format_eta
+
+    status = queue.status()
+    print(f"queue    {queue.path}")
+    print(
+        f"jobs     {status['queued']} queued ({status['ready']} ready, "
+        f"{status['waiting']} waiting to retry), {status['running']} "
+        f"running, {status['done']} done, {status['failed']} failed"
+    )
+    workers = ", ".join(
+        f"{worker} ({_plural(count, 'job')})"
+        for worker, count in status["workers"].items()
+    )
+    if status["abandoned"]:
+        workers = (f"{workers}; " if workers else "") + (
+            f"{_plural(status['abandoned'], 'abandoned job')} to reclaim"
+        )
+    print(f"workers  {workers or 'none'}")
+    print(
+        f"rate     {status['throughput']:.1f} jobs/min, "
+        f"{status['pages']:.1f} pages/min over the last "
+        f"{jobqueue.THROUGHPUT_WINDOW / 60:g} min"
+    )
+    if status["oldest"] is not None or status["eta"] is not None:
+        backlog = []
+        if status["oldest"] is not None:
+            backlog.append(f"oldest ready job queued "
+                           f"{format_eta(status['oldest'])} ago")
+        if status["eta"] is not None:
+            backlog.append(f"about {format_eta(status['eta'])} left")
+        print(f"backlog  {', '.join(backlog)}")
+    if args.failed:
+        for job_id, output_path, attempts, error in queue.failed_jobs():
+            print(f"failed   {job_id} {output_path} after "
+                  f"{_plural(attempts, 'attempt')}: {error}")
+    return 0
+
+
+def cmd_queue(args):
+    """Add jobs to the durable job queue, or show its status."""
+    queue = jobqueue.JobQueue(args.queue)
+    if args.action == "add":
+        return _queue_add(args, queue)
+    if args.action == "retry":
+        print(f"{_plural(queue.retry_failed(), 'failed job')} queued again")
+        return 0
+    return _queue_status(args, queue)
+
+
+def cmd_worker(args):
+    """Render jobs from the durable job queue until stopped."""
+    queue = jobqueue.JobQueue(args.queue)
+
+    def on_event(event):
+        if event.stage == "done":
+            print(f"{event.job}\t{event.output_path}")
+        elif event.stage == "failed":
+            print(f"dasmdf: job {event.job}: {event.error}",
+                  file=sys.stderr)
+        elif not args.quiet:
+            print(f"job {event.job}: {event.message}", file=sys.stderr)
+
+    try:
+        count = queue.work(
+            max_jobs=args.max_jobs, exit_when_empty=args.exit_when_empty,
+            on_event=on_event
+        )
+    except KeyboardInterrupt:
+        return 130
+    if not args.quiet:
+        print(f"Worker stopped after {_plural(count, 'job')}",
+              file=sys.stderr)
+    return 0
+
+
+def cmd_build(args):
+    """Rebuild the outputs of a project whose inputs changed."""
+    from .project import Project
+
+    def on_event(event):
+        if not args.quiet and not event.finished:
+            name = project.relative(event.output_path)
+            print(f"{name}: {event.message}", file=sys.stderr)
+
+    try:
+        project = Project(args.project)
+        results = project.build(
+            parallel=args.jobs, force=args.force, dry_run=args.dry_run,
+            on_event=on_event
+        )
+    except ConversionError as e:
+        print(f"dasmdf: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+    status = 0
+    for result in results:
+        name = project.relative(result.output)
+        if result.status == "failed":
+            print(f"dasmdf: {name}: {result.error}", file=sys.stderr)
+            status = 1
+        elif result.status == "current":
+            if not args.quiet:
+                print(f"{name}: up to date", file=sys.stderr)
+        else:
+            print(f"{name}\t{result.reason}")
+    return status
+
+
+def build_parser():
+    """Return the argument parser for the ``dasmdf`` command."""
+    parser = argparse.ArgumentParser(
+        prog="dasmdf", description="Convert Markdown to PDF."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help=cmd_convert.__doc__)
+    convert.add_argument(
+        "-e", "--engine", default="playwright",
+        help="rendering engine (playwright, weasyprint, wkhtml, qt-draft); "
+             "a comma-separated list falls back to the next engine on "
+             "failure, e.g. qt-draft,playwright"
+    )
+    convert.add_argument(
+        "--race", action="store_true",
+        help="start all listed engines at once and keep the first PDF"
+    )
+    convert.add_argument("--page-size", help="paper size, e.g. A4 or Letter")
+    convert.add_argument(
+        "--verify", action="store_true",
+        help="convert twice and fail unless both PDFs are byte-identical "
+             "(implies --reproducible)"
+    )
+    convert.set_defaults(func=cmd_convert)
+
+    variants = commands.add_parser("variants", help=cmd_variants.__doc__)
+    variants.add_argument(
+        "-e", "--engine", default="playwright",
+        help="comma-separated engines to render with"
+    )
+    variants.add_argument("--page-size",
+                          help="comma-separated paper sizes, e.g. A4,Letter")
+    variants.add_argument(
+        "--theme",
+        help="comma-separated themes: light, dark or stylesheet paths"
+    )
+    variants.add_argument(
+        "--pattern", default=DEFAULT_PATTERN,
+        help="output file names, from {stem}, {variant}, {page_size}, "
+             "{theme}, {engine} and {profile} (default: %(default)s)"
+    )
+    variants.add_argument("--parallel", type=int,
+                          help="most variants rendered at once")
+    variants.set_defaults(func=cmd_variants)
+
+    queue = commands.add_parser("queue", help=cmd_queue.__doc__)
+    actions = queue.add_subparsers(dest="action", required=True)
+    queue_add = actions.add_parser(
+        "add", help="queue one conversion per markdown file"
+    )
+    queue_add.add_argument("inputs", nargs="+", metavar="input",
+                           help="markdown files")
+    queue_add.add_argument(
+        "-d", "--output-dir",
+        help="directory for the PDFs (default: next to each input)"
+    )
+    queue_add.add_argument(
+        "-e", "--engine", default="playwright",
+        help="rendering engine; a comma-separated list falls back to the "
+             "next engine on failure"
+    )
+    queue_add.add_argument("--page-size",
+                           help="paper size, e.g. A4 or Letter")
+    queue_add.add_argument(
+        "--attempts", type=int, default=jobqueue.MAX_ATTEMPTS,
+        help="tries per job before it fails (default: %(default)s)"
+    )
+    queue_add.add_argument("-q", "--quiet", action="store_true",
+                           help="do not print the queued job ids")
+    queue_status = actions.add_parser(
+        "status", help="show the backlog, workers and throughput"
+    )
+    queue_status.add_argument("--failed", action="store_true",
+                              help="also list the failed jobs")
+    queue_retry = actions.add_parser(
+        "retry", help="queue the failed jobs again"
+    )
+    queue.set_defaults(func=cmd_queue)
+
+    worker = commands.add_parser("worker", help=cmd_worker.__doc__)
+    worker.add_argument("--max-jobs", type=int,
+                        help="stop after rendering this many jobs")
+    worker.add_argument(
+        "--exit-when-empty", action="store_true",
+        help="stop once no job is queued or running instead of waiting"
+    )
+    worker.add_argument("-q", "--quiet", action="store_true",
+                        help="only print the finished jobs")
+    worker.set_defaults(func=cmd_worker)
+
+    build = commands.add_parser("build", help=cmd_build.__doc__)
+    build.add_argument(
+        "project", nargs="?", default=".",
+        help="project file, or a directory holding a dasmdf.json "
+             "(default: the current directory)"
+    )
+    build.add_argument(
+        "-j", "--jobs", type=int,
+        help="most outputs rendered at once (default: one per CPU)"
+    )
+    build.add_argument("--force", action="store_true",
+                       help="rebuild every output")
+    build.add_argument(
+        "-n", "--dry-run", action="store_true",
+        help="list the outputs that would be rebuilt, and why"
+    )
+    build.add_argument("-q", "--quiet", action="store_true",
+                       help="only print the rebuilt outputs")
+    build.set_defaults(func=cmd_build)
+
+    for command in (queue_add, queue_status, queue_retry, worker):
+        command.add_argument(
+            "--queue", default=jobqueue.QUEUE_PATH,
+            help="queue database, shared by all workers "
+                 "(default: %(default)s)"
+        )
+
+    for command in (convert, variants):
+        command.add_argument("input", help="markdown file, or - for stdin")
+        command.add_argument("-o", "--output", help="PDF file to write")
+        command.add_argument(
+            "--no-daemon", action="store_true",
+            help="convert in this process instead of the daemon"
+        )
+        command.add_argument("-q", "--quiet", action="store_true",
+                             help="only print the output path")
+
+    for command in (convert, variants, queue_add):
+        command.add_argument("--timeout", type=float,
+                             help="seconds each engine may take")
+        command.add_argument("--css", help="stylesheet to apply")
+        command.add_argument("--title", help="document title")
+        command.add_argument(
+            "--prune-css", action="store_true",
+            help="drop CSS rules that match nothing in the document"
+        )
+        command.add_argument("--parser", help="markdown parser backend")
+        command.add_argument(
+            "--profile",
+            help="quality profile: final (default), draft or a custom one"
+        )
+        command.add_argument(
+            "--reproducible", action="store_true",
+            help="pin dates (to SOURCE_DATE_EPOCH, default 0) and "
+                 "identifiers so equal inputs give identical PDFs"
+        )
+
+    profiles = commands.add_parser("profiles", help=cmd_profiles.__doc__)
+    profiles.set_defaults(func=cmd_profiles)
+
+    caches = commands.add_parser("cache", help=cmd_cache.__doc__)
+    caches.add_argument(
+        "--prune", action="store_true",
+        help="remove the least recently used entries over the limit "
+             "(DASMDF_CACHE_SIZE)"
+    )
+    caches.add_argument("--clear", action="store_true",
+                        help="remove every entry")
+    caches.set_defaults(func=cmd_cache)
+
+    serve = commands.add_parser("daemon", help=cmd_daemon.__doc__)
+    serve.add_argument("--stop", action="store_true",
+                       help="stop the running daemon")
+    serve.add_argument("--status", action="store_true",
+                       help="report whether the daemon is running")
+    serve.set_defaults(func=cmd_daemon)
+
+    for command in (convert, variants, serve):
+        command.add_argument("--socket", default=daemon.SOCKET_PATH,
+                             help="daemon socket path")
+        command.add_argument(
+            "--idle-timeout", type=float, default=daemon.IDLE_TIMEOUT,
+            help="seconds the daemon stays up without requests"
+        )
+    return parser
+
+
+def main(argv=None):
+    """Run the ``dasmdf`` command; returns the exit status."""
+    args = build_parser().parse_args(argv)
+    guard.isolate_parses()
+    return args.func(args)
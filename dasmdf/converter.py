@@ -0,0 +1,825 @@
+"""
+DasMDF - Converter
+
+Runs conversion jobs through the rendering engines. A ``Converter`` keeps
+one instance of each engine it has used, so repeated conversions skip
+engine setup such as imports, executable discovery and browser launch.
+"""
+
+import atexit
+import gc
+import os
+import queue
+import tempfile
+import threading
+import time
+from dataclasses import replace
+
+from .document import iter_html, render_body, wrap_html
+from .engines import ENGINES, WkhtmlEngine
+from .files import part_path, publish
+from .jobs import (
+    ConversionError, ConversionJob, EngineTimeout, ProgressEvent
+)
+from .memory import (
+    MemoryModel, PeakMemory, budget_from_env, current_rss, format_size,
+    merge_pdfs, parse_size, split_markdown
+)
+from .pdf import make_reproducible
+from .profiles import BUILTIN_PROFILES, DEFAULT_PROFILE, get_profile
+from .project import link_markdown, link_stylesheet
+from .variants import DEFAULT_PATTERN, page_size_name, variant_jobs
+
+# Render events are sent at most this often unless progress jumps by at
+# least RENDER_EVENT_STEP.
+RENDER_EVENT_INTERVAL = 0.25
+RENDER_EVENT_STEP = 0.01
+
+# How the done message describes engines that lost
+OUTCOME_TEXT = {
+    "failed": "failed", "timeout": "timed out", "cancelled": "cancelled",
+}
+
+
+def format_eta(seconds):
+    """Format a number of seconds as ``m:ss`` or ``h:mm:ss``."""
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class RenderThread:
+    """Run an engine render on a helper thread and relay its progress.
+
+    Iterating starts the render and yields ``(fraction, pages_done,
+    pages_total)`` tuples until it ends; afterwards ``pages`` holds the
+    engine's page count. Exceptions raised by the engine are re-raised by
+    the iteration, and EngineTimeout once ``timeout`` seconds pass.
+
+    Renders running side by side share one ``updates`` queue instead,
+    which receives ``(render, update)`` pairs, ``update`` being None once
+    that render has ended. ``options`` are extra keyword arguments for
+    ``Engine.render``, see ``_render_options``.
+    """
+
+    def __init__(self, engine, html, output_path, timeout=None,
+                 updates=None, options=None):
+        self.engine = engine
+        self.output_path = output_path
+        self.timeout = timeout
+        self.options = options or {}
+        self.pages = None
+        self.error = None
+        self.seconds = None
+        self.cancelled = threading.Event()
+        self._updates = updates if updates is not None else queue.Queue()
+        self._start = None
+        self._thread = threading.Thread(
+            target=self._run, args=(html,), name="dasmdf-render",
+            daemon=True
+        )
+
+    def start(self):
+        """Start rendering; returns the render for chaining."""
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def elapsed(self):
+        """Seconds since the render started."""
+        return time.perf_counter() - self._start
+
+    def expired(self):
+        """Whether the render has run past its time limit."""
+        return self.timeout is not None and self.elapsed() > self.timeout
+
+    def timeout_error(self):
+        """The error reported for a render that ran out of time."""
+        return EngineTimeout(
+            f"{self.engine.display_name} timed out after "
+            f"{self.timeout:g} s."
+        )
+
+    def cancel(self):
+        """Give up on the render; its output is removed once it stops."""
+        self.cancelled.set()
+
+    def _run(self, html):
+        try:
+            self.pages = self.engine.render(
+                html, self.output_path, self._progress, self.cancelled,
+                **self.options
+            )
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.seconds = self.elapsed()
+            if self.cancelled.is_set():
+                _remove(self.output_path)
+            self._updates.put((self, None))
+
+    def _progress(self, *update):
+        self._updates.put((self, update))
+
+    def __iter__(self):
+        self.start()
+        while True:
+            remaining = None
+            if self.timeout is not None:
+                remaining = max(0.0, self.timeout - self.elapsed())
+            try:
+                _, update = self._updates.get(timeout=remaining)
+            except queue.Empty:
+                self.cancel()
+                raise self.timeout_error()
+            if update is None:
+                break
+            yield update
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _remove(path):
+    """Delete a file if it exists."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _render_options(job):
+    """Return the Engine.render keyword arguments a job asks for.
+
+    Only options that are set are passed, so engines written before an
+    option existed keep working for jobs that do not use it; the same
+    goes for the full-quality default profile.
+    """
+    options = {"page_size": job.page_size, "max_pages": job.max_pages}
+    profile = get_profile(job.profile).resolve(job.md_content)
+    if profile != BUILTIN_PROFILES[DEFAULT_PROFILE]:
+        options["profile"] = profile
+    if job.source_date is not None:
+        options["source_date"] = job.source_date
+    return {
+        key: value for key, value in options.items() if value is not None
+    }
+
+
+def _resolve_links(job):
+    """Return ``job`` with links relative to its ``base_dir`` made absolute.
+
+    Renders do not depend on the working directory then, which for the
+    daemon and worker processes is not the one the job came from.
+    """
+    if not job.base_dir:
+        return job
+    return replace(
+        job, md_content=link_markdown(job.md_content, job.base_dir),
+        css_content=link_stylesheet(job.css_content, job.base_dir),
+        base_dir=None
+    )
+
+
+def _check_pdf(path):
+    """Raise ConversionError unless ``path`` holds a PDF."""
+    try:
+        with open(path, 'rb') as f:
+            valid = f.read(5) == b'%PDF-'
+    except OSError:
+        valid = False
+    if not valid:
+        raise ConversionError("The engine did not produce a valid PDF.")
+
+
+def _attempt(engine, outcome, seconds, error=None):
+    """Describe one engine's attempt at a job for ProgressEvent.attempts."""
+    if error is not None and outcome == "failed":
+        if isinstance(error, EngineTimeout):
+            outcome = "timeout"
+    return {
+        "engine": engine, "outcome": outcome,
+        "seconds": round(seconds or 0.0, 3),
+        "error": str(error) if error is not None else None,
+    }
+
+
+class Converter:
+    """Convert markdown documents to PDF with reusable engines.
+
+    ``memory_budget`` caps the resident memory a conversion may use, in
+    bytes or as a size such as ``"1.5G"``; it defaults to the
+    ``DASMDF_MEMORY_BUDGET`` environment variable. Documents predicted to
+    exceed it are rendered in sections spooled to disk. ``timeouts`` maps
+    engine names to default time limits in seconds.
+    """
+
+    def __init__(self, wkhtmltopdf_path=None, memory_budget=None,
+                 timeouts=None):
+        """Create a converter; engines are started on first use."""
+        self.wkhtmltopdf_path = wkhtmltopdf_path
+        if memory_budget is None:
+            self.memory_budget = budget_from_env()
+        else:
+            self.memory_budget = parse_size(memory_budget)
+        self.memory_model = MemoryModel()
+        self.timeouts = dict(timeouts or {})
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def engine(self, name):
+        """Return the shared instance of the engine called ``name``."""
+        with self._lock:
+            if name not in self._engines:
+                cls = ENGINES.get(name)
+                if cls is None:
+                    raise ConversionError(
+                        "Unsupported conversion engine selected."
+                    )
+                if cls is WkhtmlEngine:
+                    self._engines[name] = cls(self.wkhtmltopdf_path)
+                else:
+                    self._engines[name] = cls()
+            return self._engines[name]
+
+    def timeout(self, job, name):
+        """Return the time limit for engine ``name`` on ``job``."""
+        if job.timeouts and name in job.timeouts:
+            return job.timeouts[name]
+        return self.timeouts.get(name)
+
+    def iter_convert(self, job, index=0):
+        """Convert one job, yielding a ProgressEvent for each stage.
+
+        The last event has stage ``done`` or ``failed``; failures are
+        reported through that event rather than raised. Both carry the
+        peak memory measured in each stage and, when the job has fallback
+        engines, the outcome of every engine tried.
+        """
+        start = time.perf_counter()
+        cls = ENGINES.get(job.engine)
+        label = cls.label if cls else job.engine.upper()
+        display_name = cls.display_name if cls else job.engine
+        memory = {}
+        attempts = []
+
+        def event(stage, progress, message, error=None, pages=None,
+                  eta=None, error_type=None, engine=None):
+            return ProgressEvent(
+                index, stage, progress, message, engine or job.engine,
+                job.output_path, time.perf_counter() - start, error,
+                pages, eta, dict(memory) if memory else None, error_type,
+                list(attempts) if attempts else None
+            )
+
+        yield event(
+            "prepare", 0.3, f"Preparing conversion with {display_name}..."
+        )
+        baseline = current_rss()
+        md_size = len(job.md_content)
+        winner = job.engine
+        try:
+            job = replace(
+                _resolve_links(job), page_size=page_size_name(job.page_size)
+            )
+            get_profile(job.profile)  # fail early on unknown profiles
+            sections = self.memory_model.sections_needed(
+                job.engine, md_size, baseline, self.memory_budget
+            )
+            if sections > 1:
+                pages = yield from self._iter_sections(
+                    job, self.engine(job.engine), sections, event, memory
+                )
+            else:
+                try:
+                    pages, winner = yield from self._iter_whole(
+                        job, event, memory, attempts
+                    )
+                except MemoryError:
+                    gc.collect()
+                    pages = yield from self._iter_sections(
+                        job, self.engine(job.engine),
+                        max(4, md_size // 200000), event, memory
+                    )
+                else:
+                    if baseline is not None and memory.get("render"):
+                        self.memory_model.observe(
+                            winner, md_size, memory["render"] - baseline
+                        )
+            if job.source_date is not None:
+                make_reproducible(job.output_path, job.source_date)
+        except Exception as e:
+            yield event(
+                "failed", 0.0, f"[{label}] Conversion failed: {str(e)}",
+                error=str(e), error_type=type(e).__name__
+            )
+            return
+
+        winner_cls = ENGINES[winner]
+        message = f"[{winner_cls.label}] Conversion completed successfully!"
+        notes = [
+            f"{attempt['engine']} {OUTCOME_TEXT[attempt['outcome']]} "
+            f"after {attempt['seconds']:.1f} s"
+            for attempt in attempts if attempt["outcome"] != "won"
+        ]
+        peak = max(
+            (value for key, value in memory.items() if key != "sections"),
+            default=None
+        )
+        if peak:
+            notes.append(f"peak memory {format_size(peak)}")
+        if notes:
+            message += f" ({'; '.join(notes)})"
+        yield event("done", 1.0, message, pages=pages, engine=winner)
+
+    def _iter_whole(self, job, event, memory, attempts):
+        """Render a job in one piece.
+
+        Returns the page count and the name of the engine that rendered
+        it, trying the job's fallback engines as needed.
+        """
+        chain = [job.engine, *job.fallback]
+        # Engines of a chain are started as they are tried, so one that
+        # cannot start only fails its own attempt
+        engine = self.engine(job.engine) if len(chain) == 1 else None
+        label = getattr(ENGINES.get(job.engine), "label", job.engine)
+        yield event(
+            "html", 0.5, f"[{label}] Converting Markdown to HTML..."
+        )
+        with PeakMemory() as peak:
+            html = iter_html(
+                job.md_content, job.css_content, job.title, job.prune_css,
+                job.parser
+            )
+            # Only a single engine can consume the HTML as it streams
+            if engine is None or not engine.streams_html:
+                html = "".join(html)
+        memory["html"] = peak.peak
+
+        with PeakMemory() as peak:
+            if engine is not None:
+                message = f"Generating PDF with {engine.display_name}..."
+                yield event("render", 0.7, message)
+                # A failed or timed-out render must not cost the user the
+                # PDF already at the output path
+                path = part_path(job.output_path, engine.name)
+                try:
+                    render = RenderThread(
+                        engine, html, path, self.timeout(job, engine.name),
+                        options=_render_options(job)
+                    )
+                    pages = yield from self._iter_render(
+                        render, event, message, 0.7, 0.3
+                    )
+                except BaseException:
+                    _remove(path)
+                    raise
+                publish(path, job.output_path)
+                winner = engine.name
+            elif job.race:
+                pages, winner = yield from self._iter_race(
+                    job, chain, html, event, attempts
+                )
+            else:
+                pages, winner = yield from self._iter_fallback(
+                    job, chain, html, event, attempts
+                )
+        memory["render"] = peak.peak
+        return pages, winner
+
+    def _iter_fallback(self, job, chain, html, event, attempts):
+        """Try the engines in ``chain`` in turn until one succeeds."""
+        errors = []
+        for name in chain:
+            started = time.perf_counter()
+            path = None
+            try:
+                engine = self.engine(name)
+                message = f"Generating PDF with {engine.display_name}..."
+                if errors:
+                    message += f" (falling back after {errors[-1][0]} failed)"
+                yield event("render", 0.7, message)
+                path = part_path(job.output_path, name)
+                render = RenderThread(
+                    engine, html, path, self.timeout(job, name),
+                    options=_render_options(job)
+                )
+                pages = yield from self._iter_render(
+                    render, event, message, 0.7, 0.3
+                )
+                _check_pdf(path)
+            except Exception as e:
+                if path is not None:
+                    _remove(path)
+                errors.append((name, e))
+                attempts.append(_attempt(
+                    name, "failed", time.perf_counter() - started, e
+                ))
+                continue
+            publish(path, job.output_path)
+            attempts.append(
+                _attempt(name, "won", time.perf_counter() - started)
+            )
+            return pages, name
+        raise self._all_failed(errors)
+
+    def _iter_race(self, job, chain, html, event, attempts):
+        """Run every engine in ``chain`` at once; the first PDF wins.
+
+        The other renders are cancelled and their output discarded.
+        """
+        updates = queue.Queue()
+        running = []
+        errors = []
+        for name in chain:
+            try:
+                engine = self.engine(name)
+            except Exception as e:
+                errors.append((name, e))
+                attempts.append(_attempt(name, "failed", 0.0, e))
+                continue
+            running.append(RenderThread(
+                engine, html, part_path(job.output_path, name),
+                self.timeout(job, name), updates, _render_options(job)
+            ).start())
+        if not running:
+            raise self._all_failed(errors)
+
+        names = " and ".join(r.engine.display_name for r in running)
+        message = f"Racing {names}..."
+        yield event("render", 0.7, message)
+
+        winner, best, last_time = None, 0.0, time.perf_counter()
+        while running and winner is None:
+            for render in [r for r in running if r.expired()]:
+                render.cancel()
+                running.remove(render)
+                error = render.timeout_error()
+                errors.append((render.engine.name, error))
+                attempts.append(_attempt(
+                    render.engine.name, "failed", render.elapsed(), error
+                ))
+            try:
+                render, update = updates.get(timeout=RENDER_EVENT_INTERVAL)
+            except queue.Empty:
+                continue
+            if render not in running:
+                continue  # a late update from a render given up on
+            if update is not None:
+                now = time.perf_counter()
+                fraction = min(update[0], 1.0)
+                if fraction > best and (
+                        fraction - best >= RENDER_EVENT_STEP
+                        or now - last_time >= RENDER_EVENT_INTERVAL):
+                    best, last_time = fraction, now
+                    yield event(
+                        "render", 0.7 + 0.3 * best,
+                        f"{message} {render.engine.display_name} leads",
+                        pages=update[1]
+                    )
+                continue
+
+            running.remove(render)
+            error = render.error
+            if error is None:
+                try:
+                    _check_pdf(render.output_path)
+                except ConversionError as e:
+                    error = e
+            if error is None:
+                winner = render
+            else:
+                _remove(render.output_path)
+                errors.append((render.engine.name, error))
+                attempts.append(_attempt(
+                    render.engine.name, "failed", render.seconds, error
+                ))
+
+        for render in running:
+            render.cancel()
+            attempts.append(_attempt(
+                render.engine.name, "cancelled", render.elapsed()
+            ))
+        if winner is None:
+            raise self._all_failed(errors)
+        publish(winner.output_path, job.output_path)
+        attempts.append(_attempt(winner.engine.name, "won", winner.seconds))
+        return winner.pages, winner.engine.name
+
+    @staticmethod
+    def _all_failed(errors):
+        """Combine the errors of every engine tried into one."""
+        if len(errors) == 1:
+            return errors[0][1]
+        details = "; ".join(f"{name}: {error}" for name, error in errors)
+        error = ConversionError(f"All engines failed ({details})")
+        if all(isinstance(e, EngineTimeout) for _, e in errors):
+            error = EngineTimeout(f"All engines timed out ({details})")
+        return error
+
+    def _iter_sections(self, job, engine, sections, event, memory):
+        """Render a job section by section to keep memory bounded.
+
+        Each section becomes its own PDF in a temporary directory, with
+        its HTML dropped before the next one is built; the section PDFs
+        are merged into the output at the end. Returns the page count.
+        """
+        parts = split_markdown(job.md_content, sections)
+        memory["sections"] = len(parts)
+        message = (
+            f"Generating PDF with {engine.display_name} in "
+            f"{len(parts)} sections to save memory..."
+        )
+        if len(parts) == 1:
+            message = (
+                f"Generating PDF with {engine.display_name} in one piece: "
+                "the document has no headings, breaks or paragraphs to "
+                "split it at, so it may exceed the memory budget..."
+            )
+        yield event("render", 0.5, message)
+
+        span = 0.45 / len(parts)
+        with tempfile.TemporaryDirectory(prefix="dasmdf-") as spool:
+            paths = []
+            for number, part in enumerate(parts):
+                base = 0.5 + number * span
+                text = message
+                if len(parts) > 1:
+                    text += f" section {number + 1} of {len(parts)}"
+                with PeakMemory() as peak:
+                    html = iter_html(
+                        part, job.css_content, job.title, job.prune_css,
+                        job.parser
+                    )
+                    if not engine.streams_html:
+                        html = "".join(html)
+                memory["html"] = max(memory.get("html") or 0, peak.peak or 0)
+
+                path = os.path.join(spool, f"{number:05d}.pdf")
+                render = RenderThread(
+                    engine, html, path, self.timeout(job, engine.name),
+                    options=_render_options(job)
+                )
+                with PeakMemory() as peak:
+                    yield from self._iter_render(
+                        render, event, text, base, span
+                    )
+                memory["render"] = max(
+                    memory.get("render") or 0, peak.peak or 0
+                )
+                paths.append(path)
+                del html, render
+                gc.collect()
+
+            yield event("render", 0.95, f"{message} merging sections")
+            with PeakMemory() as peak:
+                pages = merge_pdfs(paths, job.output_path)
+            memory["merge"] = peak.peak
+        return pages
+
+    def _iter_render(self, render, event, message, base, span):
+        """Run one RenderThread, relaying its progress as events.
+
+        Engine progress is mapped onto ``base`` to ``base + span`` of the
+        job. Returns the engine's page count.
+        """
+        render_start = time.perf_counter()
+        last_fraction, last_time = 0.0, render_start
+        for fraction, done, total in render:
+            now = time.perf_counter()
+            if (fraction - last_fraction < RENDER_EVENT_STEP
+                    and now - last_time < RENDER_EVENT_INTERVAL):
+                continue
+            last_fraction, last_time = fraction, now
+
+            detail = []
+            if done:
+                detail.append(
+                    f"page {done} of {total}" if total else f"page {done}"
+                )
+            eta = None
+            elapsed = now - render_start
+            if 0.02 <= fraction < 1.0 and elapsed >= 1.0:
+                eta = elapsed * (1.0 - fraction) / fraction
+                detail.append(f"about {format_eta(eta)} left")
+            text = message
+            if detail:
+                text += " " + ", ".join(detail)
+            yield event(
+                "render", base + span * min(fraction, 1.0), text,
+                pages=done, eta=eta
+            )
+        return render.pages
+
+    def convert(self, job, on_event=None):
+        """Convert one job and return its final ``done`` event.
+
+        ``on_event`` is called with every ProgressEvent. Raises
+        ConversionError if the conversion fails.
+        """
+        for event in self.iter_convert(job):
+            if on_event is not None:
+                on_event(event)
+        if event.stage == "failed":
+            raise ConversionError(event.error)
+        return event
+
+    def convert_many(self, jobs):
+        """Convert several jobs in order, yielding all their events.
+
+        A failed job does not stop the batch; check each job's final
+        event to see how it went.
+        """
+        for index, job in enumerate(jobs):
+            yield from self.iter_convert(job, index)
+
+    def iter_variants(self, job, variants, pattern=DEFAULT_PATTERN,
+                      parallel=None):
+        """Render ``job`` in each of ``variants``, yielding their events.
+
+        The markdown is parsed and highlighted once; each variant wraps
+        that body in its own stylesheet and renders it on this converter's
+        engines, with up to ``parallel`` renders (by default all) running
+        at once. Output names follow ``pattern``, see
+        ``dasmdf.variants.variant_path``. Events carry the variant's
+        position in ``variants`` as ``job`` and every variant ends with
+        its own ``done`` or ``failed`` event. Each variant renders with
+        its engine alone: the job's fallback engines and the memory budget
+        do not apply.
+        """
+        start = time.perf_counter()
+        jobs = [job] * len(variants)
+
+        def event(index, stage, progress, message, **fields):
+            return ProgressEvent(
+                index, stage, progress, message, jobs[index].engine,
+                jobs[index].output_path, time.perf_counter() - start,
+                **fields
+            )
+
+        def failed(index, error):
+            name = jobs[index].engine
+            label = getattr(ENGINES.get(name), "label", name.upper())
+            return event(
+                index, "failed", 0.0,
+                f"[{label}] Conversion failed: {str(error)}",
+                error=str(error), error_type=type(error).__name__
+            )
+
+        try:
+            job = _resolve_links(job)
+            jobs = variant_jobs(job, variants, pattern)
+            for index in range(len(jobs)):
+                yield event(
+                    index, "html", 0.1,
+                    "Converting Markdown to HTML for all variants..."
+                )
+            body = render_body(job.md_content, job.parser)
+        except Exception as e:
+            for index in range(len(jobs)):
+                yield failed(index, e)
+            return
+
+        updates = queue.Queue()
+        pending = list(range(len(jobs)))
+        running = {}
+        messages = {}
+        shown = {}
+        try:
+            while pending or running:
+                while pending and len(running) < (parallel or len(jobs)):
+                    index = pending.pop(0)
+                    item = jobs[index]
+                    try:
+                        engine = self.engine(item.engine)
+                        html = wrap_html(
+                            body, item.css_content, item.title,
+                            item.prune_css
+                        )
+                        render = RenderThread(
+                            engine, html,
+                            part_path(item.output_path, engine.name),
+                            self.timeout(item, engine.name), updates,
+                            _render_options(item)
+                        )
+                    except Exception as e:
+                        yield failed(index, e)
+                        continue
+                    running[render.start()] = index
+                    messages[index] = (
+                        f"Generating {os.path.basename(item.output_path)} "
+                        f"with {engine.display_name}..."
+                    )
+                    shown[index] = (0.0, time.perf_counter())
+                    yield event(index, "render", 0.3, messages[index])
+
+                for render in [r for r in running if r.expired()]:
+                    render.cancel()
+                    yield failed(running.pop(render), render.timeout_error())
+                try:
+                    render, update = updates.get(
+                        timeout=RENDER_EVENT_INTERVAL
+                    )
+                except queue.Empty:
+                    continue
+                if render not in running:
+                    continue  # a late update from a render given up on
+                index = running[render]
+
+                if update is not None:
+                    fraction, done = min(update[0], 1.0), update[1]
+                    last_fraction, last_time = shown[index]
+                    now = time.perf_counter()
+                    if (fraction - last_fraction >= RENDER_EVENT_STEP
+                            or now - last_time >= RENDER_EVENT_INTERVAL):
+                        shown[index] = (fraction, now)
+                        yield event(
+                            index, "render", 0.3 + 0.7 * fraction,
+                            messages[index], pages=done
+                        )
+                    continue
+
+                del running[render]
+                error = render.error
+                if error is None:
+                    try:
+                        _check_pdf(render.output_path)
+                        if jobs[index].source_date is not None:
+                            make_reproducible(
+                                render.output_path, jobs[index].source_date
+                            )
+                    except (ConversionError, OSError) as e:
+                        error = e
+                if error is not None:
+                    _remove(render.output_path)
+                    yield failed(index, error)
+                    continue
+                publish(render.output_path, jobs[index].output_path)
+                yield event(
+                    index, "done", 1.0,
+                    f"[{render.engine.label}] Conversion completed "
+                    f"successfully!", pages=render.pages
+                )
+        finally:
+            # Stop whatever is still rendering if the caller gives up
+            for render in running:
+                render.cancel()
+
+    def close(self):
+        """Shut down every engine started by this converter."""
+        with self._lock:
+            engines, self._engines = self._engines, {}
+        for engine in engines.values():
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_converter = None
+_default_lock = threading.Lock()
+
+
+def default_converter():
+    """Return the process-wide converter used by the module functions."""
+    global _default_converter
+    with _default_lock:
+        if _default_converter is None:
+            _default_converter = Converter()
+            atexit.register(_default_converter.close)
+        return _default_converter
+
+
+def convert(md_content, output_path, engine="playwright", css_content="",
+            title="DasMDF Document", prune_css=False, on_event=None,
+            parser=None):
+    """Convert a markdown string to a PDF file.
+
+    Uses the shared default converter, so engines stay warm across calls.
+    Returns the final ProgressEvent and raises ConversionError on failure.
+    """
+    job = ConversionJob(
+        md_content, output_path, engine, css_content, title, prune_css,
+        parser
+    )
+    return default_converter().convert(job, on_event)
+
+
+def convert_many(jobs):
+    """Convert several ConversionJobs, yielding their ProgressEvents."""
+    return default_converter().convert_many(jobs)
+
+
+def iter_variants(job, variants, pattern=DEFAULT_PATTERN, parallel=None):
+    """Render a job in several variants from a single parse.
+
+    See ``Converter.iter_variants``; uses the shared default converter.
+    """
+    return default_converter().iter_variants(
+        job, variants, pattern, parallel
+    )
@@ -0,0 +1,159 @@
+"""
+DasMDF - Unused CSS pruning
+
+Drops style rules whose selectors can never match the generated document
+before it is handed to a rendering engine. The user's CSS, the Pygments
+stylesheet and any theme usually contain far more rules than a single
+document needs, and WeasyPrint's cascade cost grows with rules times
+elements.
+
+Pruning is conservative: a rule is kept unless every one of its selectors
+is known not to match any element of the document.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import cssselect2
+import tinycss2
+import tinyhtml5
+
+# Pseudo-classes whose state depends on interaction or on the engine rather
+# than on the document tree; rules using them are always kept.
+DYNAMIC_PSEUDO_CLASSES = (
+    'hover', 'active', 'focus', 'focus-within', 'focus-visible',
+    'visited', 'target', 'target-within', 'current', 'past', 'future',
+    'playing', 'paused', 'fullscreen', 'defined',
+)
+
+# Selector fragments for elements created at render time by scripts such
+# as MathJax; rules mentioning them are always kept.
+DEFAULT_KEEP = ('mjx', 'MathJax')
+
+# At-rules whose blocks contain style rules that can be pruned.
+CONDITIONAL_AT_RULES = ('media', 'supports', 'layer', 'container')
+
+STYLE_RE = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.S | re.I)
+
+_DYNAMIC_RE = re.compile(
+    r':(?:' + '|'.join(map(re.escape, DYNAMIC_PSEUDO_CLASSES)) + r')\b'
+)
+
+_CACHE_SIZE = 64
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def dom_shape(root):
+    """Return a hash of the document's tree structure.
+
+    Text content is ignored except for whether an element has any, which
+    is all a selector (``:empty``) can observe.
+    """
+    digest = hashlib.sha1()
+
+    def walk(element, depth):
+        attrs = sorted(element.attrib.items())
+        has_text = bool((element.text or '').strip())
+        digest.update(
+            f"{depth}|{element.tag}|{attrs}|{has_text}\n".encode('utf-8')
+        )
+        for child in element:
+            if isinstance(child.tag, str):
+                walk(child, depth + 1)
+
+    walk(root, 0)
+    return digest.hexdigest()
+
+
+def _keep_selector(prelude, elements, keep):
+    """Decide whether a rule with the given prelude may ever apply."""
+    source = tinycss2.serialize(prelude)
+    if any(fragment in source for fragment in keep):
+        return True
+    if _DYNAMIC_RE.search(source):
+        return True
+    try:
+        selectors = cssselect2.compile_selector_list(prelude)
+    except cssselect2.SelectorError:
+        return True
+    return any(
+        selector.test(element)
+        for selector in selectors
+        for element in elements
+    )
+
+
+def _prune_rules(rules, elements, keep):
+    """Return the serialized rules that can apply to ``elements``."""
+    kept = []
+    for rule in rules:
+        if rule.type == 'qualified-rule':
+            if _keep_selector(rule.prelude, elements, keep):
+                kept.append(tinycss2.serialize([rule]))
+        elif (rule.type == 'at-rule'
+                and rule.lower_at_keyword in CONDITIONAL_AT_RULES
+                and rule.content is not None):
+            inner = _prune_rules(
+                tinycss2.parse_rule_list(
+                    rule.content, skip_comments=True, skip_whitespace=True
+                ),
+                elements, keep
+            )
+            if inner:
+                prelude = tinycss2.serialize(rule.prelude)
+                kept.append(
+                    f"@{rule.at_keyword}{prelude}{{\n"
+                    + "\n".join(inner) + "\n}"
+                )
+        elif rule.type == 'at-rule':
+            kept.append(tinycss2.serialize([rule]))
+    return kept
+
+
+def prune_css(css_content, root, keep=DEFAULT_KEEP):
+    """Return ``css_content`` without rules that cannot match ``root``.
+
+    ``root`` is the document parsed by ``tinyhtml5.parse``. Results are
+    cached per (stylesheet, DOM shape) hash.
+    """
+    key = (
+        hashlib.sha1(css_content.encode('utf-8')).hexdigest(),
+        dom_shape(root),
+        tuple(keep),
+    )
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    wrapper = cssselect2.ElementWrapper.from_html_root(root)
+    elements = list(wrapper.iter_subtree())
+    rules = tinycss2.parse_stylesheet(
+        css_content, skip_comments=True, skip_whitespace=True
+    )
+    pruned = "\n".join(_prune_rules(rules, elements, keep))
+
+    with _cache_lock:
+        _cache[key] = pruned
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return pruned
+
+
+def prune_html(html_content, keep=DEFAULT_KEEP):
+    """Prune every ``<style>`` block of an HTML document against its DOM."""
+    styles = STYLE_RE.findall(html_content)
+    if not styles:
+        return html_content
+
+    # Match against the document as the engine will see it, minus the CSS
+    skeleton = STYLE_RE.sub(r'\1\3', html_content)
+    root = tinyhtml5.parse(skeleton)
+
+    return STYLE_RE.sub(
+        lambda m: m.group(1) + prune_css(m.group(2), root, keep) + m.group(3),
+        html_content
+    )
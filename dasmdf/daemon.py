@@ -0,0 +1,339 @@
+"""
+DasMDF - Conversion daemon
+
+A long-running process that keeps a warm Converter, with its engines,
+parser backends and caches, and serves conversion jobs over a Unix domain
+socket. The command-line client starts it on demand and it exits on its
+own after ``idle_timeout`` seconds without a request, so repeated
+conversions from scripts only pay for a socket round trip.
+
+Each connection carries one JSON request line, ``{"op": "convert", "job":
+{...ConversionJob fields...}}``, ``{"op": "ping"}`` or ``{"op": "stop"}``;
+``{"op": "variants", ...}`` also carries ``variants`` (a list of Variant
+fields), ``pattern`` and ``parallel``. Conversion requests also carry
+the client's ``DASMDF_*`` settings as ``env``, which the daemon applies
+while it works on them, and jobs carry the directory relative links are
+resolved against, so neither depends on how the daemon was started. The
+daemon answers with one JSON object per line; for conversions these are
+the ProgressEvents, the last one for each job or variant ``done`` or
+``failed``.
+
+This module only imports the converter inside the daemon itself, so the
+client side stays light.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict
+
+from .jobs import ConversionError, ConversionJob, ProgressEvent
+from .variants import DEFAULT_PATTERN, Variant
+
+SETTINGS_DIR = os.path.expanduser("~/.dasmdf")
+SOCKET_PATH = os.environ.get("DASMDF_SOCKET") or os.path.join(
+    SETTINGS_DIR, "daemon.sock"
+)
+LOG_PATH = os.path.join(SETTINGS_DIR, "daemon.log")
+IDLE_TIMEOUT = 600
+START_TIMEOUT = 15.0
+# Settings that belong to the daemon process rather than to a request
+DAEMON_SETTINGS = (
+    "DASMDF_CACHE_DIR", "DASMDF_CACHE_SIZE", "DASMDF_QUEUE",
+    "DASMDF_SOCKET", "DASMDF_WATCHDOG",
+)
+
+
+def client_env(environ=None):
+    """Return the ``DASMDF_*`` settings a request carries to the daemon."""
+    environ = os.environ if environ is None else environ
+    return {
+        name: value for name, value in environ.items()
+        if name.startswith("DASMDF_") and name not in DAEMON_SETTINGS
+    }
+
+
+def supported():
+    """Whether this platform has Unix domain sockets."""
+    return os.name == "posix" and hasattr(socket, "AF_UNIX")
+
+
+def _connect(path):
+    """Return a socket connected to the daemon, or None if none listens."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(message, path=SOCKET_PATH):
+    """Send one request to the daemon and yield its replies.
+
+    Raises ConnectionError when no daemon listens on ``path``.
+    """
+    sock = _connect(path)
+    if sock is None:
+        raise ConnectionError(f"No DasMDF daemon at {path}")
+    with sock, sock.makefile("rb") as replies:
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        for line in replies:
+            yield json.loads(line)
+
+
+def ping(path=SOCKET_PATH):
+    """Return the daemon's status, or None when it is not running."""
+    try:
+        return next(request({"op": "ping"}, path), None)
+    except (ConnectionError, ValueError):
+        return None
+
+
+def stop(path=SOCKET_PATH):
+    """Ask the daemon to exit; returns whether one was running."""
+    try:
+        return bool(list(request({"op": "stop"}, path)))
+    except (ConnectionError, ValueError):
+        return False
+
+
+def ensure_running(path=SOCKET_PATH, idle_timeout=IDLE_TIMEOUT):
+    """Start the daemon in the background unless it already runs."""
+    if ping(path) is not None:
+        return
+    os.makedirs(SETTINGS_DIR, exist_ok=True)
+    # The package may not be installed; run it from where it was found
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [package_root, env.get("PYTHONPATH")])
+    )
+    with open(LOG_PATH, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "dasmdf", "daemon", "--socket", path,
+             "--idle-timeout", str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, env=env,
+            start_new_session=True
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if ping(path) is not None:
+            return
+        time.sleep(0.05)
+    raise ConversionError(
+        f"The DasMDF daemon did not start; see {LOG_PATH}"
+    )
+
+
+def _iter_events(message, path):
+    """Send a conversion request and yield the ProgressEvents it returns."""
+    for reply in request(message, path):
+        if "request_error" in reply:
+            raise ConversionError(reply["request_error"])
+        yield ProgressEvent(**reply)
+
+
+def convert(job, on_event=None, path=SOCKET_PATH, idle_timeout=IDLE_TIMEOUT):
+    """Convert a ConversionJob in the daemon, starting it if needed.
+
+    Returns the final ``done`` event and raises ConversionError if the
+    conversion fails, like ``Converter.convert``.
+    """
+    ensure_running(path, idle_timeout)
+    event = None
+    message = {"op": "convert", "job": asdict(job), "env": client_env()}
+    for event in _iter_events(message, path):
+        if on_event is not None:
+            on_event(event)
+    if event is None or not event.finished:
+        raise ConversionError("The DasMDF daemon closed the connection.")
+    if event.stage == "failed":
+        raise ConversionError(event.error)
+    return event
+
+
+def iter_variants(job, variants, pattern=DEFAULT_PATTERN, parallel=None,
+                  path=SOCKET_PATH, idle_timeout=IDLE_TIMEOUT):
+    """Render a job's variants in the daemon, yielding their events.
+
+    Like ``Converter.iter_variants``, failed variants are reported by
+    their final event rather than raised.
+    """
+    ensure_running(path, idle_timeout)
+    message = {
+        "op": "variants", "job": asdict(job),
+        "variants": [asdict(variant) for variant in variants],
+        "pattern": pattern, "parallel": parallel, "env": client_env(),
+    }
+    finished = set()
+    for event in _iter_events(message, path):
+        if event.finished:
+            finished.add(event.job)
+        yield event
+    if len(finished) < len(variants):
+        raise ConversionError("The DasMDF daemon closed the connection.")
+
+
+class _Settings:
+    """Applies each request's settings to the environment while it runs.
+
+    The settings are process-wide, so requests with the same settings
+    run side by side and one with other settings waits until the running
+    ones have finished. ``on_change`` is called after the environment
+    changes.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._current = client_env()
+        self._active = 0
+        self._changed = threading.Condition()
+
+    @contextlib.contextmanager
+    def applied(self, env):
+        """Run the body with ``env``; None keeps the current settings."""
+        with self._changed:
+            while (env is not None and env != self._current
+                   and self._active):
+                self._changed.wait()
+            if env is not None and env != self._current:
+                for name in self._current:
+                    os.environ.pop(name, None)
+                os.environ.update(env)
+                self._current = dict(env)
+                if self.on_change is not None:
+                    self.on_change()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._active -= 1
+                self._changed.notify_all()
+
+
+def serve(path=SOCKET_PATH, idle_timeout=IDLE_TIMEOUT):
+    """Run the daemon in this process until it is idle or stopped.
+
+    Returns without serving when another daemon already listens on
+    ``path``.
+    """
+    import fcntl
+    import socketserver
+
+    from . import diagrams
+    from .converter import Converter
+    from .memory import budget_from_env
+    from .parsers import get_parser
+    from .wkhtml import find_wkhtmltopdf
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            server.begin()
+            try:
+                message = json.loads(self.rfile.readline())
+                op = message.get("op")
+                if op == "ping":
+                    self.send({"pid": os.getpid(), "jobs": server.jobs})
+                elif op == "stop":
+                    self.send({"stopping": True})
+                    threading.Thread(target=server.shutdown).start()
+                elif op == "convert":
+                    job = ConversionJob(**message["job"])
+                    server.jobs += 1
+                    with settings.applied(message.get("env")):
+                        for event in converter.iter_convert(job):
+                            self.send(asdict(event))
+                elif op == "variants":
+                    job = ConversionJob(**message["job"])
+                    variants = [Variant(**v) for v in message["variants"]]
+                    server.jobs += 1
+                    pattern = message.get("pattern", DEFAULT_PATTERN)
+                    with settings.applied(message.get("env")):
+                        for event in converter.iter_variants(
+                                job, variants, pattern,
+                                message.get("parallel")):
+                            self.send(asdict(event))
+                else:
+                    self.send({"request_error": f"Unknown request: {op!r}"})
+            except (ValueError, TypeError, KeyError) as e:
+                self.send({"request_error": f"Invalid request: {e}"})
+            except OSError:
+                pass  # the client went away
+            finally:
+                server.end()
+
+        def send(self, reply):
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self):
+            super().__init__(path, Handler)
+            self.jobs = 0
+            self._active = 0
+            self._last_request = time.monotonic()
+            self._lock = threading.Lock()
+
+        def begin(self):
+            with self._lock:
+                self._active += 1
+
+        def end(self):
+            with self._lock:
+                self._active -= 1
+                self._last_request = time.monotonic()
+
+        def watch_idle(self):
+            """Shut the server down once it has been idle long enough."""
+            while True:
+                time.sleep(1.0)
+                with self._lock:
+                    idle = time.monotonic() - self._last_request
+                    if not self._active and idle >= idle_timeout:
+                        break
+            self.shutdown()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Serialise startup so racing clients end up with a single daemon
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if ping(path) is not None:
+            return
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = Server()
+        os.chmod(path, 0o600)
+
+    converter = Converter(find_wkhtmltopdf())
+    get_parser()
+
+    def settings_changed():
+        converter.memory_budget = budget_from_env()
+        # Renderers are looked up once, through the settings' variables
+        diagrams.find_renderer.cache_clear()
+
+    settings = _Settings(settings_changed)
+    threading.Thread(
+        target=server.watch_idle, name="dasmdf-idle", daemon=True
+    ).start()
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        converter.close()
@@ -0,0 +1,189 @@
+"""
+DasMDF - Diagram fences
+
+Renders ``mermaid`` and ``dot``/``graphviz`` fenced blocks to inline SVG
+with locally installed renderers: Graphviz's ``dot`` and mermaid-cli's
+``mmdc``. Each diagram is cached on disk by a hash of its source, so
+unchanged diagrams cost nothing on later conversions, and the misses of
+a document are rendered in parallel before it is converted. Fences whose
+renderer is not installed, or that it rejects, stay highlighted code.
+
+``DASMDF_DOT`` and ``DASMDF_MMDC`` point at renderers outside the PATH.
+"""
+
+import functools
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import markdown2
+
+from .cache import DiskCache, content_hash
+
+# Fence languages, by the renderer that draws them
+LANGUAGES = {"mermaid": "mermaid", "dot": "graphviz", "graphviz": "graphviz"}
+
+# Executables, with the variables that override their location
+EXECUTABLES = {
+    "graphviz": ("dot", "DASMDF_DOT"),
+    "mermaid": ("mmdc", "DASMDF_MMDC"),
+}
+
+# Seconds one diagram may take; mermaid-cli starts a browser each time
+RENDER_TIMEOUT = 60
+
+# Below this many cache misses renderers are run one after another
+PARALLEL_THRESHOLD = 2
+
+# What comes before the <svg> element in renderer output
+_PROLOG_RE = re.compile(r'\A.*?(?=<svg\b)', re.DOTALL)
+
+_diagram_cache = DiskCache("diagrams", suffix=".html")
+
+
+@functools.lru_cache(maxsize=None)
+def find_renderer(renderer):
+    """Return the executable for ``renderer`` and a token of its version.
+
+    The token is the executable's modification time, which changes when
+    it is upgraded. Returns None when the renderer is not installed.
+    """
+    name, variable = EXECUTABLES[renderer]
+    path = os.environ.get(variable) or shutil.which(name)
+    if not path:
+        return None
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def renderable(language):
+    """Whether fences in ``language`` are drawn as diagrams here."""
+    renderer = LANGUAGES.get(language)
+    return renderer is not None and find_renderer(renderer) is not None
+
+
+def cache_key(language, source):
+    """Return the cache key for drawing ``source``."""
+    renderer = LANGUAGES[language]
+    return content_hash(renderer, find_renderer(renderer), source)
+
+
+def _run(command, source=None):
+    """Run a renderer and return its standard output."""
+    result = subprocess.run(
+        command, input=source, capture_output=True, text=True,
+        encoding="utf-8", timeout=RENDER_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "renderer failed")
+    return result.stdout
+
+
+def _draw(language, source):
+    """Render one diagram to SVG markup."""
+    renderer = LANGUAGES[language]
+    path = find_renderer(renderer)[0]
+    if renderer == "graphviz":
+        svg = _run([path, "-Tsvg"], source)
+    else:
+        with tempfile.TemporaryDirectory(prefix="dasmdf-") as directory:
+            source_path = os.path.join(directory, "diagram.mmd")
+            svg_path = os.path.join(directory, "diagram.svg")
+            with open(source_path, "w", encoding="utf-8") as f:
+                f.write(source)
+            # A per-diagram id keeps each diagram's styles to itself
+            svg_id = "mermaid-" + content_hash(source)[:12]
+            _run([path, "-i", source_path, "-o", svg_path, "-I", svg_id])
+            with open(svg_path, encoding="utf-8") as f:
+                svg = f.read()
+    svg = _PROLOG_RE.sub("", svg).strip()
+    if not svg.startswith("<svg"):
+        raise RuntimeError("renderer produced no SVG")
+    return f'<div class="diagram diagram-{renderer}">{svg}</div>'
+
+
+def _draw_or_none(language, source):
+    """Render one diagram, or return None if it cannot be drawn."""
+    try:
+        return _draw(language, source)
+    except (OSError, RuntimeError, subprocess.SubprocessError):
+        return None
+
+
+def render_diagram(language, source):
+    """Return the markup for a diagram fence, through the cache.
+
+    Returns None when the fence should stay code: its renderer is not
+    installed or rejects the source. Rejections are cached too, until
+    the source or the renderer changes.
+    """
+    if not renderable(language):
+        return None
+    source = source.rstrip("\n")
+    key = cache_key(language, source)
+    markup = _diagram_cache.get(key)
+    if markup is None:
+        markup = _draw_or_none(language, source) or ""
+        _diagram_cache.put(key, markup)
+    return markup or None
+
+
+def prerender(blocks):
+    """Render the cache misses among ``(language, source)`` fence blocks.
+
+    Renderers run as separate processes, so misses are drawn on threads,
+    as many at once as there are CPUs.
+    """
+    misses = {}
+    for language, source in blocks:
+        if not renderable(language):
+            continue
+        source = source.rstrip("\n")
+        key = cache_key(language, source)
+        if key not in misses and _diagram_cache.get(key) is None:
+            misses[key] = (language, source)
+    if not misses:
+        return
+
+    if len(misses) < PARALLEL_THRESHOLD:
+        results = [_draw_or_none(*block) for block in misses.values()]
+    else:
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+            results = list(pool.map(
+                lambda block: _draw_or_none(*block), misses.values()
+            ))
+    for key, markup in zip(misses, results):
+        # An empty entry records that the renderer rejected the source
+        _diagram_cache.put(key, markup or "")
+
+
+class DiagramFences(markdown2.FencedCodeBlocks):
+    """markdown2's fenced code blocks, drawing diagram fences as SVG."""
+
+    def _source(self, match):
+        """Return a fence's source the way markdown2 highlights it."""
+        indent = ' ' * (len(match.group(1)) - len(match.group(1).lstrip()))
+        _, source = self.md._uniform_outdent(
+            match.group(3)[:-1], max_outdent=indent
+        )
+        for key, sanitized in self.md.html_spans.items():
+            source = source.replace(key, sanitized)
+        for old, new in (("&amp;", "&"), ("&lt;", "<"), ("&gt;", ">")):
+            source = source.replace(old, new)
+        return source
+
+    def sub(self, match):
+        language = match.group(2)
+        if renderable(language):
+            markup = render_diagram(language, self._source(match))
+            if markup is not None:
+                # Hashed like raw HTML blocks, so no later pass scans it
+                key = markdown2._hash_text(markup)
+                self.md.html_blocks[key] = markup
+                return f"\n\n{key}\n\n"
+        return super().sub(match)
@@ -0,0 +1,101 @@
+"""
+DasMDF - Markdown to HTML
+
+Builds the styled HTML document that every rendering engine consumes.
+Formulas are pre-rendered by the parsers (see ``dasmdf.mathrender``);
+the MathJax script is only included when math is left for it.
+"""
+
+from pygments.formatters import HtmlFormatter
+
+from . import guard
+from .mathrender import body_needs_mathjax, needs_mathjax
+from .parsers import MARKDOWN_EXTRAS, get_parser  # noqa: F401
+
+MATHJAX_SCRIPT = (
+    '<script src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/'
+    'tex-mml-chtml.js"></script>'
+)
+
+
+def _head(css_content, title, mathjax=True):
+    """Return the document up to and including the opening body tag."""
+    pygments_css = HtmlFormatter(style="default").get_style_defs(
+        '.codehilite'
+    )
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <style>
+    pre, code {{
+            white-space: pre-wrap;
+            word-break: break-word;
+            overflow-wrap: anywhere;
+            }}
+        {css_content}
+        {pygments_css}
+    </style>
+    {MATHJAX_SCRIPT if mathjax else ""}
+
+</head>
+<body>
+    """
+
+
+def _tail(body):
+    """Return ``body`` followed by the closing tags."""
+    return f"""{body}
+</body>
+</html>"""
+
+
+def render_body(md_content, parser=None):
+    """Convert markdown to the document body, with cached highlighting.
+
+    The body does not depend on the stylesheet, so one body can be
+    wrapped for several themes with ``wrap_html``. Pathological input is
+    kept in check by ``dasmdf.guard``.
+    """
+    return guard.parse(md_content, parser)
+
+
+def wrap_html(body, css_content="", title="DasMDF Preview",
+              prune_css=False):
+    """Wrap a body from ``render_body`` in a complete styled document."""
+    html = _head(css_content, title, body_needs_mathjax(body)) + _tail(body)
+    if prune_css:
+        from .cssprune import prune_html
+        html = prune_html(html)
+    return html
+
+
+def iter_html(md_content, css_content="", title="DasMDF Preview",
+              prune_css=False, parser=None):
+    """Yield the HTML document in pieces as they become available.
+
+    The head is produced before the markdown is parsed, so a consumer
+    such as the wkhtmltopdf driver can start working on it right away.
+    With ``prune_css`` the styles can only be pruned once the body
+    exists, so the whole document is yielded in one piece. ``parser``
+    names the markdown backend, see ``dasmdf.parsers``.
+    """
+    if prune_css:
+        yield wrap_html(
+            render_body(md_content, parser), css_content, title, True
+        )
+        return
+
+    yield _head(css_content, title, needs_mathjax(md_content))
+    yield _tail(render_body(md_content, parser))
+
+
+def render_html(md_content, css_content="", title="DasMDF Preview",
+                prune_css=False, parser=None):
+    """Convert markdown to a complete HTML document with CSS styling."""
+    return "".join(
+        iter_html(md_content, css_content, title, prune_css, parser)
+    )
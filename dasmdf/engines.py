@@ -0,0 +1,559 @@
+"""
+DasMDF - Rendering engines
+
+Each engine turns an HTML document into a PDF file. Engine instances are
+meant to be kept and reused: heavy imports happen on first use and the
+Playwright engine keeps its browser running between documents.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sys
+import threading
+import time
+
+from .jobs import ConversionError
+from .pdf import count_pdf_pages
+from .qtdraft import qt_html, unsupported_features
+from .wkhtml import WkhtmlDriver, find_wkhtmltopdf
+
+ENGINES = {}
+
+# How often a running render checks whether it was cancelled
+CANCEL_POLL = 0.1
+
+
+def register_engine(cls):
+    """Make an engine class available under its ``name``."""
+    ENGINES[cls.name] = cls
+    return cls
+
+
+class Engine:
+    """Base class for rendering engines."""
+
+    name = None
+    label = None
+    display_name = None
+    # Whether render() consumes HTML chunks as they are produced
+    streams_html = False
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Render ``html`` (a string or iterable of chunks) to a PDF.
+
+        ``on_progress(fraction, pages_done, pages_total)`` is called from
+        the rendering thread as the engine makes progress; the page counts
+        may be None when unknown. ``cancel`` is a threading.Event set when
+        the result is no longer wanted; engines that can stop early raise
+        ConversionError, others finish and leave the output to be
+        discarded. ``page_size`` is a paper name such as ``A4`` or
+        ``Letter`` overriding the engine's default and the stylesheet.
+        ``max_pages`` asks for only the first pages, for previews; engines
+        stop as early as they can but may write more. ``profile`` is a
+        resolved quality Profile (see ``dasmdf.profiles``) whose settings
+        for this engine apply. ``source_date``, set for reproducible jobs,
+        is the time in seconds since 1970 to date the PDF with; engines
+        that write their dates where ``dasmdf.pdf.make_reproducible`` can
+        pin them afterwards may ignore it. Returns the page count, or
+        None.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held between renders."""
+
+
+class _WeasyPrintProgress(logging.Handler):
+    """Turn WeasyPrint's progress log records into progress callbacks.
+
+    WeasyPrint logs each step, and each page as it is laid out, to the
+    ``weasyprint.progress`` logger. The total is unknown until layout
+    ends, so it is estimated from the size of the HTML. Raising from a
+    record aborts the render, which is how cancellation reaches it.
+    """
+
+    # Fractions reached when each step starts; layout fills 0.1 to 0.85
+    STEPS = {'1': 0.0, '2': 0.02, '3': 0.04, '4': 0.07, '6': 0.85,
+             '7': 0.95}
+
+    def __init__(self, on_progress, estimated_pages, cancel=None):
+        super().__init__()
+        self.thread = threading.get_ident()
+        self.on_progress = on_progress or (lambda *args: None)
+        self.estimated_pages = estimated_pages
+        self.cancel = cancel
+        self.pages = 0
+
+    def emit(self, record):
+        # Only follow the render running on this handler's thread
+        if record.thread != self.thread or not isinstance(record.msg, str):
+            return
+        if self.cancel is not None and self.cancel.is_set():
+            raise ConversionError("Rendering was cancelled.")
+        step = record.msg[5:6] if record.msg.startswith('Step ') else None
+        if step == '5' and 'Page' in record.msg and record.args:
+            self.pages = max(self.pages, int(record.args[0]))
+            total = max(self.estimated_pages, self.pages + 1)
+            self.on_progress(0.1 + 0.75 * self.pages / total, self.pages,
+                             None)
+        elif step in self.STEPS:
+            pages = self.pages or None
+            self.on_progress(self.STEPS[step], pages,
+                             pages if step in '67' else None)
+
+
+@register_engine
+class WeasyPrintEngine(Engine):
+    """Pure-Python rendering through WeasyPrint."""
+
+    name = "weasyprint"
+    label = "WEASYPRINT"
+    display_name = "WeasyPrint"
+
+    # Initial guess of HTML characters per page, refined by each render
+    CHARS_PER_PAGE = 2500
+
+    _logger_lock = threading.Lock()
+    _logger_users = 0
+    _logger_state = None
+
+    def __init__(self):
+        """Import WeasyPrint once for the lifetime of the engine."""
+        from weasyprint import CSS, HTML
+        self._css = CSS
+        self._html = HTML
+        self.chars_per_page = self.CHARS_PER_PAGE
+
+    @classmethod
+    def _capture_progress(cls, handler):
+        """Route WeasyPrint's progress records to ``handler`` only.
+
+        The logger is raised to INFO without propagating while any render
+        listens, so progress never leaks into the application's logs.
+        """
+        logger = logging.getLogger('weasyprint.progress')
+        with cls._logger_lock:
+            if cls._logger_users == 0:
+                cls._logger_state = (logger.level, logger.propagate)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+            cls._logger_users += 1
+            logger.addHandler(handler)
+
+    @classmethod
+    def _release_progress(cls, handler):
+        """Undo ``_capture_progress`` for ``handler``."""
+        logger = logging.getLogger('weasyprint.progress')
+        with cls._logger_lock:
+            logger.removeHandler(handler)
+            cls._logger_users -= 1
+            if cls._logger_users == 0:
+                logger.setLevel(cls._logger_state[0])
+                logger.propagate = cls._logger_state[1]
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Convert HTML to PDF using WeasyPrint.
+
+        WeasyPrint compresses the dictionary holding the PDF's dates, so
+        ``source_date`` is set as the document's own dates instead.
+        """
+        if not isinstance(html, str):
+            html = "".join(html)
+
+        handler = None
+        if on_progress is not None or cancel is not None:
+            estimate = max(1, round(len(html) / self.chars_per_page))
+            handler = _WeasyPrintProgress(on_progress, estimate, cancel)
+            self._capture_progress(handler)
+        # Stylesheets passed to render() take precedence over the page's
+        stylesheets = None
+        if page_size:
+            stylesheets = [self._css(string=f"@page {{ size: {page_size}; }}")]
+        try:
+            document = self._html(string=html).render(
+                stylesheets=stylesheets
+            )
+            pages = len(document.pages)
+            if max_pages and pages > max_pages:
+                # Layout is all or nothing, but unwanted pages are not drawn
+                document = document.copy(document.pages[:max_pages])
+            if source_date is not None:
+                stamp = time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(source_date)
+                )
+                document.metadata.created = stamp
+                document.metadata.modified = stamp
+            document.write_pdf(
+                output_path, **(profile.weasyprint if profile else {})
+            )
+        finally:
+            if handler is not None:
+                self._release_progress(handler)
+
+        if pages:
+            # Smooth the estimate towards this document's density
+            self.chars_per_page = (
+                0.7 * self.chars_per_page + 0.3 * len(html) / pages
+            )
+        return pages
+
+
+@register_engine
+class WkhtmlEngine(Engine):
+    """Rendering through the wkhtmltopdf executable."""
+
+    name = "wkhtml"
+    label = "WKHTMLTOPDF"
+    display_name = "wkhtmltopdf"
+    streams_html = True
+
+    def __init__(self, wkhtmltopdf_path=None):
+        """Locate wkhtmltopdf unless a path is given."""
+        self.wkhtmltopdf_path = wkhtmltopdf_path or find_wkhtmltopdf()
+        if not self.wkhtmltopdf_path:
+            raise ConversionError("wkhtmltopdf executable not found.")
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Stream HTML into wkhtmltopdf and write the PDF to disk.
+
+        wkhtmltopdf cannot print a page range, so ``max_pages`` is
+        ignored.
+        """
+        options = dict(profile.wkhtml) if profile else {}
+        if profile is not None and not profile.uses_javascript:
+            options.update({
+                'enable-javascript': False, 'javascript-delay': False,
+                'disable-javascript': None,
+            })
+        if page_size:
+            options['page-size'] = page_size
+        driver = WkhtmlDriver(self.wkhtmltopdf_path)
+        finished = threading.Event()
+        if cancel is not None:
+            threading.Thread(
+                target=self._watch_cancel, args=(driver, cancel, finished),
+                name="dasmdf-wkhtml-cancel", daemon=True
+            ).start()
+        try:
+            pages = driver.render(
+                html, output_path, options=options, on_progress=on_progress
+            )
+        finally:
+            finished.set()
+        if cancel is not None and cancel.is_set():
+            raise ConversionError("Rendering was cancelled.")
+        return pages or count_pdf_pages(output_path)
+
+    @staticmethod
+    def _watch_cancel(driver, cancel, finished):
+        """Terminate wkhtmltopdf if the render is cancelled."""
+        while not finished.wait(CANCEL_POLL):
+            if cancel.is_set():
+                driver.terminate()
+                return
+
+
+@register_engine
+class QtDraftEngine(Engine):
+    """Quick drafts laid out by Qt's rich text engine.
+
+    Needs PyQt6 but no browser. Documents Qt cannot render faithfully
+    are refused with the reason, see ``dasmdf.qtdraft``, so a fallback
+    engine can take them.
+    """
+
+    name = "qt-draft"
+    label = "QT-DRAFT"
+    display_name = "Qt draft"
+
+    def __init__(self):
+        """Import Qt and make sure an application exists for its fonts.
+
+        Outside a Qt program, one is created on the offscreen platform.
+        Qt seeds its hash tables when QtCore loads, and QPdfWriter writes
+        font objects in hash order, so the seed is pinned first: without
+        that, reproducible PDFs would differ from process to process.
+        """
+        if "PyQt6.QtCore" not in sys.modules:
+            os.environ.setdefault("QT_HASH_SEED", "0")
+        self._pinned = os.environ.get("QT_HASH_SEED") == "0"
+        from PyQt6 import QtCore, QtGui
+        self._core = QtCore
+        self._gui = QtGui
+        self._app = QtCore.QCoreApplication.instance()
+        if self._app is None:
+            self._app = QtGui.QGuiApplication(
+                ["dasmdf", "-platform", "offscreen"]
+            )
+        elif not isinstance(self._app, QtGui.QGuiApplication):
+            raise ConversionError(
+                "The Qt draft engine needs a QGuiApplication, not a "
+                "QCoreApplication."
+            )
+
+    def _page_layout(self, setup, page_size):
+        """Return the QPageLayout for a PageSetup and a paper name."""
+        QtCore, QtGui = self._core, self._gui
+        size = page_size or setup.size
+        if isinstance(size, tuple):
+            qt_size = QtGui.QPageSize(
+                QtCore.QSizeF(*size), QtGui.QPageSize.Unit.Point
+            )
+        else:
+            size_id = getattr(QtGui.QPageSize.PageSizeId, size, None)
+            qt_size = QtGui.QPageSize(
+                size_id or QtGui.QPageSize.PageSizeId.A4
+            )
+        top, right, bottom, left = setup.margins
+        return QtGui.QPageLayout(
+            qt_size,
+            QtGui.QPageLayout.Orientation.Landscape if setup.landscape
+            else QtGui.QPageLayout.Orientation.Portrait,
+            QtCore.QMarginsF(left, top, right, bottom),
+            QtGui.QPageLayout.Unit.Point
+        )
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Lay the document out with QTextDocument and print each page.
+
+        Paper, margins and page background come from the stylesheet's
+        ``@page`` rule unless ``page_size`` is given. Relative image
+        paths are resolved from the working directory.
+        """
+        if not isinstance(html, str):
+            html = "".join(html)
+        reasons = unsupported_features(html)
+        if reasons:
+            raise ConversionError(
+                f"{self.display_name} cannot render this document "
+                f"faithfully: it uses {', '.join(reasons)}. Use a full "
+                "engine such as Playwright or WeasyPrint."
+            )
+        if source_date is not None and not self._pinned:
+            raise ConversionError(
+                f"{self.display_name} output is only reproducible when Qt "
+                "is loaded with QT_HASH_SEED=0; set it before starting "
+                "the program."
+            )
+        report = on_progress or (lambda *args: None)
+        report(0.0, None, None)
+        return self._on_qt_thread(
+            self._print, html, output_path, report, cancel, page_size,
+            max_pages
+        )
+
+    def _on_qt_thread(self, function, *args):
+        """Call ``function`` on a QThread and return its result.
+
+        Qt's text layout starts timers, which need a thread started by
+        Qt; renders may be requested from plain Python threads.
+        """
+        result = {}
+
+        def run():
+            try:
+                result["value"] = function(*args)
+            except BaseException as e:
+                result["error"] = e
+            finally:
+                thread.quit()
+
+        thread = self._core.QThread()
+        thread.started.connect(
+            run, self._core.Qt.ConnectionType.DirectConnection
+        )
+        thread.start()
+        thread.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["value"]
+
+    def _print(self, html, output_path, report, cancel, page_size,
+               max_pages):
+        """Lay ``html`` out and write its pages; returns the page count."""
+        QtCore, QtGui = self._core, self._gui
+        html, setup = qt_html(html)
+        writer = QtGui.QPdfWriter(output_path)
+        writer.setCreator("DasMDF")
+        writer.setPageLayout(self._page_layout(setup, page_size))
+        layout = writer.pageLayout()
+        area = QtCore.QRectF(layout.paintRectPixels(writer.resolution()))
+        paper = QtCore.QRectF(layout.fullRectPixels(writer.resolution()))
+        # The painter's origin is the top-left corner inside the margins
+        paper.translate(-area.left(), -area.top())
+        background = QtGui.QColor(setup.background or "")
+
+        # Lay out at the writer's resolution, one page per printed area;
+        # sized before the HTML is set, so it is laid out only once
+        document = QtGui.QTextDocument()
+        document.documentLayout().setPaintDevice(writer)
+        document.setPageSize(area.size())
+        document.setBaseUrl(
+            QtCore.QUrl.fromLocalFile(os.path.join(os.getcwd(), ""))
+        )
+        document.setHtml(html)
+        writer.setTitle(document.metaInformation(
+            QtGui.QTextDocument.MetaInformation.DocumentTitle
+        ))
+        total = document.pageCount()
+        pages = min(total, max_pages) if max_pages else total
+        report(0.2, None, pages)
+
+        painter = QtGui.QPainter(writer)
+        try:
+            for page in range(pages):
+                if cancel is not None and cancel.is_set():
+                    raise ConversionError("Rendering was cancelled.")
+                if page:
+                    writer.newPage()
+                if background.isValid():
+                    painter.fillRect(paper, background)
+                top = page * area.height()
+                painter.save()
+                painter.translate(0, -top)
+                document.drawContents(
+                    painter,
+                    QtCore.QRectF(0, top, area.width(), area.height())
+                )
+                painter.restore()
+                report(0.2 + 0.8 * (page + 1) / pages, page + 1, pages)
+        finally:
+            painter.end()
+        return pages
+
+
+@register_engine
+class PlaywrightEngine(Engine):
+    """Rendering through headless Chromium driven by Playwright.
+
+    Playwright's async API runs on an event loop owned by a background
+    thread, so the browser can stay warm while renders are requested from
+    any thread.
+    """
+
+    name = "playwright"
+    label = "PLAYWRIGHT"
+    display_name = "Playwright"
+
+    def __init__(self):
+        """Start the engine's event loop; the browser launches lazily."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="dasmdf-playwright",
+            daemon=True
+        )
+        self._thread.start()
+        self._playwright = None
+        self._browser = None
+        self._launch_lock = asyncio.Lock()
+
+    def _run(self, coro, cancel=None):
+        """Run a coroutine on the engine's loop and wait for its result.
+
+        Setting ``cancel`` cancels the coroutine, which closes its page.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if cancel is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL)
+            except concurrent.futures.TimeoutError:
+                if future.done():
+                    raise  # the coroutine itself timed out
+                if cancel.is_set():
+                    future.cancel()
+                    raise ConversionError("Rendering was cancelled.")
+
+    async def _get_browser(self):
+        """Return the shared browser, launching it if needed."""
+        async with self._launch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+            return self._browser
+
+    async def html_to_pdf_async(self, html_content, output_path,
+                                on_progress=None, page_size=None,
+                                max_pages=None, profile=None):
+        """Convert HTML to PDF using Playwright asynchronously.
+
+        Chromium reports nothing while it prints, so progress is given per
+        stage and the page count is read from the finished PDF. With
+        ``max_pages`` only that many pages are printed. A ``profile``
+        without JavaScript skips scripts and the wait for the network.
+        """
+        report = on_progress or (lambda *args: None)
+        report(0.0, None, None)
+        javascript = profile is None or profile.uses_javascript
+        options = {'format': 'A4', 'print_background': True}
+        if profile is not None:
+            options.update(profile.playwright)
+        if page_size:
+            options['format'] = page_size
+        if max_pages:
+            options['page_ranges'] = f"1-{max_pages}"
+        browser = await self._get_browser()
+        page = await browser.new_page(java_script_enabled=javascript)
+        try:
+            # Set HTML content and wait for network idle
+            report(0.1, None, None)
+            await page.set_content(
+                html_content,
+                wait_until="networkidle" if javascript else "load"
+            )
+
+            # Generate PDF with options
+            report(0.5, None, None)
+            pdf = await page.pdf(path=output_path, **options)
+        finally:
+            await page.close()
+        pages = count_pdf_pages(pdf)
+        report(1.0, pages, pages)
+        return pages
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Convert HTML to PDF in the warm browser."""
+        if not isinstance(html, str):
+            html = "".join(html)
+        return self._run(
+            self.html_to_pdf_async(
+                html, output_path, on_progress, page_size, max_pages,
+                profile
+            ),
+            cancel
+        )
+
+    async def _shutdown(self):
+        """Close the browser and stop Playwright."""
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        """Shut the browser down and stop the engine's event loop."""
+        if not self._loop.is_running():
+            return
+        try:
+            self._run(self._shutdown())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
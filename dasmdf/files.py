@@ -0,0 +1,59 @@
+"""
+DasMDF - Output files
+
+Outputs are rendered into a scratch file next to their destination and
+moved into place only once complete, so a failed or cancelled render
+never leaves a partial PDF behind. ``publish`` gives the finished file
+the permissions a plain ``open(path, 'wb')`` would have: those of the
+file it replaces, or the usual ones for the process umask, rather than
+the owner-only mode of a temporary file.
+"""
+
+import os
+import stat
+import tempfile
+
+
+def _umask():
+    """Return the process umask without changing it where possible."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+def output_mode(output_path):
+    """Return the permission bits a new file at ``output_path`` gets.
+
+    An existing file keeps its mode; otherwise it is 0666 less the umask.
+    """
+    try:
+        return stat.S_IMODE(os.stat(output_path).st_mode)
+    except OSError:
+        return 0o666 & ~_umask()
+
+
+def part_path(output_path, tag=None):
+    """Return a new scratch file next to ``output_path`` to render into.
+
+    ``tag`` tells apart the scratch files of renders racing for the same
+    output, e.g. the engine name.
+    """
+    directory, name = os.path.split(os.path.abspath(output_path))
+    suffix = f".{tag}.part" if tag else ".part"
+    fd, path = tempfile.mkstemp(prefix=f".{name}.", suffix=suffix,
+                                dir=directory)
+    os.close(fd)
+    return path
+
+
+def publish(part, output_path):
+    """Move the finished scratch file ``part`` to ``output_path``."""
+    os.chmod(part, output_mode(output_path))
+    os.replace(part, output_path)
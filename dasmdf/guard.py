@@ -0,0 +1,411 @@
+"""
+DasMDF - Input guard
+
+Keeps a malformed or hostile document from pinning a CPU in the markdown
+stage. Every document goes through ``parse`` on its way to HTML:
+
+* documents over ``DASMDF_MAX_INPUT`` (32M by default) are refused;
+* the constructs markdown2 recurses or backtracks on without end are
+  defused first: lists and quotes nested deeper than MAX_NESTING levels
+  are flattened, table rows wider than MAX_TABLE_COLUMNS cells are kept
+  as text, runs of more than MAX_BLANK_LINES blank lines are shortened
+  and HTML tags left open after MAX_TAG_ATTRIBUTES attributes are
+  escaped. A paragraph or list item with more than MAX_SPAN_MARKS
+  emphasis, strikethrough, code or link marks, or open tags, of one kind
+  keeps them as text: markdown2 scans the rest of the paragraph for the
+  close of each, in time that grows with their number times its length;
+* with process isolation turned on, see ``isolate_parses``, backends
+  whose parse time is not linear in their input (markdown2's regular
+  expressions) parse documents over ISOLATE_SIZE in a helper process,
+  kept warm between documents and killed once a parse takes longer than
+  ``DASMDF_PARSE_TIMEOUT`` seconds (30 by default). The document is then
+  parsed with a linear-time backend (markdown-it), or the conversion
+  fails when none is installed. The command line, the daemon and the
+  apps turn it on; library callers parse in-process.
+
+``python -m dasmdf.stress`` times the backends on a generated corpus of
+adversarial documents.
+"""
+
+import atexit
+import multiprocessing
+import os
+import re
+import threading
+
+from . import diagrams
+from .jobs import ConversionError
+from .memory import parse_size
+from .parsers import DEFAULT_ORDER, PARSERS, get_parser
+
+MAX_INPUT_SIZE = "32M"
+PARSE_TIMEOUT = 30.0
+# Documents up to this many characters parse in-process with any backend
+ISOLATE_SIZE = 8 * 1024
+MAX_NESTING = 32
+MAX_TABLE_COLUMNS = 512
+MAX_TAG_ATTRIBUTES = 12
+MAX_BLANK_LINES = 32
+# Marks of one kind a paragraph or list item may open before they are
+# kept as text
+MAX_SPAN_MARKS = 256
+# Columns of indentation per nesting level
+INDENT_WIDTH = 4
+# Parse processes kept warm for the next large document
+MAX_IDLE_PARSERS = 2
+
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_INDENT_RE = re.compile(r'^[ \t]+')
+_QUOTES_RE = re.compile(r'^(?:[ \t]*>)+')
+# A run of blank lines, and a blank line between blocks
+_BLANK_LINES_RE = re.compile(
+    r'(?:^[ \t]*\n){%d,}' % (MAX_BLANK_LINES + 1), re.M
+)
+_BLOCK_BREAK_RE = re.compile(r'(\n[ \t]*\n)')
+# The quote and list markers that open a line, or a thematic break
+_LEAD_RE = re.compile(
+    r'^[ \t]*(?:>[ \t]*)*(?:[*+-][ \t]+|\d{1,9}[.)][ \t]+)?'
+)
+_RULE_RE = re.compile(r'^[ \t]*([*_-])(?:[ \t]*\1){2,}[ \t]*$')
+_CODE_SPAN_RE = re.compile(r'((?<!`)(`+)(?!`)[^`]+\2(?!`))')
+# A tag that runs into the next tag or the end without closing
+_OPEN_TAG_RE = re.compile(r'<\w+[^<>]*(?=<|\Z)')
+# Span marks, by the character reference that keeps them as text
+_MARKS = {
+    "*": "&#42;", "_": "&#95;", "~": "&#126;", "`": "&#96;", "[": "&#91;"
+}
+
+
+def max_input_size():
+    """Return the largest document accepted, from DASMDF_MAX_INPUT."""
+    return parse_size(os.environ.get("DASMDF_MAX_INPUT") or MAX_INPUT_SIZE)
+
+
+def parse_timeout():
+    """Return the seconds a parse may take, from DASMDF_PARSE_TIMEOUT."""
+    return float(os.environ.get("DASMDF_PARSE_TIMEOUT") or PARSE_TIMEOUT)
+
+
+def _defuse_line(line):
+    """Flatten deep nesting and break up over-wide table rows."""
+    match = _QUOTES_RE.match(line)
+    if match and match.group().count(">") > MAX_NESTING:
+        line = ">" * MAX_NESTING + " " + line[match.end():].lstrip()
+    match = _INDENT_RE.match(line)
+    if match:
+        indent = match.group().expandtabs(INDENT_WIDTH)
+        if len(indent) > MAX_NESTING * INDENT_WIDTH:
+            line = " " * (MAX_NESTING * INDENT_WIDTH) + line[match.end():]
+    if line.count("|") > MAX_TABLE_COLUMNS + 1:
+        # Escaped pipes still send the table pattern backtracking
+        line = line.replace("\\|", "|").replace("|", "&#124;")
+    return line
+
+
+def _escape_open_tag(match):
+    """Escape a tag left open after too many attributes."""
+    tag = match.group()
+    if tag.count("=") < MAX_TAG_ATTRIBUTES:
+        return tag
+    return "&lt;" + tag[1:]
+
+
+def _escape_marks(text):
+    """Keep the span marks ``text`` has too many of as text.
+
+    Marks inside code spans are left alone, unless there are too many
+    backticks to tell code spans apart.
+    """
+    parts = _CODE_SPAN_RE.split(text)
+    # split() returns the code spans and their backtick runs at 1 and 2
+    # of every three parts
+    prose = parts[::3]
+    escapes = {
+        ord(mark): reference for mark, reference in _MARKS.items()
+        if sum(part.count(mark) for part in prose) > MAX_SPAN_MARKS
+    }
+    if not escapes:
+        return text
+    if ord("`") in escapes:
+        return text.translate(escapes)
+    for i in range(0, len(parts), 3):
+        parts[i] = parts[i].translate(escapes)
+    del parts[2::3]
+    return "".join(parts)
+
+
+def _defuse_unit(lines):
+    """Escape the marks of one paragraph or list item."""
+    leads = []
+    bodies = []
+    for line in lines:
+        end = len(line) if _RULE_RE.match(line) else (
+            _LEAD_RE.match(line).end()
+        )
+        leads.append(line[:end])
+        bodies.append(line[end:])
+    bodies = _escape_marks("\n".join(bodies)).split("\n")
+    return "\n".join(lead + body for lead, body in zip(leads, bodies))
+
+
+def _is_indented(line):
+    """Whether ``line`` is indented as far as a code block."""
+    match = _INDENT_RE.match(line)
+    return match is not None and (
+        len(match.group().expandtabs(INDENT_WIDTH)) >= INDENT_WIDTH
+    )
+
+
+def _defuse_block(block):
+    """Escape the open tags and span marks of a block between blanks."""
+    tags = _OPEN_TAG_RE.findall(block)
+    if len(tags) > MAX_SPAN_MARKS:
+        block = _OPEN_TAG_RE.sub(lambda m: "&lt;" + m.group()[1:], block)
+    elif tags:
+        block = _OPEN_TAG_RE.sub(_escape_open_tag, block)
+    # List items and table rows are parsed apart from their neighbours
+    units = [[]]
+    for line in block.split("\n"):
+        lead = _LEAD_RE.match(line).group().strip(" \t>")
+        if units[-1] and (lead or "|" in line):
+            units.append([])
+        units[-1].append(line)
+    return "\n".join(_defuse_unit(unit) for unit in units)
+
+
+def _defuse_prose(lines):
+    """Join lines of markdown outside fenced code and defuse its blocks."""
+    prose = _BLANK_LINES_RE.sub("\n" * MAX_BLANK_LINES, "".join(lines))
+    parts = _BLOCK_BREAK_RE.split(prose)
+    in_list = False
+    for i in range(0, len(parts), 2):
+        lines = [line for line in parts[i].split("\n") if line.strip()]
+        if lines and all(_is_indented(line) for line in lines):
+            if not in_list:
+                # Indented code
+                continue
+        else:
+            in_list = any(
+                _LEAD_RE.match(line).group().strip(" \t>")
+                for line in lines
+            )
+        parts[i] = _defuse_block(parts[i])
+    return "".join(parts)
+
+
+def defuse(md_content):
+    """Return ``md_content`` with the constructs that stall parsers defused.
+
+    Fenced code is left alone; the changes only touch documents nested
+    deeper, tables wider, blank runs longer or marks and tags more
+    numerous than the limits.
+    """
+    lines = []
+    prose = []
+    fence = None
+    for line in md_content.splitlines(keepends=True):
+        match = _FENCE_RE.match(line)
+        if fence is None:
+            if match:
+                fence = match.group(1)
+                lines.append(_defuse_prose(prose))
+                prose = []
+                lines.append(line)
+            else:
+                prose.append(_defuse_line(line))
+            continue
+        if match and match.group(1)[0] == fence[0] and (
+                len(match.group(1)) >= len(fence)):
+            fence = None
+        lines.append(line)
+    lines.append(_defuse_prose(prose))
+    return "".join(lines)
+
+
+def _settings():
+    """Return the ``DASMDF_*`` settings of this process."""
+    return {
+        name: value for name, value in os.environ.items()
+        if name.startswith("DASMDF_")
+    }
+
+
+def _apply_settings(settings):
+    """Switch this process to the ``DASMDF_*`` settings of a caller.
+
+    Parse processes are forked from a fork server started with the
+    settings of its time, and the caller's may have changed since.
+    """
+    current = _settings()
+    if settings == current:
+        return
+    for name in current:
+        del os.environ[name]
+    os.environ.update(settings)
+    diagrams.find_renderer.cache_clear()
+
+
+def _serve_parses(conn):
+    """Parse the documents sent over ``conn`` until it is closed.
+
+    Each comes with the settings to parse it with.
+    """
+    while True:
+        try:
+            name, md_content, settings = conn.recv()
+        except EOFError:
+            break
+        _apply_settings(settings)
+        try:
+            reply = (True, get_parser(name).to_html(md_content))
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+def _context():
+    """Return the cheapest start method that is safe in threaded callers.
+
+    A fork server forks parse processes from a process that has already
+    imported the parsers; where there is none, they are spawned.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class _ParseProcess:
+    """A process parsing documents for the guard, kept warm between them."""
+
+    def __init__(self):
+        context = _context()
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve_parses, args=(child,), name="dasmdf-parse",
+            daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def parse(self, name, md_content, timeout):
+        """Return the body, or raise ConversionError on failure or timeout.
+
+        The process is killed unless it answered.
+        """
+        try:
+            self.conn.send((name, md_content, _settings()))
+            if not self.conn.poll(timeout):
+                raise ConversionError(
+                    f"Parsing with {name} took longer than {timeout:g} s."
+                )
+            ok, result = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise ConversionError(
+                f"Parsing with {name} failed: the parser process crashed."
+            ) from e
+        except BaseException:
+            self.kill()
+            raise
+        if not ok:
+            raise ConversionError(f"Parsing with {name} failed: {result}")
+        return result
+
+    def kill(self):
+        """Stop the process at once."""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+_idle = []
+_idle_lock = threading.Lock()
+_isolate = False
+
+
+def isolate_parses(enabled=True):
+    """Parse large documents with slow backends in helper processes.
+
+    Helpers are started the way multiprocessing starts processes, which
+    imports the main module again: call this from programs that guard
+    their entry point with ``if __name__ == "__main__":``.
+    """
+    global _isolate
+    _isolate = enabled
+    if not enabled:
+        _stop_idle()
+
+
+@atexit.register
+def _stop_idle():
+    """Kill the helpers kept warm for the next document."""
+    with _idle_lock:
+        helpers = list(_idle)
+        del _idle[:]
+    for helper in helpers:
+        helper.kill()
+
+
+def _parse_isolated(name, md_content, timeout):
+    """Parse with backend ``name`` in a process killed after ``timeout``."""
+    with _idle_lock:
+        helper = _idle.pop() if _idle else None
+    if helper is None:
+        helper = _ParseProcess()
+    try:
+        return helper.parse(name, md_content, timeout)
+    finally:
+        if not helper.conn.closed:
+            with _idle_lock:
+                if len(_idle) < MAX_IDLE_PARSERS:
+                    _idle.append(helper)
+                    helper = None
+            if helper is not None:
+                helper.kill()
+
+
+def _linear_parser():
+    """Return the preferred installed linear-time backend, or None."""
+    for name in (*DEFAULT_ORDER, *PARSERS):
+        cls = PARSERS[name]
+        if cls.linear and cls.available():
+            return get_parser(name)
+    return None
+
+
+def parse(md_content, parser=None, timeout=None, on_fallback=None):
+    """Convert markdown to an HTML body within the input limits.
+
+    ``parser`` names the backend, see ``get_parser``; ``timeout``
+    overrides DASMDF_PARSE_TIMEOUT for isolated parses. ``on_fallback``
+    is called with the linear-time backend and the error before that
+    backend takes over a document the first one could not parse in time.
+    Raises ConversionError for documents over the size limit, and for
+    those a backend could not parse in time when no linear-time one is
+    installed.
+    """
+    size = len(md_content.encode("utf-8"))
+    limit = max_input_size()
+    if size > limit:
+        raise ConversionError(
+            f"The document is {size:,} bytes, over the {limit:,}-byte "
+            f"limit (DASMDF_MAX_INPUT)."
+        )
+    md_content = defuse(md_content)
+    backend = get_parser(parser)
+    if not _isolate or backend.linear or len(md_content) <= ISOLATE_SIZE:
+        return backend.to_html(md_content)
+    try:
+        return _parse_isolated(
+            backend.name, md_content,
+            parse_timeout() if timeout is None else timeout
+        )
+    except ConversionError as e:
+        fallback = _linear_parser()
+        if fallback is None:
+            raise
+        if on_fallback is not None:
+            on_fallback(fallback, e)
+        return fallback.to_html(md_content)
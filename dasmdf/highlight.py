@@ -0,0 +1,238 @@
+"""
+DasMDF - Cached syntax highlighting
+
+A markdown2 ``Markdown`` subclass that memoizes Pygments lexer lookups and
+caches highlighted code blocks on disk, keyed by lexer, formatter options
+and a hash of the code. Before a document is converted, its fenced blocks
+are located and every cache miss is highlighted in parallel worker
+processes, or in-process when the pool cannot start or breaks, so the
+conversion itself mostly assembles cached HTML. The other parser
+backends share the cache through ``highlight_cached`` and
+``prehighlight``. Diagram fences are drawn instead, see
+``dasmdf.diagrams``.
+"""
+
+import atexit
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import markdown2
+import pygments
+from pygments import lexers, util
+
+from . import diagrams
+from .cache import DiskCache, content_hash
+
+# Below this many cache misses the pool's overhead outweighs its benefit.
+PARALLEL_THRESHOLD = 8
+
+_highlight_cache = DiskCache("highlight", suffix=".html")
+_pool = None
+_pool_lock = threading.Lock()
+# Set once a pool broke; misses are highlighted in-process from then on
+_pool_broken = False
+
+
+@functools.lru_cache(maxsize=256)
+def get_lexer(lexer_name):
+    """Return the Pygments lexer for ``lexer_name``, or None if unknown."""
+    try:
+        return lexers.get_lexer_by_name(lexer_name)
+    except util.ClassNotFound:
+        return None
+
+
+def cache_key(code, lexer, formatter_opts):
+    """Return the cache key for highlighting ``code`` with ``lexer``."""
+    return content_hash(
+        pygments.__version__, markdown2.__version__, lexer.name,
+        sorted(formatter_opts.items()), code
+    )
+
+
+def highlight_block(code, lexer_name, formatter_opts):
+    """Highlight one code block exactly as markdown2's codehilite does.
+
+    Runs in worker processes, so it only takes picklable arguments.
+    """
+    lexer = get_lexer(lexer_name)
+    return markdown2.Markdown._color_with_pygments(
+        None, code, lexer, **formatter_opts
+    )
+
+
+def _get_pool():
+    """Return the shared highlighting process pool, creating it lazily.
+
+    Conversions run in threaded processes (the apps, the daemon), which
+    cannot safely fork, so workers come from a fork server or are
+    spawned. Returns None once a pool has broken.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None and not _pool_broken:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 2, mp_context=context
+            )
+        return _pool
+
+
+def _drop_pool(pool, broken=False):
+    """Stop ``pool`` and forget it.
+
+    A ``broken`` pool, one that could not start its workers or lost one,
+    is not replaced: it breaks again when the main module cannot be
+    imported safely, see "Safe importing of main module" in the
+    multiprocessing documentation.
+    """
+    global _pool, _pool_broken
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+        _pool_broken = _pool_broken or broken
+    pool.shutdown(cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pool():
+    """Stop the highlighting workers before the interpreter exits."""
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        _drop_pool(pool)
+
+
+def highlight_cached(code, lexer, formatter_opts):
+    """Highlight ``code`` like markdown2's codehilite, through the cache."""
+    key = cache_key(code, lexer, formatter_opts)
+    colored = _highlight_cache.get(key)
+    if colored is None:
+        colored = markdown2.Markdown._color_with_pygments(
+            None, code, lexer, **formatter_opts
+        )
+        _highlight_cache.put(key, colored)
+    return colored
+
+
+def prehighlight(blocks, formatter_opts):
+    """Highlight the cache misses among ``(lexer_name, code)`` blocks.
+
+    Misses are highlighted in parallel worker processes once there are
+    enough of them to be worth it, and in-process when the pool cannot
+    start or a worker dies.
+    """
+    misses = {}
+    for lexer_name, code in blocks:
+        lexer = get_lexer(lexer_name)
+        if lexer is None:
+            continue
+        key = cache_key(code, lexer, formatter_opts)
+        if key not in misses and _highlight_cache.get(key) is None:
+            misses[key] = (code, lexer_name)
+    if not misses:
+        return
+
+    results = None
+    pool = _get_pool() if len(misses) >= PARALLEL_THRESHOLD else None
+    if pool is not None:
+        try:
+            results = list(pool.map(
+                highlight_block,
+                [code for code, _ in misses.values()],
+                [name for _, name in misses.values()],
+                [formatter_opts] * len(misses),
+                chunksize=max(1, len(misses) // (4 * (os.cpu_count() or 2)))
+            ))
+        except (BrokenProcessPool, OSError):
+            _drop_pool(pool, broken=True)
+    if results is None:
+        results = (
+            highlight_block(code, name, formatter_opts)
+            for code, name in misses.values()
+        )
+    for key, colored in zip(misses, results):
+        _highlight_cache.put(key, colored)
+
+
+class Markdown(markdown2.Markdown):
+    """markdown2 converter with cached and parallel code highlighting."""
+
+    def _setup_extras(self):
+        """Draw diagram fences, and render math through its cache."""
+        super()._setup_extras()
+        if 'fenced-code-blocks' in self.extra_classes:
+            self.extra_classes['fenced-code-blocks'] = diagrams.DiagramFences(
+                self, self.extras.get('fenced-code-blocks') or {}
+            )
+        if 'latex' in self.extra_classes:
+            from .mathrender import LatexExtra
+            self.extra_classes['latex'] = LatexExtra(
+                self, self.extras.get('latex') or {}
+            )
+
+    def _get_pygments_lexer(self, lexer_name):
+        """Look up lexers through a process-wide memo."""
+        return get_lexer(lexer_name)
+
+    def _color_with_pygments(self, codeblock, lexer, **formatter_opts):
+        """Serve highlighted blocks from the disk cache when possible."""
+        return highlight_cached(codeblock, lexer, formatter_opts)
+
+    def _unescape_special_chars(self, text):
+        """Skip the hash tables for text that holds no hashes.
+
+        markdown2 unescapes every table of contents entry through tables
+        that grow with the document.
+        """
+        if "md5-" not in text:
+            return text
+        return super()._unescape_special_chars(text)
+
+    def fenced_blocks(self, text):
+        """Yield ``(lexer_name, code)`` for the fenced blocks in ``text``.
+
+        Mirrors the normalisation markdown2 applies before its fenced code
+        block extra runs. A block this misses is simply highlighted during
+        conversion instead of ahead of time.
+        """
+        text = text.replace("\r\n", "\n").replace("\r", "\n") + "\n\n"
+        text = self._ws_only_line_re.sub("", self._detab(text))
+        fence_re = markdown2.FencedCodeBlocks.fenced_code_block_re
+        for match in fence_re.finditer(text):
+            lexer_name = match.group(2)
+            if not lexer_name:
+                continue
+            fence = match.group(1)
+            indent = ' ' * (len(fence) - len(fence.lstrip()))
+            _, code = self._uniform_outdent(
+                match.group(3)[:-1], max_outdent=indent
+            )
+            for old, new in (("&amp;", "&"), ("&lt;", "<"), ("&gt;", ">")):
+                code = code.replace(old, new)
+            yield lexer_name, code
+
+    def convert(self, text):
+        """Pre-render diagram and highlighting misses, then convert."""
+        if 'fenced-code-blocks' in self.extras:
+            blocks = list(self.fenced_blocks(text))
+            diagrams.prerender(blocks)
+            if 'codehilite' in self.extras:
+                prehighlight(
+                    [block for block in blocks
+                     if not diagrams.renderable(block[0])],
+                    self.extras.get('fenced-code-blocks') or {}
+                )
+        return super().convert(text)
+
+
+def markdown(text, extras=None):
+    """Drop-in replacement for ``markdown2.markdown``."""
+    return Markdown(extras=extras).convert(text)
@@ -0,0 +1,434 @@
+"""
+DasMDF - Durable job queue
+
+A SQLite-backed queue for large re-render campaigns. Any number of
+``dasmdf worker`` processes, on one host or on several sharing a
+filesystem, pull ConversionJobs from one database file and render them
+with a warm Converter.
+
+A worker claims a job with a lease, which a heartbeat renews while the
+job renders. When a worker crashes, is killed or loses the filesystem,
+its lease runs out and the next worker to look claims the job again.
+Failed jobs go back in the queue with exponential backoff until they
+have used up ``max_attempts``. PDFs are written next to their output
+path and moved into place only by the worker holding the job, so a
+half-written file never appears under the final name.
+
+    queue = JobQueue("campaign.sqlite3")
+    queue.add(ConversionJob(text, "/shared/out/notes.pdf", "weasyprint"))
+    JobQueue("campaign.sqlite3").work()   # in each worker process
+    print(queue.status())
+
+SQLite relies on the filesystem's locks, so across hosts the database
+must live where POSIX locks work, e.g. NFSv4 with locking enabled.
+Leases are compared against each host's clock, which must be kept in
+sync.
+"""
+
+import glob
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, replace
+
+from . import files
+from .jobs import ConversionJob
+
+QUEUE_PATH = os.environ.get("DASMDF_QUEUE") or os.path.join(
+    os.path.expanduser("~/.dasmdf"), "queue.sqlite3"
+)
+
+# Seconds a claim lasts without a heartbeat, and between heartbeats
+LEASE_SECONDS = 60.0
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+# Tries per job, and the delay before the first retry; each later retry
+# waits twice as long, up to RETRY_DELAY_MAX
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0
+RETRY_DELAY_MAX = 3600.0
+# Seconds an idle worker waits before looking for work again
+POLL_INTERVAL = 2.0
+# Seconds SQLite waits for another process's lock before giving up
+BUSY_TIMEOUT = 30.0
+# Completions counted in the reported throughput
+THROUGHPUT_WINDOW = 600.0
+
+STATES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    engine TEXT,
+    pages INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, available_at);
+"""
+
+
+def worker_name():
+    """Return a name for this process that is unique across hosts."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts``."""
+    return min(RETRY_DELAY_MAX, RETRY_DELAY * 2 ** max(0, attempts - 1))
+
+
+def _part_path(output_path):
+    """Return a scratch file next to ``output_path`` to render into."""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)),
+                exist_ok=True)
+    return files.part_path(output_path)
+
+
+def _stale_parts(output_path):
+    """Return the scratch files left for ``output_path`` by any worker."""
+    directory, name = os.path.split(os.path.abspath(output_path))
+    return glob.glob(
+        os.path.join(glob.escape(directory),
+                     glob.escape(f".{name}.") + "*.part")
+    )
+
+
+def _remove(path):
+    """Delete a file if it exists."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class JobQueue:
+    """A queue of ConversionJobs in the SQLite database at ``path``.
+
+    ``path`` defaults to ``DASMDF_QUEUE``, then
+    ``~/.dasmdf/queue.sqlite3``. An instance may be shared by threads;
+    each gets its own connection.
+    """
+
+    def __init__(self, path=None):
+        """Open the database, creating it and its table if needed."""
+        self.path = os.path.abspath(path or QUEUE_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        """Return this thread's connection."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block in a write transaction, taken up front."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def close(self):
+        """Close this thread's connection."""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def add(self, job, max_attempts=MAX_ATTEMPTS):
+        """Queue a ConversionJob; returns its id.
+
+        A relative output path is taken from the current directory.
+        """
+        job = replace(job, output_path=os.path.abspath(job.output_path))
+        with self._transaction() as db:
+            now = time.time()
+            cursor = db.execute(
+                "INSERT INTO jobs (job, max_attempts, available_at, "
+                "created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(asdict(job)), max(1, max_attempts), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker):
+        """Lease the next job that is due to ``worker``.
+
+        Jobs whose lease ran out are claimed again, or failed once they
+        have no attempts left. Returns ``(id, job, attempt)``, or None
+        when nothing is due.
+        """
+        with self._transaction() as db:
+            now = time.time()
+            db.execute(
+                "UPDATE jobs SET state = 'failed', finished_at = ?, "
+                "error = 'Abandoned by worker ' || worker "
+                "WHERE state = 'running' AND lease_until < ? "
+                "AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = db.execute(
+                "SELECT id, job, state, attempts, worker FROM jobs "
+                "WHERE (state = 'queued' AND available_at <= ?) "
+                "OR (state = 'running' AND lease_until < ?) "
+                "ORDER BY available_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            error = None
+            if row["state"] == "running":
+                error = f"Abandoned by worker {row['worker']}"
+            db.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, "
+                "attempts = attempts + 1, lease_until = ?, started_at = ?, "
+                "error = coalesce(?, error) WHERE id = ?",
+                (worker, now + LEASE_SECONDS, now, error, row["id"])
+            )
+        return (row["id"], ConversionJob(**json.loads(row["job"])),
+                row["attempts"] + 1)
+
+    def heartbeat(self, job_id, worker):
+        """Renew ``worker``'s lease; returns whether it still holds it."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? "
+                "AND state = 'running' AND worker = ?",
+                (time.time() + LEASE_SECONDS, job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, event, part_path, output_path):
+        """Move a rendered PDF into place and mark its job done.
+
+        Returns False, leaving ``part_path`` alone, when ``worker`` no
+        longer holds the job.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = 'done', finished_at = ?, "
+                "lease_until = NULL, engine = ?, pages = ?, error = NULL "
+                "WHERE id = ? AND state = 'running' AND worker = ?",
+                (time.time(), event.engine, event.pages, job_id, worker)
+            )
+            if cursor.rowcount != 1:
+                return False
+            # Inside the transaction, so a failed move rolls it back
+            files.publish(part_path, output_path)
+            return True
+
+    def fail(self, job_id, worker, error):
+        """Record a failed attempt: retry later, or fail for good.
+
+        Returns the job's new state, or None when ``worker`` no longer
+        holds it.
+        """
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? "
+                "AND state = 'running' AND worker = ?",
+                (job_id, worker)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row["attempts"] < row["max_attempts"]:
+                state, available_at = "queued", now + retry_delay(
+                    row["attempts"]
+                )
+            else:
+                state, available_at = "failed", now
+            db.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, "
+                "finished_at = ?, lease_until = NULL, error = ? "
+                "WHERE id = ?",
+                (state, available_at, now if state == "failed" else None,
+                 error, job_id)
+            )
+            return state
+
+    def release(self, job_id, worker):
+        """Give a claimed job back untried, e.g. when the worker stops."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET state = 'queued', available_at = ?, "
+                "attempts = attempts - 1, lease_until = NULL "
+                "WHERE id = ? AND state = 'running' AND worker = ?",
+                (time.time(), job_id, worker)
+            )
+
+    def retry_failed(self):
+        """Queue every failed job again with fresh attempts."""
+        with self._transaction() as db:
+            return db.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, "
+                "available_at = ?, finished_at = NULL WHERE state = 'failed'",
+                (time.time(),)
+            ).rowcount
+
+    def unfinished(self):
+        """Return the number of jobs queued or running."""
+        return self._db().execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def failed_jobs(self):
+        """Return ``(id, output_path, attempts, error)`` of failed jobs."""
+        return [
+            (row["id"], json.loads(row["job"])["output_path"],
+             row["attempts"], row["error"])
+            for row in self._db().execute(
+                "SELECT id, job, attempts, error FROM jobs "
+                "WHERE state = 'failed' ORDER BY id"
+            )
+        ]
+
+    def status(self, window=THROUGHPUT_WINDOW):
+        """Summarise the queue.
+
+        Returns a dict with the job count in each state, ``ready`` and
+        ``waiting`` (queued jobs due now, and waiting to be retried),
+        ``abandoned`` (running jobs whose lease ran out), ``workers``
+        (each live worker's running job count), the ``throughput`` in
+        jobs and ``pages`` per minute over the last ``window`` seconds,
+        the ``oldest`` queued job's age and an ``eta`` in seconds for
+        the backlog at that rate.
+        """
+        db = self._db()
+        now = time.time()
+        status = dict.fromkeys(STATES, 0)
+        status.update(db.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+        ).fetchall())
+        status["ready"], status["oldest"] = db.execute(
+            "SELECT COUNT(*), ? - MIN(created_at) FROM jobs "
+            "WHERE state = 'queued' AND available_at <= ?",
+            (now, now)
+        ).fetchone()
+        status["waiting"] = status["queued"] - status["ready"]
+        status["abandoned"] = db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'running' "
+            "AND lease_until < ?", (now,)
+        ).fetchone()[0]
+        status["workers"] = dict(db.execute(
+            "SELECT worker, COUNT(*) FROM jobs WHERE state = 'running' "
+            "AND lease_until >= ? GROUP BY worker ORDER BY worker", (now,)
+        ).fetchall())
+        jobs, pages = db.execute(
+            "SELECT COUNT(*), coalesce(SUM(pages), 0) FROM jobs "
+            "WHERE state = 'done' AND finished_at >= ?", (now - window,)
+        ).fetchone()
+        status["throughput"] = jobs * 60.0 / window
+        status["pages"] = pages * 60.0 / window
+        backlog = status["queued"] + status["running"]
+        status["eta"] = (backlog * window / jobs) if jobs else None
+        return status
+
+    def _render(self, job_id, job, worker, converter, on_event):
+        """Render one claimed job, renewing its lease meanwhile."""
+        try:
+            part_path = _part_path(job.output_path)
+        except OSError as e:
+            self.fail(job_id, worker, str(e))
+            return
+        finished = threading.Event()
+
+        def beat():
+            try:
+                while not finished.wait(HEARTBEAT_INTERVAL):
+                    try:
+                        if not self.heartbeat(job_id, worker):
+                            return  # claimed by another worker
+                    except sqlite3.Error:
+                        pass  # the lease may still be renewed next time
+            finally:
+                self.close()
+
+        heart = threading.Thread(
+            target=beat, name=f"dasmdf-heartbeat-{job_id}", daemon=True
+        )
+        heart.start()
+        event = None
+        error = None
+        try:
+            for event in converter.iter_convert(
+                    replace(job, output_path=part_path), job_id):
+                if on_event is not None:
+                    on_event(replace(event, output_path=job.output_path))
+            if event.stage == "done":
+                if self.complete(job_id, worker, event, part_path,
+                                 job.output_path):
+                    # Workers that crashed on this job left theirs behind
+                    for path in _stale_parts(job.output_path):
+                        _remove(path)
+                    return
+            else:
+                error = event.error
+        except Exception as e:
+            error = str(e)
+        except BaseException:
+            # Interrupted: the attempt does not count
+            self.release(job_id, worker)
+            raise
+        finally:
+            finished.set()
+            heart.join()
+            _remove(part_path)
+        if error is not None:
+            self.fail(job_id, worker, error)
+
+    def work(self, converter=None, worker=None, max_jobs=None,
+             exit_when_empty=False, on_event=None):
+        """Claim and render jobs until stopped; returns how many ran.
+
+        ``converter`` defaults to a new Converter, kept warm across
+        jobs. With ``exit_when_empty`` the loop ends once no job is
+        queued or running, otherwise it polls for new ones forever.
+        ``on_event`` receives every ProgressEvent; their ``job`` is the
+        queue's job id and their ``output_path`` the job's.
+        """
+        worker = worker or worker_name()
+        own = converter is None
+        if own:
+            from .converter import Converter
+            from .wkhtml import find_wkhtmltopdf
+            converter = Converter(find_wkhtmltopdf())
+        count = 0
+        try:
+            while max_jobs is None or count < max_jobs:
+                claimed = self.claim(worker)
+                if claimed is None:
+                    if exit_when_empty and not self.unfinished():
+                        break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                job_id, job, _ = claimed
+                self._render(job_id, job, worker, converter, on_event)
+                count += 1
+        finally:
+            if own:
+                converter.close()
+        return count
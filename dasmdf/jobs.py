@@ -0,0 +1,95 @@
+"""
+DasMDF - Jobs and progress events
+
+Plain data types shared by the converter and its front-ends.
+"""
+
+from dataclasses import dataclass
+
+
+class ConversionError(RuntimeError):
+    """Raised when a document cannot be converted."""
+
+
+class EngineTimeout(ConversionError):
+    """Raised when an engine runs past its time limit."""
+
+
+@dataclass
+class ConversionJob:
+    """One markdown document to render to one PDF file.
+
+    ``fallback`` lists engines tried in order when ``engine`` fails or
+    times out; with ``race`` they all start together with ``engine`` and
+    the first valid PDF wins. ``timeouts`` maps engine names to time
+    limits in seconds, overriding the converter's. ``page_size`` names
+    the paper, e.g. ``A4`` or ``Letter``; engines default to A4.
+    ``max_pages`` limits previews to their first pages, see
+    ``dasmdf.preview``. ``profile`` names the quality profile, see
+    ``dasmdf.profiles``; it defaults to ``DASMDF_PROFILE``, then ``final``.
+    ``source_date`` makes the PDF reproducible: it is dated that many
+    seconds after 1970 and its identifiers are pinned, so equal inputs
+    give byte-identical files; see ``dasmdf.pdf.source_date_epoch``.
+    ``base_dir`` is the directory relative image and stylesheet links
+    point into, normally the markdown file's; without it they are left
+    to the engine, which resolves them against the renderer's working
+    directory.
+    """
+
+    md_content: str
+    output_path: str
+    engine: str = "playwright"
+    css_content: str = ""
+    title: str = "DasMDF Document"
+    prune_css: bool = False
+    parser: str = None
+    fallback: tuple = ()
+    race: bool = False
+    timeouts: dict = None
+    page_size: str = None
+    max_pages: int = None
+    profile: str = None
+    source_date: int = None
+    base_dir: str = None
+
+
+@dataclass
+class ProgressEvent:
+    """A progress report for one job.
+
+    ``stage`` is one of ``prepare``, ``html``, ``render``, ``done`` or
+    ``failed``; ``progress`` is the job's completion between 0 and 1 and
+    ``elapsed`` the seconds since the job started. ``pages`` is the number
+    of pages rendered so far (the page count once the job is done) and
+    ``eta`` the estimated seconds left, when the engine reports them.
+    ``memory`` maps each stage run so far (``html``, ``render`` and, for
+    documents rendered in sections, ``merge``) to its peak resident
+    memory in bytes; ``sections`` is set when the low-memory mode was
+    used. Failed events name the kind of failure in ``error_type``: the
+    exception class, or ``timeout``, ``crash`` or ``memory`` when a
+    worker process was stopped by its pool.
+
+    With fallback or race strategies, ``engine`` is the engine that
+    produced the PDF once the job is done, and ``attempts`` lists every
+    engine tried as dicts with ``engine``, ``outcome`` (``won``,
+    ``failed``, ``timeout`` or ``cancelled``), ``seconds`` and ``error``.
+    """
+
+    job: int
+    stage: str
+    progress: float
+    message: str
+    engine: str
+    output_path: str
+    elapsed: float = 0.0
+    error: str = None
+    pages: int = None
+    eta: float = None
+    memory: dict = None
+    error_type: str = None
+    attempts: list = None
+
+    @property
+    def finished(self):
+        """Whether this is the last event of its job."""
+        return self.stage in ("done", "failed")
@@ -0,0 +1,174 @@
+"""
+DasMDF - Math pre-rendering
+
+Turns ``$...$`` and ``$$...$$`` formulas into markup before the engines
+see the document, so math renders the same on every engine, WeasyPrint
+included, without MathJax running in the page. Formulas become inline
+SVG when the optional ``ziamath`` package is installed, and MathML from
+``latex2mathml`` otherwise; ``DASMDF_MATH`` (``svg`` or ``mathml``)
+picks one explicitly. Each formula is cached on disk by a hash of its
+TeX source, so repeated conversions only assemble cached markup.
+
+MathJax is still loaded for what is left for it: TeX between ``\\(``
+and ``\\[`` delimiters, which the parsers do not convert, and MathML on
+engines that cannot lay it out themselves.
+"""
+
+import os
+import re
+from html import escape
+
+import markdown2
+
+from .cache import DiskCache, content_hash
+from .jobs import ConversionError
+
+MATH_FORMATS = ("svg", "mathml")
+
+# Font size ziamath lays formulas out at; SVGs are scaled to the text's
+# font size through em units
+SVG_FONT_SIZE = 20
+
+# Markdown with formulas the parsers convert, and with TeX delimiters
+# only MathJax understands
+_DOLLAR_RE = re.compile(r'\$[^\s$]|\$\$')
+_TEX_DELIMITER_RE = re.compile(r'\\[(\[]')
+# The root element's size, and the top of its viewBox
+_SVG_SIZE_RE = re.compile(
+    r' width="([\d.]+)" height="([\d.]+)"(?= viewBox="[-\d.]+ ([-\d.]+) )'
+)
+# Where markdown2's latex extra took out code it protects from math
+_CODE_PLACEHOLDER_RE = re.compile(r'<!--CODE_BLOCK_\d+-->')
+
+_math_cache = DiskCache("math", suffix=".html")
+
+
+def _ziamath():
+    """Return the ziamath module, or None when it is not installed."""
+    try:
+        import ziamath
+    except ImportError:
+        return None
+    return ziamath
+
+
+def math_format():
+    """Return the format formulas are rendered to: svg or mathml."""
+    name = os.environ.get("DASMDF_MATH", "").strip().lower()
+    if not name:
+        return "svg" if _ziamath() is not None else "mathml"
+    if name not in MATH_FORMATS:
+        raise ConversionError(
+            f"DASMDF_MATH must be one of {', '.join(MATH_FORMATS)}, "
+            f"not {name!r}."
+        )
+    if name == "svg" and _ziamath() is None:
+        raise ConversionError(
+            "DASMDF_MATH=svg requires the ziamath package."
+        )
+    return name
+
+
+def _to_mathml(tex, display):
+    """Convert TeX to MathML, as markdown2's latex extra does."""
+    import latex2mathml.converter
+    if display:
+        return latex2mathml.converter.convert(tex, display="block")
+    return latex2mathml.converter.convert(tex)
+
+
+def _to_svg(tex, display):
+    """Convert TeX to an SVG sized in ems and sitting on the baseline."""
+    svg = _ziamath().Latex(tex, size=SVG_FONT_SIZE, inline=not display).svg()
+    match = _SVG_SIZE_RE.search(svg)
+    if match:
+        width, height, top = (float(value) for value in match.groups())
+        # The viewBox starts at minus the ascent; the rest is the depth
+        depth = height + top
+        svg = (
+            f'{svg[:match.start()]} width="{width / SVG_FONT_SIZE:.3f}em" '
+            f'height="{height / SVG_FONT_SIZE:.3f}em" '
+            f'style="vertical-align: {-depth / SVG_FONT_SIZE:.3f}em" '
+            f'role="img" aria-label="{escape(tex)}"{svg[match.end():]}'
+        )
+    if display:
+        return (
+            '<div class="math-display" style="text-align: center; '
+            f'margin: 0.5em 0;">{svg}</div>'
+        )
+    return f'<span class="math">{svg}</span>'
+
+
+def _version(fmt):
+    """Return the version of the library rendering ``fmt``."""
+    if fmt == "svg":
+        return f"ziamath {_ziamath().__version__}"
+    import latex2mathml
+    return f"latex2mathml {getattr(latex2mathml, '__version__', '')}"
+
+
+def render_math(tex, display=False, fmt=None):
+    """Return the markup for one formula, through the cache.
+
+    ``fmt`` defaults to ``math_format()``. Formulas ziamath cannot lay
+    out fall back to MathML.
+    """
+    fmt = fmt or math_format()
+    key = content_hash(fmt, _version(fmt), SVG_FONT_SIZE, display, tex)
+    markup = _math_cache.get(key)
+    if markup is None:
+        if fmt == "svg":
+            try:
+                markup = _to_svg(tex, display)
+            except Exception:
+                markup = _to_mathml(tex, display)
+        else:
+            markup = _to_mathml(tex, display)
+        _math_cache.put(key, markup)
+    return markup
+
+
+def needs_mathjax(md_content):
+    """Whether the HTML for ``md_content`` leaves math for MathJax."""
+    if _TEX_DELIMITER_RE.search(md_content):
+        return True
+    return (math_format() == "mathml"
+            and _DOLLAR_RE.search(md_content) is not None)
+
+
+def body_needs_mathjax(body):
+    """Whether a rendered HTML body leaves math for MathJax."""
+    return "<math" in body or _TEX_DELIMITER_RE.search(body) is not None
+
+
+class LatexExtra(markdown2.Latex):
+    """markdown2's latex extra, rendering through ``render_math``.
+
+    Inline formulas are hashed out of the text until the end of the
+    conversion, so markdown2's later passes do not scan their markup.
+    """
+
+    def run(self, text):
+        # markdown2 keeps the code it protects from math in a class-wide
+        # dict that only grows, and restores it with one pass over the
+        # text per code span
+        self.code_blocks = {}
+        text = self._pre_code_block_re.sub(self.code_placeholder, text)
+        text = self._single_re.sub(self.code_placeholder, text)
+        text = self._triple_re.sub(self.code_placeholder, text)
+        text = self._single_dollar_re.sub(self._convert_single_match, text)
+        text = self._double_dollar_re.sub(self._convert_double_match, text)
+        return _CODE_PLACEHOLDER_RE.sub(self._restore_code, text)
+
+    def _restore_code(self, match):
+        code = self.code_blocks.get(match.group())
+        if code is None:
+            return match.group()
+        # Code blocks may hold the code spans taken out before them
+        return _CODE_PLACEHOLDER_RE.sub(self._restore_code, code)
+
+    def _convert_single_match(self, match):
+        return self.md._hash_span(render_math(match.group(1)))
+
+    def _convert_double_match(self, match):
+        return render_math(match.group(1).replace(r"\n", ''), display=True)
@@ -0,0 +1,257 @@
+"""
+DasMDF - Memory measurement and low-memory rendering
+
+Measures peak resident memory per conversion stage and decides when a
+document is too large to render in one piece under a memory budget. Such
+documents are split into sections at headings (or, in documents without
+enough of them, at thematic breaks and between paragraphs), each section
+is rendered to a PDF spooled on disk, and the section PDFs are merged at
+the end.
+
+The budget comes from ``Converter(memory_budget=...)`` or the
+``DASMDF_MEMORY_BUDGET`` environment variable (e.g. ``1.5G``). When
+psutil is installed, memory used by engine child processes (Chromium,
+wkhtmltopdf) is included in the measurements.
+"""
+
+import math
+import os
+import re
+import threading
+
+from .jobs import ConversionError
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLE_INTERVAL = 0.02
+
+# Initial guesses of peak memory growth per markdown character, refined
+# by every measured conversion.
+DEFAULT_BYTES_PER_CHAR = {
+    "weasyprint": 400,
+}
+FALLBACK_BYTES_PER_CHAR = 50
+
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.I)
+_FENCE_RE = re.compile(r'^[ \t]*`{3,}')
+_HEADING_RE = re.compile(r'^#{1,2}\s')
+_SUBHEADING_RE = re.compile(r'^#{3,6}(?:\s|$)')
+_BREAK_RE = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+_LIST_ITEM_RE = re.compile(r'^(?:[*+-]|\d{1,9}[.)])(?:\s|$)')
+# Split points from cleanest to least clean: level 1 and 2 headings,
+# other headings, thematic breaks, then any paragraph after a blank line
+SPLIT_LEVELS = 4
+
+
+def parse_size(value):
+    """Parse a size such as ``2G``, ``512M`` or ``1048576`` into bytes."""
+    if value is None or isinstance(value, int):
+        return value
+    match = _SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid memory size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** "_KMGT".index(unit.upper() or "_"))
+
+
+def budget_from_env():
+    """Return the memory budget from DASMDF_MEMORY_BUDGET, if set."""
+    return parse_size(os.environ.get("DASMDF_MEMORY_BUDGET") or None)
+
+
+def process_rss(pid):
+    """Return the resident memory of process ``pid`` and its children.
+
+    Children are only counted when psutil is available. Returns None
+    when the process is gone or the platform offers no way to measure.
+    """
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            total = process.memory_info().rss
+            children = process.children(recursive=True)
+        except psutil.Error:
+            return None
+        for child in children:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def current_rss():
+    """Return the resident memory of this process and its children."""
+    return process_rss(os.getpid())
+
+
+def format_size(size):
+    """Format a byte count in megabytes."""
+    return f"{size / (1024 * 1024):.0f} MB"
+
+
+class PeakMemory:
+    """Sample memory in the background while a block runs.
+
+    ``peak`` holds the highest resident memory seen, or None when memory
+    cannot be measured on this platform.
+    """
+
+    def __init__(self):
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(
+                target=self._run, name="dasmdf-memory", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+
+
+class MemoryModel:
+    """Predict the peak memory growth of a render from document size."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes_per_char = dict(DEFAULT_BYTES_PER_CHAR)
+
+    def estimate(self, engine, md_size):
+        """Return the expected memory growth for ``md_size`` characters."""
+        with self._lock:
+            factor = self._bytes_per_char.get(
+                engine, FALLBACK_BYTES_PER_CHAR
+            )
+        return factor * md_size
+
+    def observe(self, engine, md_size, growth):
+        """Learn from a measured render of ``md_size`` characters."""
+        if not md_size or growth is None or growth <= 0:
+            return
+        with self._lock:
+            factor = self._bytes_per_char.get(
+                engine, FALLBACK_BYTES_PER_CHAR
+            )
+            # Lean towards the larger figure, overshooting is cheaper
+            self._bytes_per_char[engine] = max(
+                0.5 * factor + 0.5 * growth / md_size, 0.8 * factor
+            )
+
+    def sections_needed(self, engine, md_size, baseline, budget):
+        """Return how many sections keep a render under ``budget``."""
+        if not budget or baseline is None:
+            return 1
+        headroom = budget - baseline
+        estimate = self.estimate(engine, md_size)
+        if headroom <= 0:
+            return max(2, math.ceil(md_size / 20000))
+        if estimate <= headroom:
+            return 1
+        # Keep a safety margin for the merge and allocator slack
+        return math.ceil(1.25 * estimate / headroom)
+
+
+def _split_level(line, after_blank):
+    """Return how cleanly a part can start at ``line``, or None.
+
+    Lower levels are cleaner, see SPLIT_LEVELS. Thematic breaks and
+    paragraphs only count after a blank line, where they cannot be a
+    setext underline or a lazy continuation; list items and indented
+    lines never do, as splitting there would cut a list in two.
+    """
+    if _HEADING_RE.match(line):
+        return 0
+    if _SUBHEADING_RE.match(line):
+        return 1
+    if not after_blank:
+        return None
+    if _BREAK_RE.match(line):
+        return 2
+    if line.strip() and not line[0].isspace() and (
+            not _LIST_ITEM_RE.match(line)):
+        return 3
+    return None
+
+
+def _split_lines(lines, target, level):
+    """Split at the first point of at most ``level`` after ``target``."""
+    parts, current, size = [], [], 0
+    in_fence, after_blank = False, False
+    for line in lines:
+        if not in_fence and current and size >= target:
+            here = _split_level(line, after_blank)
+            if here is not None and here <= level:
+                parts.append("".join(current))
+                current, size = [], 0
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        after_blank = not in_fence and not line.strip()
+        current.append(line)
+        size += len(line)
+    if current:
+        parts.append("".join(current))
+    return parts
+
+
+def split_markdown(md_content, sections):
+    """Split markdown into about ``sections`` parts.
+
+    Parts start before level 1 and 2 headings outside fenced code, so each
+    stays a well-formed document. Where those are too far apart, lower
+    headings, thematic breaks and finally paragraph starts are used too.
+    Returns a list of strings; a single one when the document cannot be
+    split at all, e.g. one long paragraph or code block.
+    """
+    lines = md_content.splitlines(keepends=True)
+    target = max(1, len(md_content) // max(1, sections))
+    for level in range(SPLIT_LEVELS):
+        parts = _split_lines(lines, target, level)
+        if max(map(len, parts), default=0) <= 2 * target:
+            break
+    return parts
+
+
+def merge_pdfs(paths, output_path):
+    """Concatenate the PDFs at ``paths`` into ``output_path``.
+
+    Needs the optional ``pypdf`` package.
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise ConversionError(
+            "Low-memory rendering needs the 'pypdf' package to merge "
+            "sections (pip install pypdf)."
+        )
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return len(writer.pages)
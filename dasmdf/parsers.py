@@ -0,0 +1,346 @@
+"""
+DasMDF - Markdown parser backends
+
+Every backend turns markdown into the same HTML body: strike-through,
+fenced code with cached Pygments highlighting, tables, heading ids for
+the table of contents, ``$``/``$$`` math pre-rendered to SVG or MathML
+and Mermaid and Graphviz fences drawn as SVG. ``markdown2`` is
+the reference implementation and the default. ``markdown-it``
+(markdown-it-py with mdit-py-plugins) parses several times faster but
+follows CommonMark where markdown2 does not: items of loose lists are
+wrapped in paragraphs and ``1)`` starts an ordered list. Set
+``DASMDF_PARSER`` or a job's ``parser`` to use it.
+
+Run ``python -m dasmdf.parsers [FILE...]`` to check the backends against
+the reference on the built-in corpus and the given documents, and to
+measure their throughput.
+"""
+
+import os
+import re
+import sys
+import time
+from collections import Counter
+from html import escape
+from html.parser import HTMLParser
+
+import markdown2
+
+from . import diagrams, highlight
+from .mathrender import render_math
+
+MARKDOWN_EXTRAS = [
+    'strike', 'fenced-code-blocks', 'codehilite', 'tables',
+    'toc', 'attr_list', 'latex'
+]
+
+# Size of the default benchmark document, in bytes
+BENCH_SIZE = 100 * 1024
+
+# Preferred backends, the reference first
+DEFAULT_ORDER = ("markdown2", "markdown-it")
+
+PARSERS = {}
+
+
+def register_parser(cls):
+    """Class decorator adding a parser backend to PARSERS."""
+    PARSERS[cls.name] = cls
+    return cls
+
+
+class Parser:
+    """Base class for markdown parser backends."""
+
+    name = None
+    label = None
+    # False when parse time can grow faster than the input, in which case
+    # the input guard parses large documents in a separate process
+    linear = True
+
+    @classmethod
+    def available(cls):
+        """Whether the backend's dependencies are installed."""
+        return True
+
+    def to_html(self, md_content):
+        """Convert markdown to an HTML body fragment."""
+        raise NotImplementedError
+
+
+@register_parser
+class Markdown2Parser(Parser):
+    """The original markdown2 pipeline, kept for compatibility."""
+
+    name = "markdown2"
+    label = "markdown2"
+    linear = False
+
+    def to_html(self, md_content):
+        return highlight.markdown(md_content, extras=MARKDOWN_EXTRAS)
+
+
+@register_parser
+class MarkdownItParser(Parser):
+    """markdown-it-py configured to match the markdown2 pipeline."""
+
+    name = "markdown-it"
+    label = "markdown-it-py"
+
+    @classmethod
+    def available(cls):
+        try:
+            import markdown_it  # noqa: F401
+            import mdit_py_plugins  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self):
+        from markdown_it import MarkdownIt
+        from mdit_py_plugins.dollarmath import dollarmath_plugin
+
+        self.md = (
+            MarkdownIt("commonmark", {"html": True})
+            .enable(["table", "strikethrough"])
+            .use(dollarmath_plugin, allow_space=True, allow_digits=True,
+                 double_inline=True)
+        )
+        self.md.add_render_rule("fence", _render_fence)
+        self.md.add_render_rule("math_inline", _render_math)
+        self.md.add_render_rule("math_inline_double", _render_math)
+        self.md.add_render_rule("math_block", _render_math_block)
+        self.md.add_render_rule("th_open", _render_cell)
+        self.md.add_render_rule("td_open", _render_cell)
+        self._slugify = markdown2._slugify
+
+    def to_html(self, md_content):
+        tokens = self.md.parse(md_content)
+        self._add_heading_ids(tokens)
+        blocks = [
+            (token.info.strip().split()[0], token.content)
+            for token in tokens
+            if token.type == "fence" and token.info.strip()
+        ]
+        diagrams.prerender(blocks)
+        highlight.prehighlight(
+            [block for block in blocks if not diagrams.renderable(block[0])],
+            {}
+        )
+        return self.md.renderer.render(tokens, self.md.options, {})
+
+    def _add_heading_ids(self, tokens):
+        """Give headings the ids markdown2's toc extra would."""
+        counts = Counter()
+        for token, inline in zip(tokens, tokens[1:]):
+            if token.type != "heading_open":
+                continue
+            header_id = self._slugify(inline.content)
+            counts[header_id] += 1
+            if not header_id or counts[header_id] > 1:
+                header_id += f"-{counts[header_id]}"
+            token.attrSet("id", header_id)
+
+
+def _render_fence(renderer, tokens, idx, options, env):
+    """Render fenced code through the shared highlighting cache.
+
+    Diagram fences are drawn as SVG when their renderer is installed.
+    """
+    token = tokens[idx]
+    info = token.info.strip().split()
+    if info:
+        markup = diagrams.render_diagram(info[0], token.content)
+        if markup is not None:
+            return markup + "\n"
+    lexer = highlight.get_lexer(info[0]) if info else None
+    if lexer is not None:
+        return highlight.highlight_cached(token.content, lexer, {})
+    code = escape(token.content, quote=False)
+    return f"<pre><code>{code}</code></pre>\n"
+
+
+def _render_math(renderer, tokens, idx, options, env):
+    """Render inline math like markdown2's latex extra."""
+    return render_math(tokens[idx].content)
+
+
+def _render_math_block(renderer, tokens, idx, options, env):
+    """Render display math as a block."""
+    return render_math(tokens[idx].content, display=True) + "\n"
+
+
+def _render_cell(renderer, tokens, idx, options, env):
+    """Write column alignment the way markdown2 does."""
+    token = tokens[idx]
+    style = token.attrGet("style")
+    if style and not style.endswith(";"):
+        token.attrSet("style", style + ";")
+    return renderer.renderToken(tokens, idx, options, env)
+
+
+_instances = {}
+
+
+def get_parser(name=None):
+    """Return the parser backend called ``name``.
+
+    Without a name, ``DASMDF_PARSER`` or the first installed backend of
+    DEFAULT_ORDER is used. Instances are shared, as building a backend is
+    not free.
+    """
+    name = name or os.environ.get("DASMDF_PARSER")
+    if name is None:
+        name = next(n for n in DEFAULT_ORDER if PARSERS[n].available())
+    if name not in _instances:
+        cls = PARSERS.get(name)
+        if cls is None or not cls.available():
+            raise ValueError(f"Markdown parser not available: {name}")
+        _instances[name] = cls()
+    return _instances[name]
+
+
+# Documents exercising every supported feature, and the list forms the
+# backends are known to disagree on
+CORPUS = {
+    "inline": (
+        "Some *em*, _em_, **strong**, __strong__ and ~~strike~~ text "
+        "with `code`, [a link](http://example.com \"title\") and "
+        "![an image](image.png).\n\nEntities & < > stay escaped.  \n"
+        "A hard break precedes this line.\n"
+    ),
+    "headings": (
+        "# Title\n\nText.\n\n## Section One\n\n## Section One\n\n"
+        "### With *emphasis* and `code`\n\nSetext\n======\n"
+    ),
+    "blocks": (
+        "> A quote\n> over two lines\n\n- one\n- two\n    - nested\n\n"
+        "1. first\n2. second\n\n---\n\n    indented code\n"
+    ),
+    "loose-list": (
+        "- **Windows**: add it to PATH\n- **Linux**:\n\n"
+        "  ```bash\n  sudo apt install wkhtmltopdf\n  ```\n"
+    ),
+    "paren-list": "1) first\n2) second\n",
+    "tables": (
+        "| Left | Centre | Right | Plain |\n"
+        "|:-----|:------:|------:|-------|\n"
+        "| a | b | c | d |\n| **1** | `2` | 3 | 4 |\n"
+    ),
+    "code": (
+        "```python\ndef f(x):\n    return x < 2 and \"&\"\n```\n\n"
+        "```\nno <language> here\n```\n\n"
+        "```javascript\nconst a = 1;\n```\n"
+    ),
+    "math": (
+        "Inline $x^2 + y_1$ and $\\alpha \\leq \\beta$ math.\n\n"
+        "$$\n\\frac{a}{b} = \\sum_{i=0}^{n} i\n$$\n\n"
+        "Code `$not math$` stays code.\n"
+    ),
+    "html": (
+        "<div class=\"note\">\nRaw <b>HTML</b> block\n</div>\n\n"
+        "Inline <span style=\"color: red\">html</span> too.\n"
+    ),
+}
+
+
+class _Canonical(HTMLParser):
+    """Reduce HTML to a comparable token list, ignoring formatting."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = sorted(
+            (key, re.sub(r"\s+|;$", "", value or "")) for key, value in attrs
+        )
+        self.items.append(("start", tag, tuple(attrs)))
+
+    def handle_endtag(self, tag):
+        self.items.append(("end", tag))
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if text:
+            self.items.append(("text", text))
+
+
+def canonical_html(html):
+    """Return ``html`` as a list of tags and whitespace-normalised text."""
+    parser = _Canonical()
+    parser.feed(html)
+    parser.close()
+    return parser.items
+
+
+def read_corpus(paths):
+    """Return the documents at ``paths`` as a corpus, keyed by path."""
+    corpus = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            corpus[path] = f.read()
+    return corpus
+
+
+def compare(name, reference="markdown2", corpus=None):
+    """Compare a backend's output with the reference on a corpus.
+
+    Returns a dict of document name to ``None`` when equivalent, or to
+    the first differing item of each output.
+    """
+    results = {}
+    for doc, text in (corpus or CORPUS).items():
+        expected = canonical_html(get_parser(reference).to_html(text))
+        actual = canonical_html(get_parser(name).to_html(text))
+        diff = None
+        for want, got in zip(expected + [None], actual + [None]):
+            if want != got:
+                diff = (want, got)
+                break
+        results[doc] = diff
+    return results
+
+
+def benchmark(name, text=None, min_time=1.0):
+    """Return a backend's parse throughput in MB/s.
+
+    ``text`` defaults to the corpus repeated to about 100 KB.
+    """
+    if text is None:
+        sample = "\n\n".join(CORPUS.values())
+        text = "\n\n".join([sample] * (BENCH_SIZE // len(sample) + 1))
+    parser = get_parser(name)
+    parser.to_html(text)  # warm the highlight cache
+    size = len(text.encode("utf-8"))
+    runs, start = 0, time.perf_counter()
+    while True:
+        parser.to_html(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return size * runs / elapsed / 2 ** 20
+
+
+def main(argv=None):
+    """Print the equivalence report and throughput of each backend.
+
+    Documents named in ``argv`` are compared besides the built-in corpus.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    corpus = {**CORPUS, **read_corpus(argv)}
+    names = [name for name, cls in PARSERS.items() if cls.available()]
+    failed = False
+    for name in names:
+        if name != "markdown2":
+            for doc, diff in compare(name, corpus=corpus).items():
+                if diff is not None:
+                    failed = True
+                    print(f"{name}: {doc} differs: expected {diff[0]}, "
+                          f"got {diff[1]}")
+        print(f"{name}: {benchmark(name):.2f} MB/s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+DasMDF - PDF helpers
+
+Small utilities for inspecting the PDFs produced by the engines, and for
+pinning the timestamps and identifiers they stamp into them, without a
+PDF library.
+"""
+
+import hashlib
+import os
+import re
+import time
+
+from .files import part_path, publish
+from .jobs import ConversionError
+
+# Page tree nodes, with /Count either after or before /Type /Pages
+_PAGES_COUNT_RE = re.compile(
+    rb'/Type\s*/Pages\b(?:(?!>>).)*?/Count\s+(\d+)'
+    rb'|/Count\s+(\d+)(?:(?!>>).)*?/Type\s*/Pages\b',
+    re.S
+)
+
+
+def count_pdf_pages(pdf):
+    """Return the page count of a PDF given as bytes or a file path.
+
+    Reads the /Count of the page tree; returns None when it cannot be
+    found, e.g. when the page tree sits in a compressed object stream.
+    """
+    if not isinstance(pdf, (bytes, bytearray)):
+        try:
+            with open(pdf, 'rb') as f:
+                pdf = f.read()
+        except OSError:
+            return None
+    counts = [
+        int(match.group(1) or match.group(2))
+        for match in _PAGES_COUNT_RE.finditer(pdf)
+    ]
+    return max(counts) if counts else None
+
+
+# Values engines stamp into each PDF: Info dictionary dates, XMP dates
+# and identifiers, and the trailer's file identifier
+_INFO_DATE_RE = re.compile(
+    rb'/(?:CreationDate|ModDate)\s*\(((?:[^()\\]|\\.)*)\)', re.DOTALL
+)
+# XMP properties are written as elements or, by Qt, as attributes
+_XMP_DATE_RE = re.compile(
+    rb'<xmp:(?:CreateDate|ModifyDate|MetadataDate)>([^<]*)</xmp:'
+    rb'|\bxmp:(?:CreateDate|ModifyDate|MetadataDate)="([^"]*)"'
+)
+_XMP_ID_RE = re.compile(
+    rb'<xmpMM:(?:DocumentID|InstanceID)>(?:uuid:)?([^<]*)</xmpMM:'
+    rb'|\bxmpMM:(?:DocumentID|InstanceID)="(?:uuid:)?([^"]*)"'
+)
+_FILE_ID_RE = re.compile(
+    rb'/ID\s*\[\s*<([0-9A-Fa-f]*)>\s*<([0-9A-Fa-f]*)>\s*\]'
+)
+
+
+def source_date_epoch():
+    """Return the time reproducible PDFs are dated with.
+
+    Follows the ``SOURCE_DATE_EPOCH`` convention of reproducible builds:
+    seconds since 1970, defaulting to 0 when the variable is unset.
+    """
+    value = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    try:
+        return int(value) if value else 0
+    except ValueError:
+        raise ConversionError(
+            f"SOURCE_DATE_EPOCH must be a whole number, not {value!r}."
+        ) from None
+
+
+def _fit(candidates, original, what):
+    """Return the first candidate as long as ``original``."""
+    for candidate in candidates:
+        if len(candidate) == len(original):
+            return candidate.encode('ascii')
+    raise ConversionError(
+        f"Cannot pin the {what} {original.decode('latin-1')!r}."
+    )
+
+
+def _pdf_date(epoch, original):
+    """Format ``epoch`` as a PDF date string at the length of ``original``.
+
+    Writers that escape characters in strings (``\\072`` for ``:``) leave
+    longer values than a plain date; those are padded with escapes a
+    reader discards, a backslash-newline or an octal escaped digit.
+    """
+    stamp = "D:" + time.strftime("%Y%m%d%H%M%S", time.gmtime(epoch))
+    # Dates may also be cut short after any component, e.g. D:2024
+    cut = [stamp[:length] for length in (6, 8, 10, 12, 14)]
+    candidates = [stamp + "+00'00'", stamp + "+00'00", stamp + "Z", stamp]
+    for candidate in candidates:
+        extra = len(original) - len(candidate)
+        if extra == 0 or extra >= 2:
+            if extra % 2:
+                candidate = f"D:\\{ord(stamp[2]):03o}{candidate[3:]}"
+                extra -= 3
+            return (candidate + "\\\n" * (extra // 2)).encode('ascii')
+    return _fit(candidates + cut, original, "PDF date")
+
+
+def _xmp_date(epoch, original):
+    """Format ``epoch`` like the XMP date ``original``, at its length."""
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(epoch))
+    return _fit(
+        [stamp + "+00:00", stamp + "Z", stamp, stamp[:10]],
+        original, "XMP date"
+    )
+
+
+def _sub_groups(pattern, data, replace):
+    """Replace each matched group of each match of ``pattern`` in ``data``.
+
+    ``replace(value)`` returns the new bytes for a group's value.
+    """
+    def substitute(match):
+        text = match.group(0)
+        start = match.start(0)
+        pieces, position = [], 0
+        for group in range(1, pattern.groups + 1):
+            begin, end = match.span(group)
+            if begin < 0:
+                continue  # an alternative that did not match
+            pieces += [text[position:begin - start],
+                       replace(match.group(group))]
+            position = end - start
+        return b"".join(pieces) + text[position:]
+    return pattern.sub(substitute, data)
+
+
+def make_reproducible(path, epoch=None):
+    """Pin the dates and identifiers engines stamp into a PDF file.
+
+    Creation and modification dates become ``epoch`` (by default
+    ``source_date_epoch()``) and identifiers are derived from a hash of
+    the rest of the file, so identical inputs give byte-identical files.
+    Every value keeps its length, which leaves the cross-reference
+    offsets valid. Values inside compressed object streams are out of
+    reach; engines that write those must pin them while rendering.
+    """
+    if epoch is None:
+        epoch = source_date_epoch()
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    data = _sub_groups(
+        _INFO_DATE_RE, data, lambda value: _pdf_date(epoch, value)
+    )
+    data = _sub_groups(
+        _XMP_DATE_RE, data, lambda value: _xmp_date(epoch, value)
+    )
+    # Hash the document with its identifiers blanked, then fill them in;
+    # the dashes of UUIDs stay where they are
+    for pattern in (_FILE_ID_RE, _XMP_ID_RE):
+        data = _sub_groups(
+            pattern, data, lambda value: re.sub(rb'[^-]', b'0', value)
+        )
+    digest = hashlib.sha256(data).hexdigest().encode('ascii') * 4
+
+    def identifier(value):
+        return bytes(
+            char if char == ord('-') else digest[index]
+            for index, char in enumerate(value)
+        )
+    for pattern in (_FILE_ID_RE, _XMP_ID_RE):
+        data = _sub_groups(pattern, data, identifier)
+
+    tmp_path = part_path(path)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    publish(tmp_path, path)
@@ -0,0 +1,331 @@
+"""
+DasMDF - Supervised worker pool
+
+Runs conversions in separate worker processes, each with its own warm
+Converter, so a native crash or a leak in an engine never takes down the
+caller. The pool enforces a wall-clock timeout and a memory limit per
+job, replaces workers that crash or are killed, and recycles workers
+after a number of jobs or once they have grown past a memory threshold.
+
+``WorkerPool`` mirrors the Converter interface. Every job ends with a
+``done`` or ``failed`` ProgressEvent; supervision failures set its
+``error_type`` to ``timeout``, ``crash`` or ``memory``.
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import weakref
+
+from .converter import Converter
+from .engines import ENGINES
+from .jobs import ConversionError, ProgressEvent
+from .memory import format_size, parse_size, process_rss
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# How often a running job is checked for timeout, crash and memory use
+POLL_INTERVAL = 0.2
+# Seconds a worker gets to exit cleanly before it is killed
+STOP_TIMEOUT = 5.0
+
+_pools = weakref.WeakSet()
+
+
+@atexit.register
+def _close_pools():
+    """Stop every pool's workers before multiprocessing joins them."""
+    for pool in list(_pools):
+        pool.close()
+
+
+def _worker_main(conn, wkhtmltopdf_path, memory_budget):
+    """Serve conversion jobs sent over ``conn`` until told to stop."""
+    if hasattr(os, "setpgid"):
+        # A group of its own, so the engine processes it starts can be
+        # killed with it even without psutil
+        os.setpgid(0, 0)
+    converter = Converter(wkhtmltopdf_path, memory_budget)
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            job, index = message
+            for event in converter.iter_convert(job, index):
+                conn.send(event)
+    finally:
+        converter.close()
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe."""
+
+    def __init__(self, context, args):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child,) + args, name="dasmdf-worker"
+        )
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def rss(self):
+        """Return the memory used by the worker and its engines."""
+        return process_rss(self.process.pid)
+
+    def failure(self):
+        """Describe why the worker process died."""
+        self.process.join(1.0)
+        code = self.process.exitcode
+        if code is None:
+            return "Worker process stopped responding."
+        if code < 0:
+            return f"Worker process crashed (signal {-code})."
+        return f"Worker process crashed (exit code {code})."
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not."""
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        """Kill the worker and any engine processes it started."""
+        if psutil is not None:
+            try:
+                children = psutil.Process(self.process.pid).children(
+                    recursive=True
+                )
+            except psutil.Error:
+                children = []
+            for child in children:
+                try:
+                    child.kill()
+                except psutil.Error:
+                    pass
+        elif hasattr(os, "killpg"):
+            try:
+                if os.getpgid(self.process.pid) == self.process.pid:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass  # already gone
+        self.process.kill()
+        self.process.join()
+
+
+class WorkerPool:
+    """Convert markdown documents in supervised worker processes.
+
+    ``size`` workers run at most, each started on first use. A job is
+    killed after ``timeout`` seconds or once its worker uses more than
+    ``rss_limit`` bytes (or a size such as ``"2G"``). Workers are
+    replaced after ``recycle_jobs`` jobs, or after a job that leaves them
+    above ``recycle_rss``.
+    """
+
+    def __init__(self, size=2, wkhtmltopdf_path=None, memory_budget=None,
+                 timeout=300, rss_limit=None, recycle_jobs=50,
+                 recycle_rss=None):
+        """Create a pool; worker processes are started on demand."""
+        self.size = size
+        self.timeout = timeout
+        self.rss_limit = parse_size(rss_limit)
+        self.recycle_jobs = recycle_jobs
+        self.recycle_rss = parse_size(recycle_rss)
+        self._args = (wkhtmltopdf_path, memory_budget)
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        _pools.add(self)
+
+    def _acquire(self):
+        """Wait for a free slot and return a live worker for it."""
+        self._slots.acquire()
+        try:
+            with self._lock:
+                if self._closed:
+                    raise ConversionError("The worker pool is closed.")
+                worker = self._idle.pop() if self._idle else None
+            if worker is not None and not worker.process.is_alive():
+                worker.stop()
+                worker = None
+            if worker is None:
+                worker = _Worker(self._context, self._args)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._busy.add(worker)
+        return worker
+
+    def _release(self, worker, healthy):
+        """Return a worker to the pool, or retire it."""
+        if not healthy:
+            if worker.process.is_alive():
+                worker.kill()
+        elif self.recycle_jobs and worker.jobs >= self.recycle_jobs:
+            healthy = False
+        elif self.recycle_rss and (worker.rss() or 0) >= self.recycle_rss:
+            healthy = False
+        with self._lock:
+            self._busy.discard(worker)
+            keep = healthy and not self._closed
+            if keep:
+                self._idle.append(worker)
+        if not keep:
+            worker.stop()
+        self._slots.release()
+
+    def _failure(self, job, index, start, error_type, error):
+        """Build the final event of a job the pool had to give up on."""
+        cls = ENGINES.get(job.engine)
+        label = cls.label if cls else job.engine.upper()
+        return ProgressEvent(
+            index, "failed", 0.0, f"[{label}] Conversion failed: {error}",
+            job.engine, job.output_path, time.perf_counter() - start,
+            error, error_type=error_type
+        )
+
+    def iter_convert(self, job, index=0):
+        """Convert one job in a worker, yielding its ProgressEvents.
+
+        The last event has stage ``done`` or ``failed``; failures are
+        reported through that event rather than raised.
+        """
+        start = time.perf_counter()
+        try:
+            worker = self._acquire()
+        except Exception as e:
+            yield self._failure(job, index, start, type(e).__name__, str(e))
+            return
+
+        healthy = False
+        try:
+            worker.jobs += 1
+            worker.conn.send((job, index))
+            dispatched = time.perf_counter()
+            while True:
+                if worker.conn.poll(POLL_INTERVAL):
+                    try:
+                        event = worker.conn.recv()
+                    except (EOFError, OSError):
+                        yield self._failure(
+                            job, index, start, "crash", worker.failure()
+                        )
+                        return
+                    yield event
+                    if event.finished:
+                        healthy = True
+                        return
+                    continue
+
+                if not worker.process.is_alive():
+                    yield self._failure(
+                        job, index, start, "crash", worker.failure()
+                    )
+                    return
+                if (self.timeout is not None
+                        and time.perf_counter() - dispatched > self.timeout):
+                    worker.kill()
+                    yield self._failure(
+                        job, index, start, "timeout",
+                        f"Conversion timed out after {self.timeout:g} s."
+                    )
+                    return
+                if self.rss_limit and (worker.rss() or 0) > self.rss_limit:
+                    worker.kill()
+                    yield self._failure(
+                        job, index, start, "memory",
+                        "Worker exceeded the memory limit of "
+                        f"{format_size(self.rss_limit)}."
+                    )
+                    return
+        finally:
+            self._release(worker, healthy)
+
+    def convert(self, job, on_event=None):
+        """Convert one job and return its final ``done`` event.
+
+        ``on_event`` is called with every ProgressEvent. Raises
+        ConversionError if the conversion fails.
+        """
+        for event in self.iter_convert(job):
+            if on_event is not None:
+                on_event(event)
+        if event.stage == "failed":
+            raise ConversionError(event.error)
+        return event
+
+    def convert_many(self, jobs):
+        """Convert several jobs in parallel, yielding all their events.
+
+        Events of different jobs interleave as workers report them; use
+        ``event.job`` to tell them apart. A failed job does not stop the
+        batch.
+        """
+        pending = queue.Queue()
+        for item in enumerate(jobs):
+            pending.put(item)
+        events = queue.Queue()
+
+        def drive():
+            try:
+                while True:
+                    try:
+                        index, job = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    for event in self.iter_convert(job, index):
+                        events.put(event)
+            finally:
+                events.put(None)
+
+        running = min(self.size, pending.qsize())
+        for _ in range(running):
+            threading.Thread(
+                target=drive, name="dasmdf-pool", daemon=True
+            ).start()
+        while running:
+            event = events.get()
+            if event is None:
+                running -= 1
+                continue
+            yield event
+
+    def close(self):
+        """Stop every worker; running jobs end as crashed."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            busy = list(self._busy)
+        for worker in busy:
+            if worker.process.is_alive():
+                worker.kill()
+        for worker in idle:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
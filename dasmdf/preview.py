@@ -0,0 +1,83 @@
+"""
+DasMDF - Quick-look previews
+
+Builds cut-down jobs that render only the first pages of a document, or
+the pages around a position in it, so styling can be checked in a
+fraction of the time a full conversion takes. Only the markdown likely
+to fill the requested pages is rendered, cut between blocks so code
+fences and tables stay whole, and engines that can stop early are asked
+for just those pages.
+
+    job = preview_job(job, pages=2, cursor=editor_position)
+    converter.convert(job)   # a short PDF of about two pages
+"""
+
+import re
+from dataclasses import replace
+
+PREVIEW_PAGES = 2
+
+# Markdown characters assumed to fill a page. Generous on purpose:
+# rendering a little too much is cheap, too little leaves pages short.
+CHARS_PER_PAGE = 3000
+
+_FENCE_RE = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+_HEADING_RE = re.compile(r'^#{1,6}\s')
+
+
+def _boundaries(md_content):
+    """Return the offsets where blocks start, and those of headings.
+
+    Offsets inside fenced code are never boundaries.
+    """
+    blocks, headings = [], []
+    offset, fence, after_blank = 0, None, True
+    for line in md_content.splitlines(keepends=True):
+        match = _FENCE_RE.match(line)
+        if fence is None:
+            if _HEADING_RE.match(line):
+                headings.append(offset)
+                blocks.append(offset)
+            elif after_blank and line.strip():
+                blocks.append(offset)
+            if match:
+                fence = match.group(1)[0]
+        elif match and match.group(1)[0] == fence:
+            fence = None
+        after_blank = fence is None and not line.strip()
+        offset += len(line)
+    return blocks, headings
+
+
+def preview_source(md_content, pages=PREVIEW_PAGES, cursor=None):
+    """Return the part of ``md_content`` a preview of ``pages`` renders.
+
+    Without ``cursor`` that is the start of the document; otherwise the
+    excerpt starts at the heading above the character offset ``cursor``,
+    or at the block holding it when that heading is far above. Link
+    reference definitions outside the excerpt are not carried along.
+    """
+    blocks, headings = _boundaries(md_content)
+    start = 0
+    if cursor:
+        start = max((b for b in blocks if b <= cursor), default=0)
+        heading = max((h for h in headings if h <= cursor), default=None)
+        if heading is not None and cursor - heading < CHARS_PER_PAGE:
+            start = heading
+    target = start + pages * CHARS_PER_PAGE
+    end = min((b for b in blocks if b >= target), default=len(md_content))
+    return md_content[start:end]
+
+
+def preview_job(job, pages=PREVIEW_PAGES, cursor=None, output_path=None):
+    """Return a job rendering a quick preview of ``job``.
+
+    The preview tries the job's engine and then its fallbacks one after
+    another, never racing them, and writes to ``output_path`` when one
+    is given.
+    """
+    return replace(
+        job, md_content=preview_source(job.md_content, pages, cursor),
+        output_path=output_path or job.output_path, race=False,
+        max_pages=pages
+    )
@@ -0,0 +1,171 @@
+"""
+DasMDF - Quality profiles
+
+Named sets of engine settings trading output quality for speed. ``final``
+keeps the full-quality settings used for print; ``draft`` lowers image
+resolution, skips JavaScript unless the document leaves math for MathJax
+to typeset, and skips font subsetting, so review copies render quickly.
+
+Custom profiles live in ``~/.dasmdf/profiles.json``, keyed by name:
+
+    {
+        "proof": {
+            "based_on": "draft",
+            "javascript": "always",
+            "wkhtml": {"image-dpi": 150},
+            "playwright": {"scale": 0.9},
+            "weasyprint": {"jpeg_quality": 80}
+        }
+    }
+
+``wkhtml`` entries are wkhtmltopdf options, ``playwright`` entries
+keyword arguments of Playwright's ``page.pdf()`` and ``weasyprint`` ones
+of ``write_pdf()``; a profile only lists what differs from the profile
+it is ``based_on`` (``final`` by default).
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field, replace
+
+from .cache import content_hash
+from .jobs import ConversionError
+from .mathrender import needs_mathjax
+
+PROFILES_PATH = os.path.join(
+    os.path.expanduser("~/.dasmdf"), "profiles.json"
+)
+DEFAULT_PROFILE = "final"
+
+# When JavaScript runs: always, never, or only for documents with math
+JAVASCRIPT_MODES = ("always", "auto", "never")
+
+# Parsed profile files by path, with the modification time they had
+_loaded = {}
+
+
+@dataclass
+class Profile:
+    """Engine settings for one quality level."""
+
+    name: str
+    javascript: str = "always"
+    wkhtml: dict = field(default_factory=dict)
+    playwright: dict = field(default_factory=dict)
+    weasyprint: dict = field(default_factory=dict)
+
+    def key(self):
+        """Return a digest of the settings, for use in cache keys."""
+        return content_hash(json.dumps(asdict(self), sort_keys=True))
+
+    def resolve(self, md_content):
+        """Return this profile with ``auto`` JavaScript decided for a text."""
+        if self.javascript != "auto":
+            return self
+        needed = needs_mathjax(md_content)
+        return replace(self, javascript="always" if needed else "never")
+
+    @property
+    def uses_javascript(self):
+        """Whether engines should run the document's scripts."""
+        return self.javascript != "never"
+
+
+BUILTIN_PROFILES = {
+    "final": Profile("final"),
+    "draft": Profile(
+        "draft", javascript="auto",
+        wkhtml={'dpi': 96, 'image-dpi': 96, 'image-quality': 60},
+        weasyprint={'dpi': 96, 'jpeg_quality': 60, 'optimize_images': True,
+                    'full_fonts': True},
+    ),
+}
+
+
+def _merge(base, settings, name):
+    """Build the profile ``name`` from ``settings`` over ``base``."""
+    javascript = settings.get("javascript", base.javascript)
+    if javascript not in JAVASCRIPT_MODES:
+        raise ConversionError(
+            f"Profile {name!r}: javascript must be one of "
+            f"{', '.join(JAVASCRIPT_MODES)}."
+        )
+    return Profile(
+        name, javascript,
+        {**base.wkhtml, **settings.get("wkhtml", {})},
+        {**base.playwright, **settings.get("playwright", {})},
+        {**base.weasyprint, **settings.get("weasyprint", {})},
+    )
+
+
+def load_profiles(path=PROFILES_PATH):
+    """Return the built-in profiles together with those stored at ``path``.
+
+    Stored profiles may replace built-in ones of the same name. The file
+    is read again only after it changes.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return dict(BUILTIN_PROFILES)
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _loaded[path] = (mtime, _read_profiles(path))
+    return dict(cached[1])
+
+
+def _read_profiles(path):
+    """Parse the profiles file at ``path``."""
+    profiles = dict(BUILTIN_PROFILES)
+    try:
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConversionError(f"Cannot read profiles from {path}: {e}")
+
+    if not isinstance(stored, dict) or not all(
+            isinstance(settings, dict) for settings in stored.values()):
+        raise ConversionError(
+            f"{path} must map profile names to their settings."
+        )
+    pending = dict(stored)
+    while pending:
+        progress = False
+        for name, settings in list(pending.items()):
+            base = settings.get("based_on", DEFAULT_PROFILE)
+            if base in pending and base != name:
+                continue  # build the base first
+            if base not in profiles:
+                raise ConversionError(
+                    f"Profile {name!r} is based on unknown profile {base!r}."
+                )
+            profiles[name] = _merge(profiles[base], settings, name)
+            del pending[name]
+            progress = True
+        if not progress:
+            raise ConversionError(
+                "Profiles are based on each other in a loop: "
+                f"{', '.join(pending)}."
+            )
+    return profiles
+
+
+def profile_names(path=PROFILES_PATH):
+    """Return the names of all profiles, built-in ones first."""
+    return list(load_profiles(path))
+
+
+def get_profile(name=None, path=PROFILES_PATH):
+    """Return the profile called ``name``.
+
+    Without a name, the ``DASMDF_PROFILE`` environment variable is used,
+    then ``final``. Raises ConversionError for unknown names.
+    """
+    name = name or os.environ.get("DASMDF_PROFILE") or DEFAULT_PROFILE
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ConversionError(
+            f"Unknown quality profile {name!r}; use one of "
+            f"{', '.join(profiles)}."
+        )
+    return profiles[name]
@@ -0,0 +1,483 @@
+"""
+DasMDF - Projects
+
+A project builds several PDFs from markdown fragments and shared
+stylesheets, and rebuilds only what changed. It is described by a JSON
+project file, ``dasmdf.json`` by default:
+
+    {
+        "css": "styles/manual.css",
+        "engine": "weasyprint",
+        "outputs": {
+            "build/manual.pdf": {"input": "manual.md", "title": "Manual"},
+            "build/cheatsheet.pdf": {"input": "cheatsheet.md",
+                                     "engine": "qt-draft,playwright"}
+        }
+    }
+
+Top-level settings apply to every output that does not set its own:
+``input``, ``css`` (a path or built-in theme, or a list of them),
+``title``, ``engine`` (a comma-separated list falls back in order),
+``page_size``, ``profile``, ``parser``, ``prune_css`` and
+``reproducible``. Paths are relative to the project file.
+
+A line ``!include path/to/part.md`` in a markdown file is replaced by
+that file, found relative to the including one. Includes nest, fenced
+code is left alone. Local images and the files stylesheets refer to are
+linked by absolute path, so documents render the same wherever they are
+built from.
+
+Every build records the content hash of each file an output was made
+from, its markdown, includes, images, stylesheets and the files those
+reference, in ``.dasmdf-build.json`` beside the project file. The next
+build renders only the outputs that are missing, whose settings changed
+or whose inputs hash differently. Outputs that do not use each other are
+rendered in parallel.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+from dataclasses import dataclass
+from urllib.parse import unquote
+
+from .cache import content_hash
+from .jobs import ConversionError, ConversionJob
+from .pdf import source_date_epoch
+from .profiles import get_profile
+from .variants import ASSETS_DIR, THEMES, page_size_name
+
+PROJECT_FILE = "dasmdf.json"
+STATE_FILE = ".dasmdf-build.json"
+
+# Output settings, with their defaults
+SETTINGS = {
+    "input": None,
+    "css": [],
+    "title": ConversionJob.title,
+    "engine": "playwright",
+    "page_size": None,
+    "profile": None,
+    "parser": None,
+    "prune_css": False,
+    "reproducible": False,
+}
+
+_INCLUDE_RE = re.compile(r'^ {0,3}!include\s+(.+?)\s*$')
+_FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+_IMAGE_RES = (
+    re.compile(r'(!\[[^\]]*\]\(\s*<?)([^)\s>]+)'),
+    re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*["\'])([^"\']+)', re.I),
+)
+_CSS_URL_RES = (
+    re.compile(r'''(url\(\s*["']?)([^"')\s]+)'''),
+    re.compile(r'''(@import\s+["'])([^"']+)'''),
+)
+# Link targets that are not local files: URLs, data URIs and anchors
+_REMOTE_RE = re.compile(r'^(?:[a-z][a-z0-9+.-]+:|//|#)', re.I)
+
+
+def _local_file(target, directory):
+    """Return the file a link points at, or None when it is not local."""
+    if _REMOTE_RE.match(target):
+        return None
+    target = unquote(target.split("#")[0].split("?")[0])
+    if not target:
+        return None
+    return os.path.normpath(os.path.join(directory, target))
+
+
+def _read(path, what="file"):
+    """Read a text file, raising ConversionError when it cannot be."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        raise ConversionError(f"Cannot read {what} {path}: {e}") from e
+
+
+def _link_files(text, patterns, directory, files):
+    """Record the local files ``text`` links to, linking them absolutely.
+
+    Documents are rendered away from their directory, so links relative
+    to it are replaced by ``file:`` URIs.
+    """
+    def absolute(match):
+        path = _local_file(match.group(2), directory)
+        if path is None:
+            return match.group(0)
+        files[path] = None
+        return match.group(1) + pathlib.Path(path).as_uri()
+
+    for pattern in patterns:
+        text = pattern.sub(absolute, text)
+    return text
+
+
+def _fence(line, fence):
+    """Return the code fence open after ``line``, given the one before."""
+    match = _FENCE_RE.match(line)
+    if match is None:
+        return fence
+    marker = match.group(1)
+    if fence is None:
+        return marker
+    if marker[0] == fence[0] and len(marker) >= len(fence):
+        return None
+    return fence
+
+
+def link_markdown(md_content, directory):
+    """Return markdown with images relative to ``directory`` made absolute.
+
+    Images in fenced code are left alone.
+    """
+    lines = []
+    fence = None
+    for line in md_content.splitlines(keepends=True):
+        if fence is None and not _FENCE_RE.match(line):
+            line = _link_files(line, _IMAGE_RES, directory, {})
+        fence = _fence(line, fence)
+        lines.append(line)
+    return "".join(lines)
+
+
+def link_stylesheet(css_content, directory):
+    """Return CSS with ``url()`` and ``@import`` targets made absolute."""
+    return _link_files(css_content, _CSS_URL_RES, directory, {})
+
+
+def _expand(path, stack, files):
+    """Return a markdown file with its includes expanded."""
+    if path in stack:
+        chain = " -> ".join(os.path.basename(p) for p in stack + (path,))
+        raise ConversionError(f"Markdown files include each other: {chain}")
+    text = _read(path, "markdown file")
+    files[path] = None
+    directory = os.path.dirname(path)
+    lines = []
+    fence = None
+    for line in text.splitlines(keepends=True):
+        if fence is None and not _FENCE_RE.match(line):
+            include = _INCLUDE_RE.match(line)
+            if include:
+                part = _expand(
+                    os.path.normpath(
+                        os.path.join(directory, include.group(1))
+                    ),
+                    stack + (path,), files
+                )
+                lines.append(part if part.endswith("\n") else part + "\n")
+                continue
+            line = _link_files(line, _IMAGE_RES, directory, files)
+        fence = _fence(line, fence)
+        lines.append(line)
+    return "".join(lines)
+
+
+def expand_includes(path):
+    """Read a markdown file with its ``!include`` lines expanded.
+
+    Returns the markdown and the absolute paths of the files it was made
+    from: the file, its includes and the local images they show.
+    Raises ConversionError for unreadable files and include loops.
+    """
+    path = os.path.abspath(path)
+    files = {}
+    markdown = _expand(path, (), files)
+    return markdown, list(files)
+
+
+def _stylesheet(entry, root, files):
+    """Read one ``css`` entry, recording it and the files it uses."""
+    if entry in THEMES:
+        path = os.path.join(ASSETS_DIR, THEMES[entry])
+    else:
+        path = os.path.normpath(os.path.join(root, entry))
+    files[path] = None
+    return _link_files(
+        _read(path, "stylesheet"), _CSS_URL_RES, os.path.dirname(path),
+        files
+    )
+
+
+def _file_hash(path):
+    """Return the SHA-256 of a file's content, or None if it is missing."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        raise ConversionError(f"Cannot read {path}: {e}") from e
+    return digest.hexdigest()
+
+
+@dataclass
+class Target:
+    """One PDF a project builds.
+
+    ``output`` is its absolute path and ``settings`` the project's
+    settings merged with its own.
+    """
+
+    output: str
+    settings: dict
+
+
+@dataclass
+class BuildResult:
+    """How one output fared in a build.
+
+    ``status`` is ``current`` (nothing changed), ``stale`` (would be
+    rebuilt, in a dry run), ``built`` or ``failed``; ``reason`` says why
+    it was rebuilt and ``error`` why it failed.
+    """
+
+    output: str
+    status: str
+    reason: str = None
+    error: str = None
+    pages: int = None
+
+
+class Project:
+    """The outputs described by the project file at ``path``."""
+
+    def __init__(self, path=PROJECT_FILE):
+        """Read the project file; raises ConversionError if invalid."""
+        if os.path.isdir(path):
+            path = os.path.join(path, PROJECT_FILE)
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        self.state_path = os.path.join(self.root, STATE_FILE)
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ConversionError(
+                f"Cannot read project {self.path}: {e}"
+            ) from e
+
+        outputs = data.get("outputs") if isinstance(data, dict) else None
+        if not isinstance(outputs, dict) or not outputs:
+            raise ConversionError(
+                f"{self.path} must map \"outputs\" to their settings."
+            )
+        defaults = self._settings(
+            {k: v for k, v in data.items() if k != "outputs"}, "project"
+        )
+        self.targets = []
+        for output, settings in outputs.items():
+            if not isinstance(settings, dict):
+                settings = {"input": settings}
+            settings = {
+                **SETTINGS, **defaults, **self._settings(settings, output)
+            }
+            if not settings["input"]:
+                raise ConversionError(f"Output {output} has no input.")
+            if isinstance(settings["css"], str):
+                settings["css"] = [settings["css"]]
+            self.targets.append(Target(
+                os.path.normpath(os.path.join(self.root, output)), settings
+            ))
+
+    def _settings(self, settings, owner):
+        """Check that ``settings`` only holds known output settings."""
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise ConversionError(
+                f"Unknown settings for {owner} in {self.path}: "
+                f"{', '.join(sorted(unknown))}; use "
+                f"{', '.join(SETTINGS)}."
+            )
+        return settings
+
+    def relative(self, path):
+        """Return ``path`` relative to the project's directory if in it."""
+        relative = os.path.relpath(path, self.root)
+        return path if relative.startswith(os.pardir) else relative
+
+    def job(self, target):
+        """Return a target's ConversionJob and the files it is made from."""
+        settings = target.settings
+        markdown, files = expand_includes(
+            os.path.join(self.root, settings["input"])
+        )
+        files = dict.fromkeys(files)
+        css = "\n".join(
+            _stylesheet(entry, self.root, files)
+            for entry in settings["css"]
+        )
+        engines = [name.strip() for name in settings["engine"].split(",")]
+        job = ConversionJob(
+            markdown, target.output, engines[0], css, settings["title"],
+            bool(settings["prune_css"]), settings["parser"],
+            fallback=tuple(engines[1:]),
+            page_size=page_size_name(settings["page_size"]),
+            profile=settings["profile"],
+            source_date=(source_date_epoch() if settings["reproducible"]
+                         else None)
+        )
+        return job, list(files)
+
+    def _levels(self):
+        """Group the targets so each only uses outputs of earlier groups."""
+        outputs = {target.output: target for target in self.targets}
+        needs = {}
+        for target in self.targets:
+            try:
+                files = self.job(target)[1]
+            except ConversionError:
+                files = []  # reported when the target is built
+            needs[target.output] = {
+                path for path in files
+                if path in outputs and path != target.output
+            }
+        levels = []
+        done = set()
+        while len(done) < len(outputs):
+            level = [
+                outputs[output] for output in outputs
+                if output not in done and needs[output] <= done
+            ]
+            if not level:
+                raise ConversionError(
+                    "Outputs use each other in a loop: " + ", ".join(
+                        self.relative(o) for o in outputs if o not in done
+                    )
+                )
+            levels.append(level)
+            done.update(target.output for target in level)
+        return levels
+
+    def _load_state(self):
+        """Return the build records, or empty ones."""
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _save_state(self, state):
+        """Write the build records atomically."""
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".", suffix=".tmp", dir=self.root
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _reason(self, target, key, hashes, record):
+        """Return why a target must be rebuilt, or None if it is current."""
+        if record is None:
+            return "not built before"
+        if not os.path.exists(target.output):
+            return "output missing"
+        if record.get("settings") != key:
+            return "settings changed"
+        inputs = record.get("inputs", {})
+        for path, digest in hashes.items():
+            if inputs.get(self.relative(path), "") != digest:
+                return f"{self.relative(path)} changed"
+        if len(inputs) != len(hashes):
+            return "inputs changed"
+        return None
+
+    def build(self, converter=None, parallel=None, force=False,
+              dry_run=False, on_event=None):
+        """Bring every output up to date; returns a BuildResult each.
+
+        Stale outputs are rendered with ``converter`` (anything with
+        ``convert_many``, such as a WorkerPool); by default several are
+        rendered at once in a pool of up to ``parallel`` worker processes
+        (by default one per CPU). ``force`` rebuilds everything and
+        ``dry_run`` only reports what would be rebuilt. ``on_event``
+        receives the ProgressEvents of the renders.
+        """
+        state = self._load_state()
+        records = state.setdefault("outputs", {})
+        results = {}
+        for level in self._levels():
+            stale = []
+            for target in level:
+                name = self.relative(target.output)
+                try:
+                    job, files = self.job(target)
+                    hashes = {path: _file_hash(path) for path in files}
+                    # The profile's settings, so edits to profiles.json
+                    # rebuild the outputs using it
+                    profile = get_profile(job.profile).resolve(job.md_content)
+                except ConversionError as e:
+                    results[target.output] = BuildResult(
+                        target.output, "failed", error=str(e)
+                    )
+                    continue
+                key = content_hash(
+                    json.dumps(target.settings, sort_keys=True),
+                    job.source_date, profile.key()
+                )
+                reason = "forced" if force else self._reason(
+                    target, key, hashes, records.get(name)
+                )
+                status = "current" if reason is None else "stale"
+                results[target.output] = BuildResult(
+                    target.output, status, reason
+                )
+                if reason is not None:
+                    stale.append((job, key, hashes))
+            if not stale or dry_run:
+                continue
+            for job, _, _ in stale:
+                os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+
+            for index, event in self._render(
+                    [job for job, _, _ in stale], converter, parallel):
+                if on_event is not None:
+                    on_event(event)
+                if not event.finished:
+                    continue
+                job, key, hashes = stale[index]
+                result = results[job.output_path]
+                if event.stage == "done":
+                    result.status, result.pages = "built", event.pages
+                    records[self.relative(job.output_path)] = {
+                        "settings": key,
+                        "inputs": {
+                            self.relative(path): digest
+                            for path, digest in hashes.items()
+                        },
+                    }
+                    # Saved as outputs finish, so an interrupted build
+                    # keeps what it did
+                    self._save_state(state)
+                else:
+                    result.status, result.error = "failed", event.error
+        return [results[target.output] for target in self.targets]
+
+    def _render(self, jobs, converter, parallel):
+        """Render ``jobs``, yielding ``(index, event)`` pairs."""
+        own = converter is None
+        if own:
+            from .wkhtml import find_wkhtmltopdf
+            size = min(len(jobs), parallel or os.cpu_count() or 1)
+            if size > 1:
+                from .pool import WorkerPool
+                converter = WorkerPool(
+                    size=size, wkhtmltopdf_path=find_wkhtmltopdf()
+                )
+            else:
+                from .converter import Converter
+                converter = Converter(find_wkhtmltopdf())
+        try:
+            for event in converter.convert_many(jobs):
+                yield event.job, event
+        finally:
+            if own:
+                converter.close()
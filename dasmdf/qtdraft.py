@@ -0,0 +1,144 @@
+"""
+DasMDF - Qt draft rendering
+
+Support for the ``qt-draft`` engine, which lays documents out with Qt's
+rich text engine (``QTextDocument``) and prints them with ``QPdfWriter``:
+no browser, no cairo, and milliseconds per document. Qt understands a
+subset of HTML 4 and CSS 2, enough for prose, lists, tables, links and
+highlighted code, so documents using anything beyond that are refused
+with the reason, to go to a full engine instead.
+
+This module holds the parts that need no Qt: checking a document, and
+mapping its CSS onto what Qt understands. ``@page`` rules, which Qt
+ignores, are read here and applied to the PDF writer by the engine.
+"""
+
+import re
+
+# Paper sizes and margins applied when the stylesheet sets none
+DEFAULT_PAGE_SIZE = "A4"
+DEFAULT_MARGIN = 54.0  # points, 3/4 inch
+
+# Markup Qt cannot lay out, and what to call it when refusing
+_UNSUPPORTED_MARKUP = (
+    (re.compile(r'<svg\b', re.I), "inline SVG (formulas or diagrams)"),
+    (re.compile(r'<math\b', re.I), "MathML formulas"),
+    (re.compile(r'<script\b', re.I), "scripts such as MathJax"),
+    (re.compile(r'<(?:iframe|video|audio|canvas|object|embed)\b', re.I),
+     "embedded media"),
+    (re.compile(r'<img\b[^>]*\bsrc\s*=\s*["\']?(?:https?:)?//', re.I),
+     "remote images"),
+)
+# Layout properties Qt ignores, which would leave the page looking wrong
+_UNSUPPORTED_CSS = (
+    (re.compile(r'\bdisplay\s*:\s*(?:inline-)?(?:flex|grid)\b', re.I),
+     "flex or grid layout"),
+    (re.compile(r'\bposition\s*:\s*(?:absolute|fixed|sticky)\b', re.I),
+     "positioned elements"),
+    (re.compile(r'\b(?:column-count|columns)\s*:', re.I),
+     "multi-column layout"),
+    (re.compile(r'\btransform\s*:', re.I), "CSS transforms"),
+)
+
+_STYLE_RE = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.I | re.S)
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_PAGE_RULE_RE = re.compile(r'@page\b[^{]*\{([^}]*)\}', re.I)
+_DECLARATION_RE = re.compile(r'([\w-]+)\s*:\s*([^;]+)')
+# Unitless line heights, which Qt reads as pixels
+_LINE_HEIGHT_RE = re.compile(
+    r'(\bline-height\s*:\s*)(\d*\.?\d+)(?=\s*(?:;|}|!|$))', re.I
+)
+_LENGTH_RE = re.compile(r'^(-?\d*\.?\d+)(mm|cm|in|pt|px|pc)?$', re.I)
+
+# Points per unit of CSS length
+_POINTS = {
+    "mm": 72 / 25.4, "cm": 72 / 2.54, "in": 72.0, "pt": 1.0,
+    "pc": 12.0, "px": 0.75, None: 0.75,
+}
+
+
+class PageSetup:
+    """Paper, margins and background read from a stylesheet's ``@page``.
+
+    ``size`` is a paper name such as ``A4`` or a ``(width, height)`` in
+    points; ``margins`` are ``(top, right, bottom, left)`` in points.
+    """
+
+    def __init__(self, size=DEFAULT_PAGE_SIZE, landscape=False,
+                 margins=(DEFAULT_MARGIN,) * 4, background=None):
+        self.size = size
+        self.landscape = landscape
+        self.margins = margins
+        self.background = background
+
+
+def unsupported_features(html):
+    """Return why Qt cannot render ``html`` faithfully; empty if it can."""
+    reasons = [
+        reason for pattern, reason in _UNSUPPORTED_MARKUP
+        if pattern.search(html)
+    ]
+    css = "".join(match.group(2) for match in _STYLE_RE.finditer(html))
+    css = _COMMENT_RE.sub("", css)
+    reasons.extend(
+        reason for pattern, reason in _UNSUPPORTED_CSS if pattern.search(css)
+    )
+    return reasons
+
+
+def _points(value):
+    """Convert a CSS length to points, or return None."""
+    match = _LENGTH_RE.match(value.strip())
+    if match is None:
+        return None
+    unit = match.group(2).lower() if match.group(2) else None
+    return float(match.group(1)) * _POINTS[unit]
+
+
+def _page_setup(css):
+    """Read the ``@page`` rules of a stylesheet."""
+    setup = PageSetup()
+    for rule in _PAGE_RULE_RE.finditer(css):
+        for name, value in _DECLARATION_RE.findall(rule.group(1)):
+            name, words = name.lower(), value.split()
+            if name == "size":
+                lengths = [_points(word) for word in words[:2]]
+                if len(words) >= 2 and None not in lengths:
+                    setup.size = tuple(lengths)
+                    continue
+                for word in words:
+                    if word.lower() in ("landscape", "portrait"):
+                        setup.landscape = word.lower() == "landscape"
+                    elif word.lower() != "auto":
+                        setup.size = word
+            elif name == "margin":
+                lengths = [_points(word) for word in words]
+                if lengths and None not in lengths and len(lengths) <= 4:
+                    # CSS shorthand: 1 to 4 values, clockwise from the top
+                    lengths += [None] * (4 - len(lengths))
+                    top, right, bottom, left = lengths
+                    right = top if right is None else right
+                    bottom = top if bottom is None else bottom
+                    left = right if left is None else left
+                    setup.margins = (top, right, bottom, left)
+            elif name in ("background", "background-color") and words:
+                setup.background = words[0]
+    return setup
+
+
+def _map_css(css):
+    """Rewrite a stylesheet into the CSS Qt understands."""
+    css = _COMMENT_RE.sub("", css)
+    css = _PAGE_RULE_RE.sub("", css)
+    return _LINE_HEIGHT_RE.sub(
+        lambda m: f"{m.group(1)}{float(m.group(2)) * 100:g}%", css
+    )
+
+
+def qt_html(html):
+    """Map ``html`` onto Qt's rich text, returning it and its PageSetup."""
+    css = "".join(match.group(2) for match in _STYLE_RE.finditer(html))
+    html = _STYLE_RE.sub(
+        lambda m: m.group(1) + _map_css(m.group(2)) + m.group(3), html
+    )
+    return html, _page_setup(_COMMENT_RE.sub("", css))
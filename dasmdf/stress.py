@@ -0,0 +1,226 @@
+"""
+DasMDF - Parser stress test
+
+Generates a corpus of adversarial markdown, the kind of input that has
+sent regex-driven parsers into quadratic or exponential time: unclosed
+emphasis, bracket and code-span runs, deep list and quote nesting, very
+wide tables, tags left open after many attributes and so on. Each
+document is parsed at two sizes through the input guard, the path every
+conversion takes, and the check fails when parse time grows faster than
+roughly linearly with the input or a parse outlasts the guard's timeout.
+A parse the guard had to stop and hand to a linear-time backend is
+reported as having timed out and fallen back, and fails too.
+
+    python -m dasmdf.stress
+    python -m dasmdf.stress -p markdown2 --size 8K --timeout 5
+    python -m dasmdf.stress --write corpus/
+
+Exits with status 1 when a document fails.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from . import guard
+from .memory import parse_size
+from .parsers import PARSERS
+
+# Base document size, in characters, and how much the second one grows
+STRESS_SIZE = 16 * 1024
+GROWTH = 4
+# Parse time may grow this much more than the input before failing
+SLACK = 2.5
+# Parses faster than this are too short to judge
+MIN_TIME = 0.05
+# Parses shorter than REPEAT_BELOW seconds are run up to QUICK_RUNS
+# times and the fastest run counts
+REPEAT_BELOW = 0.5
+QUICK_RUNS = 5
+# Seconds past the timeout for stopping a parse and parsing again
+GRACE = 2.0
+
+
+def _repeat(unit, size, head="", tail="\n"):
+    """Return ``unit`` repeated between ``head`` and ``tail`` to ``size``."""
+    count = max(1, (size - len(head) - len(tail)) // len(unit))
+    return head + unit * count + tail
+
+
+def _staircase(step, size):
+    """Return a list nested one level deeper on every line."""
+    lines = []
+    total = 0
+    while total < size:
+        lines.append(step * len(lines) + "- item\n")
+        total += len(lines[-1])
+    return "".join(lines)
+
+
+def _table(columns, rows=3):
+    """Return a table ``columns`` cells wide."""
+    cells = "|" + "a|" * columns + "\n"
+    return cells + "|" + "-|" * columns + "\n" + cells * (rows - 1)
+
+
+# Adversarial documents of about ``size`` characters, by name
+CASES = {
+    "emphasis-run": lambda size: _repeat("*a ", size),
+    "strong-run": lambda size: _repeat("**a ", size),
+    "underscore-run": lambda size: _repeat("_a ", size),
+    "strike-run": lambda size: _repeat("~~a ", size),
+    "code-span-run": lambda size: _repeat("`a", size),
+    "math-run": lambda size: _repeat("$a", size),
+    "open-brackets": lambda size: _repeat("[", size),
+    "open-images": lambda size: _repeat("![", size),
+    "open-links": lambda size: _repeat("[a](", size),
+    "open-angles": lambda size: _repeat("<a ", size),
+    "open-tag-attributes": lambda size: _repeat(' a="b"', size, "<div"),
+    "attribute-braces": lambda size: _repeat("{", size, "# Heading "),
+    "entities": lambda size: _repeat("&#", size),
+    "link-definitions": lambda size: _repeat("[a]: ", size),
+    "autolinks": lambda size: _repeat("<http://a ", size),
+    "pipes": lambda size: _repeat("|", size),
+    "wide-table": lambda size: _table(size // 6),
+    "long-table": lambda size: _repeat("| a | b |\n", size,
+                                       "| a | b |\n|---|---|\n"),
+    "nested-lists": lambda size: _staircase("  ", size),
+    "nested-quotes": lambda size: _repeat(">", size, "", " quote\n"),
+    "deep-indent": lambda size: _repeat(" ", size, "", "- item\n"),
+    "blank-lines": lambda size: _repeat("\n", size, "text\n"),
+    "heading-marks": lambda size: _repeat("#", size),
+    "setext-headings": lambda size: _repeat("a\n=\n", size),
+    "open-fences": lambda size: _repeat("```\n", size),
+    "list-items": lambda size: _repeat("- a\n", size),
+    "code-spans": lambda size: _repeat("Text with `code`.\n\n", size),
+}
+
+
+def corpus(size=STRESS_SIZE):
+    """Return the stress documents at about ``size`` characters each."""
+    return {name: make(size) for name, make in CASES.items()}
+
+
+def _time(md_content, parser, timeout):
+    """Time the guarded parse of ``md_content``.
+
+    Returns the seconds it took and the label of the backend the guard
+    fell back to, or None. Quick parses are repeated and the fastest
+    run counts, so a stray pause does not pass for slow parsing.
+    """
+    fallbacks = []
+    best = None
+    for _ in range(QUICK_RUNS):
+        start = time.perf_counter()
+        guard.parse(
+            md_content, parser, timeout,
+            on_fallback=lambda backend, error: fallbacks.append(
+                backend.label
+            )
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed >= REPEAT_BELOW or fallbacks:
+            break
+    return best, (fallbacks or [None])[0]
+
+
+def stress(parser, size=STRESS_SIZE, timeout=None, on_result=None,
+           cases=None):
+    """Parse the corpus at ``size`` and ``GROWTH`` times that.
+
+    Returns a dict of document name to ``(small, large, failure)``: the
+    two parse times in seconds and why the document failed, or None.
+    ``on_result`` is called with the name and tuple as each finishes.
+    ``cases`` limits the run to those document names.
+    """
+    limit = guard.parse_timeout() if timeout is None else timeout
+    # Warm up the backend, in-process and in the guard's parse process
+    for warm_up in (1024, guard.ISOLATE_SIZE + 1):
+        _time(CASES["code-spans"](warm_up), parser, limit)
+    results = {}
+    for name in cases or CASES:
+        make = CASES[name]
+        small, small_fallback = _time(make(size), parser, limit)
+        large, large_fallback = _time(make(size * GROWTH), parser, limit)
+        fallback = small_fallback or large_fallback
+        failure = None
+        if fallback:
+            failure = (
+                f"timed out after {limit:g} s, fell back to {fallback}"
+            )
+        elif max(small, large) > limit + GRACE:
+            failure = (
+                f"took {max(small, large):.2f} s, over the {limit:g} s "
+                f"timeout"
+            )
+        elif large > max(small * GROWTH * SLACK, MIN_TIME):
+            failure = (
+                f"took {large:.2f} s for {GROWTH}x the input of a "
+                f"{small:.3f} s parse"
+            )
+        results[name] = (small, large, failure)
+        if on_result is not None:
+            on_result(name, results[name])
+    return results
+
+
+def main(argv=None):
+    """Run the stress test and print a table; returns the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="python -m dasmdf.stress",
+        description=__doc__.split("\n\n")[1]
+    )
+    parser.add_argument(
+        "-p", "--parser",
+        help="comma-separated backends (default: every installed one)"
+    )
+    parser.add_argument(
+        "--size", default=str(STRESS_SIZE),
+        help="base document size, e.g. 16K (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--timeout", type=float,
+        help="seconds a parse may take before the guard gives up "
+             f"(default: DASMDF_PARSE_TIMEOUT or {guard.PARSE_TIMEOUT:g})"
+    )
+    parser.add_argument(
+        "--write", metavar="DIR",
+        help="write the corpus to DIR as markdown files and exit"
+    )
+    args = parser.parse_args(argv)
+    guard.isolate_parses()
+    size = parse_size(args.size)
+
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        for name, md_content in corpus(size).items():
+            path = os.path.join(args.write, f"{name}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(md_content)
+            print(path)
+        return 0
+
+    if args.parser:
+        names = [name.strip() for name in args.parser.split(",")]
+    else:
+        names = [name for name, cls in PARSERS.items() if cls.available()]
+    large_size = size * GROWTH
+
+    def on_result(name, result):
+        small, large, failure = result
+        print(f"{backend:12} {name:20} {small:7.3f}s {large:7.3f}s "
+              f"{failure or 'ok'}", flush=True)
+
+    failed = False
+    print(f"{'parser':12} {'document':20} {size:>7,} {large_size:>7,}  "
+          f"(characters)")
+    for backend in names:
+        results = stress(backend, size, args.timeout, on_result)
+        failed = failed or any(failure for _, _, failure in results.values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+DasMDF - Document variants
+
+Describes the combinations of page size, theme and engine a document is
+published in, and the jobs and output names they lead to. The converter's
+``iter_variants`` parses and highlights the markdown once and renders
+every variant from that shared body, concurrently on its warm engines.
+
+    variants = expand_variants(["A4", "Letter"], ["light", "dark"])
+    for event in dasmdf.iter_variants(job, variants):
+        ...
+
+writes ``notes.A4.light.pdf``, ``notes.A4.dark.pdf`` and so on next to
+the job's output path.
+"""
+
+import itertools
+import os
+from dataclasses import dataclass, replace
+
+from .jobs import ConversionError
+from .profiles import get_profile
+
+ASSETS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Assets"
+)
+
+# Built-in themes, by the name used in variant file names
+THEMES = {
+    "light": "coolClean.css",
+    "dark": "catpuccinMocha.css",
+}
+
+# Paper sizes every engine understands, by lower-cased name
+PAGE_SIZES = {
+    name.lower(): name for name in ("A3", "A4", "A5", "Letter", "Legal")
+}
+
+# Output file names; ``{variant}`` is the variant's dotted name
+DEFAULT_PATTERN = "{stem}.{variant}.pdf"
+
+
+def page_size_name(size):
+    """Return the canonical spelling of a paper size, or None."""
+    if not size:
+        return None
+    try:
+        return PAGE_SIZES[size.lower()]
+    except KeyError:
+        raise ConversionError(
+            f"Unknown page size {size!r}; use one of "
+            f"{', '.join(PAGE_SIZES.values())}."
+        ) from None
+
+
+def theme_name(theme):
+    """Return the short name a theme goes by in file names."""
+    if theme in THEMES:
+        return theme
+    return os.path.splitext(os.path.basename(theme))[0]
+
+
+def theme_css(theme):
+    """Read a theme's stylesheet: a built-in name or a CSS file path."""
+    path = theme
+    if theme in THEMES:
+        path = os.path.join(ASSETS_DIR, THEMES[theme])
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        raise ConversionError(f"Cannot read theme {theme!r}: {e}") from e
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One way of rendering a document.
+
+    Fields left as None keep the value of the job the variant is applied
+    to: its page size, stylesheet or engine.
+    """
+
+    page_size: str = None
+    theme: str = None
+    engine: str = None
+
+    @property
+    def name(self):
+        """The dotted name used in file names, e.g. ``A4.dark``."""
+        parts = [page_size_name(self.page_size)]
+        if self.theme:
+            parts.append(theme_name(self.theme))
+        parts.append(self.engine)
+        return ".".join(part for part in parts if part)
+
+
+def expand_variants(page_sizes=(), themes=(), engines=()):
+    """Return every combination of the given page sizes, themes and engines.
+
+    An empty sequence leaves that field to the job.
+    """
+    return [
+        Variant(*fields) for fields in itertools.product(
+            dict.fromkeys(page_sizes or [None]),
+            dict.fromkeys(themes or [None]),
+            dict.fromkeys(engines or [None]),
+        )
+    ]
+
+
+def variant_path(output_path, variant, pattern=DEFAULT_PATTERN,
+                 profile=""):
+    """Return where ``variant`` of a document bound for ``output_path`` goes.
+
+    ``pattern`` is formatted with ``stem``, ``variant``, ``page_size``,
+    ``theme``, ``engine`` and ``profile`` and taken relative to the
+    output's directory.
+    """
+    if not variant.name:
+        return output_path
+    directory, name = os.path.split(output_path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, pattern.format(
+        stem=stem, variant=variant.name,
+        page_size=page_size_name(variant.page_size) or "",
+        theme=theme_name(variant.theme) if variant.theme else "",
+        engine=variant.engine or "", profile=profile,
+    ))
+
+
+def variant_jobs(job, variants, pattern=DEFAULT_PATTERN):
+    """Return one ConversionJob per variant of ``job``.
+
+    Raises ConversionError if two variants would write the same file.
+    """
+    profile = get_profile(job.profile).name
+    jobs = []
+    for variant in variants:
+        changes = {
+            "output_path": variant_path(
+                job.output_path, variant, pattern, profile
+            ),
+            "page_size": page_size_name(variant.page_size or job.page_size),
+        }
+        if variant.theme:
+            changes["css_content"] = theme_css(variant.theme)
+        if variant.engine:
+            changes["engine"] = variant.engine
+        jobs.append(replace(job, **changes))
+    paths = [item.output_path for item in jobs]
+    if len(set(paths)) != len(paths):
+        raise ConversionError(
+            "Several variants would be written to the same file; "
+            "include {variant} in the output pattern."
+        )
+    return jobs
@@ -0,0 +1,320 @@
+"""
+DasMDF - wkhtmltopdf driver
+
+Finds and runs the wkhtmltopdf executable directly, without pdfkit.
+HTML is streamed into the child process over stdin while it is being
+generated, and the PDF is written to a scratch file next to its
+destination, so neither the full HTML nor the full PDF has to be held in
+memory. The scratch file replaces the destination only once the whole
+document has rendered.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+from . import files
+
+# Default wkhtmltopdf settings.
+DEFAULT_OPTIONS = {
+    'page-size': 'A4',
+    'encoding': "UTF-8",
+    'no-outline': None,
+    'enable-local-file-access': None,
+    'print-media-type': None,
+    'disable-smart-shrinking': None,
+    'dpi': 300,
+    'image-dpi': 300,
+    'image-quality': 100,
+    'lowquality': False,
+    'minimum-font-size': 8,
+    'zoom': 1.0,
+    'enable-javascript': None,
+    'javascript-delay': 1000,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# Progress lines wkhtmltopdf writes to stderr, e.g. "Loading pages (1/6)",
+# "[=====>    ] 42%" and "[==========] Page 3 of 10".
+STEP_RE = re.compile(r'\((\d+)/(\d+)\)')
+PERCENT_RE = re.compile(r'\]\s*(\d+)%')
+PAGE_RE = re.compile(r'Page (\d+) of (\d+)')
+
+
+class WkhtmlError(RuntimeError):
+    """Raised when wkhtmltopdf fails or cannot be started."""
+
+
+def find_wkhtmltopdf():
+    """Find the wkhtmltopdf executable in the system PATH."""
+    # First, try searching in PATH
+    for path in os.environ["PATH"].split(os.pathsep):
+        exe_path = Path(path) / "wkhtmltopdf"
+        if exe_path.exists() and exe_path.is_file():
+            return str(exe_path)
+
+    # Then, try common installation paths (Windows)
+    common_paths = [
+        r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
+        r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe",
+        r"wkhtmltopdf\bin\wkhtmltopdf.exe",  # Relative path
+    ]
+    for path in common_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def build_args(options):
+    """Translate an options dict into wkhtmltopdf command-line arguments.
+
+    ``None`` and ``True`` values produce a bare flag, ``False`` drops the
+    option entirely and anything else is passed as the flag's value.
+    """
+    args = []
+    for key, value in options.items():
+        flag = key if key.startswith('--') else f"--{key}"
+        if value is False:
+            continue
+        args.append(flag)
+        if value is not None and value is not True:
+            args.append(str(value))
+    return args
+
+
+class StderrProgress:
+    """Track wkhtmltopdf's progress from the lines it writes to stderr.
+
+    Loading pages counts for the first half of the run, the intermediate
+    steps for a tenth and printing pages for the rest.
+    """
+
+    def __init__(self, on_progress=None):
+        """Report progress to ``on_progress(fraction, done, total)``."""
+        self.on_progress = on_progress
+        self.step = 0
+        self.steps = 0
+        self.pages_done = None
+        self.pages_total = None
+        self.lines = []
+
+    def feed(self, line):
+        """Parse one stderr line and report any progress it carries."""
+        line = line.strip()
+        if not line:
+            return
+        if not line.startswith('['):
+            self.lines.append(line)
+
+        fraction = None
+        match = STEP_RE.search(line)
+        if match and not line.startswith('['):
+            self.step, self.steps = int(match.group(1)), int(match.group(2))
+            if self.step == 1:
+                fraction = 0.0
+            elif self.step < self.steps:
+                fraction = 0.5 + 0.1 * (self.step - 1) / (self.steps - 1)
+            else:
+                fraction = 0.6
+        elif self.step == 1 and PERCENT_RE.search(line):
+            percent = int(PERCENT_RE.search(line).group(1))
+            fraction = 0.5 * percent / 100
+        else:
+            match = PAGE_RE.search(line)
+            if match:
+                self.pages_done = int(match.group(1))
+                self.pages_total = int(match.group(2))
+                fraction = 0.6 + 0.4 * self.pages_done / self.pages_total
+
+        if fraction is not None and self.on_progress is not None:
+            self.on_progress(fraction, self.pages_done, self.pages_total)
+
+
+class WkhtmlDriver:
+    """Drive a wkhtmltopdf executable as a child process."""
+
+    def __init__(self, executable, options=None):
+        """Create a driver for the given wkhtmltopdf executable."""
+        if not executable:
+            raise WkhtmlError("wkhtmltopdf executable not found.")
+        self.executable = executable
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self._process = None
+        self._lock = threading.Lock()
+
+    def command(self, inputs, output, options=None):
+        """Build the full command line for the given inputs and output."""
+        opts = dict(self.options)
+        if options:
+            opts.update(options)
+        return [self.executable, *build_args(opts), *inputs, output]
+
+    def render(self, html, output, options=None, timeout=None,
+               on_progress=None):
+        """Render one HTML document to a PDF.
+
+        ``html`` is either a string or an iterable of string chunks, which
+        are written to wkhtmltopdf's stdin as they are produced. ``output``
+        is a file path or a writable binary file object. Progress parsed
+        from stderr goes to ``on_progress(fraction, done, total)``.
+        Returns the page count when wkhtmltopdf reports it.
+
+        An exception raised while producing the chunks stops wkhtmltopdf
+        and is re-raised as it is; a file at ``output`` is only replaced
+        once the document has rendered in full.
+        """
+        if isinstance(html, str):
+            html = (html,)
+        if not isinstance(output, (str, os.PathLike)):
+            return self._render(html, '-', output, options, timeout,
+                                on_progress)
+        part = files.part_path(output)
+        try:
+            pages = self._render(html, part, None, options, timeout,
+                                 on_progress)
+            files.publish(part, output)
+        except BaseException:
+            try:
+                os.unlink(part)
+            except FileNotFoundError:
+                pass
+            raise
+        return pages
+
+    def _render(self, html, output_path, stream, options, timeout,
+                on_progress):
+        """Run ``render`` into ``output_path``, or into ``stream``."""
+        cmd = self.command(['-'], output_path, options)
+        process = self._spawn(cmd, stdout_pipe=stream is not None)
+
+        errors = []
+        feeder = threading.Thread(
+            target=self._feed, args=(process, html, errors), daemon=True
+        )
+        feeder.start()
+        progress = StderrProgress(on_progress)
+        reader = self._drain_stderr(process, progress)
+        try:
+            if stream is not None:
+                shutil.copyfileobj(process.stdout, stream, CHUNK_SIZE)
+            self._wait(process, timeout)
+        finally:
+            feeder.join()
+            self._finish(process, reader)
+
+        # The HTML could not be produced: wkhtmltopdf was stopped for it
+        for error in errors:
+            if not isinstance(error, OSError):
+                raise error
+        self._check(process, progress.lines)
+        if errors:
+            raise WkhtmlError(
+                f"Failed to stream HTML to wkhtmltopdf: {errors[0]}"
+            )
+        return progress.pages_total
+
+    def terminate(self):
+        """Stop the running wkhtmltopdf process, if any."""
+        with self._lock:
+            process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+    def _spawn(self, cmd, stdout_pipe=False):
+        """Start wkhtmltopdf and remember it so it can be terminated."""
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE if stdout_pipe else subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            raise WkhtmlError(f"Failed to start wkhtmltopdf: {e}") from e
+        with self._lock:
+            self._process = process
+        return process
+
+    @staticmethod
+    def _feed(process, chunks, errors):
+        """Write HTML chunks to the process's stdin, then close it.
+
+        Exceptions are added to ``errors``: OSErrors from writing to the
+        pipe, and anything raised producing the chunks, after which the
+        process is killed rather than left to print half a document.
+        """
+        try:
+            for chunk in chunks:
+                try:
+                    process.stdin.write(chunk.encode('utf-8'))
+                except OSError as e:
+                    errors.append(e)
+                    return
+        except Exception as e:
+            errors.append(e)
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _drain_stderr(process, progress):
+        """Read stderr in the background so the pipe never fills up.
+
+        wkhtmltopdf redraws its progress bars with carriage returns, so
+        the stream is split on both ``\\r`` and ``\\n``.
+        """
+        def drain():
+            pending = b''
+            for chunk in iter(lambda: process.stderr.read1(CHUNK_SIZE), b''):
+                *lines, pending = re.split(rb'[\r\n]', pending + chunk)
+                for line in lines:
+                    progress.feed(line.decode('utf-8', 'replace'))
+            progress.feed(pending.decode('utf-8', 'replace'))
+
+        thread = threading.Thread(target=drain, daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _wait(process, timeout):
+        """Wait for the process, killing it if it exceeds ``timeout``."""
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise WkhtmlError(
+                f"wkhtmltopdf timed out after {timeout} seconds."
+            )
+
+    def _finish(self, process, reader):
+        """Release the process's pipes once it has exited."""
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        reader.join()
+        for stream in (process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+        with self._lock:
+            if self._process is process:
+                self._process = None
+
+    @staticmethod
+    def _check(process, stderr):
+        """Raise a WkhtmlError if the process did not exit cleanly."""
+        if process.returncode != 0:
+            detail = "\n".join(stderr[-10:])
+            raise WkhtmlError(
+                f"wkhtmltopdf exited with code {process.returncode}"
+                + (f":\n{detail}" if detail else ".")
+            )
@@ -7,276 +7,195 @@ A professional GUI application for converting Markdown files to PDF format.
 This is the main PyQt6 implementation with enhanced features and capabilities.
 """
 
-import asyncio
+import multiprocessing
 import os
 import subprocess
 import sys
 import tempfile
+import time
 import webbrowser
 from pathlib import Path
 
-import markdown2
-import pdfkit
-from playwright.async_api import async_playwright
-from pygments.formatters import HtmlFormatter
-from PyQt6.QtCore import QThread, Qt, pyqtSignal, QMimeData
+from PyQt6.QtCore import QThread, Qt, pyqtSignal
 from PyQt6.QtGui import QFont, QIcon
 from PyQt6.QtWidgets import (
-    QApplication, QComboBox, QFileDialog, QFrame, QGridLayout,
+    QApplication, QCheckBox, QComboBox, QFileDialog, QFrame, QGridLayout,
     QHBoxLayout, QInputDialog, QLabel, QMainWindow, QMessageBox,
-    QProgressBar, QPushButton, QTextEdit, QVBoxLayout, QWidget
+    QPlainTextEdit, QProgressBar, QPushButton, QTextEdit, QVBoxLayout,
+    QWidget
 )
-from weasyprint import HTML
+
+from highlighter import MarkdownHighlighter
+from quicklook import QuickLookDialog, render_pages
+from uibus import UiUpdateBus
+from stallwatch import StallReportDialog, StallWatchdog, stall_threshold
+
+# Make the shared dasmdf core package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dasmdf import (  # noqa: E402
+    ConversionError, ConversionJob, Converter, Project, WorkerPool,
+    find_wkhtmltopdf, isolate_parses, preview_job, profile_names,
+    render_html, source_date_epoch
+)
+
+# Qt WebEngine has to be imported before the QApplication is created
+try:
+    import webengine
+except ImportError:
+    webengine = None
+
+
+# Engine choices offered in the window: (engine, fallback engines, race)
+ENGINE_CHOICES = {
+    "playwright": ("playwright", (), False),
+    "weasyprint": ("weasyprint", (), False),
+    "wkhtml": ("wkhtml", (), False),
+    "weasyprint, else playwright": ("weasyprint", ("playwright",), False),
+    "race playwright/weasyprint": ("playwright", ("weasyprint",), True),
+    "qt-draft, else playwright": ("qt-draft", ("playwright",), False),
+}
+if webengine is not None:
+    ENGINE_CHOICES["qtwebengine"] = ("qtwebengine", (), False)
+
+# Engines that render inside this process rather than in the worker pool
+IN_PROCESS_ENGINES = ("qtwebengine",)
+
+# Seconds an engine may take before it is given up on
+ENGINE_TIMEOUTS = {
+    "playwright": 120, "weasyprint": 300, "wkhtml": 180, "qtwebengine": 120,
+    "qt-draft": 60,
+}
+
+# Pages rendered by the Quick Look button, always at draft quality
+QUICK_LOOK_PAGES = 2
+QUICK_LOOK_PROFILE = "draft"
 
 
 class ConversionThread(QThread):
     """Thread for handling PDF conversion to prevent UI freezing."""
     
-    progress_updated = pyqtSignal(float)
-    status_updated = pyqtSignal(str)
     conversion_finished = pyqtSignal(bool, str)
 
-    def __init__(self, engine, md_content, css_content, output_path,
-                 pdf_title, wkhtmltopdf_path=None):
+    def __init__(self, ui_bus, converter, engine, md_content, css_content,
+                 output_path, pdf_title, prune_css=False, fallback=(),
+                 race=False, profile=None, source_date=None):
         """Initialize the conversion thread with necessary parameters."""
         super().__init__()
-        self.engine = engine
-        self.md_content = md_content
-        self.css_content = css_content
+        self.ui_bus = ui_bus
+        self.converter = converter
         self.output_path = output_path
-        self.pdf_title = pdf_title
-        self.wkhtmltopdf_path = wkhtmltopdf_path
+        self.job = ConversionJob(
+            md_content, output_path, engine, css_content, pdf_title,
+            prune_css, fallback=fallback, race=race,
+            timeouts=ENGINE_TIMEOUTS, profile=profile,
+            source_date=source_date
+        )
 
     def run(self):
-        """Execute the conversion based on the selected engine."""
+        """Run the conversion and post its progress to the UI bus."""
         try:
-            if self.engine == "weasyprint":
-                self.convert_with_weasyprint()
-            elif self.engine == "wkhtml":
-                self.convert_with_wkhtml()
-            elif self.engine == "playwright":
-                self.convert_with_playwright()
+            for event in self.converter.iter_convert(self.job):
+                self.ui_bus.post_event(id(self), event)
+            if event.stage == "failed":
+                self.conversion_finished.emit(
+                    False, f"Conversion failed: {event.error}"
+                )
             else:
                 self.conversion_finished.emit(
-                    False, "Unsupported conversion engine selected."
+                    True, f"PDF saved to: {self.output_path}"
                 )
         except Exception as e:
             self.conversion_finished.emit(
                 False, f"Failed to convert to PDF:\n\n{str(e)}"
             )
 
-    def md_to_html(self, md_content, css_content, pdf_title="DasMDF Preview"):
-        """Convert markdown to HTML with CSS styling."""
-        # Convert markdown to HTML
-        html_body = markdown2.markdown(
-            md_content,
-            extras=[
-                'strike', 'fenced-code-blocks', 'codehilite', 'tables',
-                'toc', 'attr_list', 'latex'
-            ]
-        )
-        pygments_css = HtmlFormatter(style="default").get_style_defs(
-            '.codehilite'
-        )
-
-        # Create full HTML document
-        html_content = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{pdf_title}</title>
-    <style>
-    pre, code {{
-            white-space: pre-wrap;
-            word-break: break-word;
-            overflow-wrap: anywhere;
-            }}
-        {css_content}
-        {pygments_css}
-    </style>
-    <script src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>
-
-</head>
-<body>
-    {html_body}
-</body>
-</html>"""
-
-        return html_content
-
-    def convert_with_weasyprint(self):
-        """Convert markdown to PDF using WeasyPrint."""
-        self.progress_updated.emit(0.3)
-        self.status_updated.emit("Preparing conversion with weasyprint...")
-
-        self.progress_updated.emit(0.5)
-        self.status_updated.emit("[WEASYPRINT] Converting Markdown to HTML...")
-        
-        try:
-            html_content = self.md_to_html(
-                self.md_content, self.css_content, self.pdf_title
-            )
-            self.progress_updated.emit(0.7)
-            self.status_updated.emit("Generating PDF with WeasyPrint...")
-
-            # Convert HTML to PDF
-            html_doc = HTML(string=html_content)
-            html_doc.write_pdf(self.output_path)
-            self.progress_updated.emit(1.0)
-            self.status_updated.emit(
-                "[WEASYPRINT] Conversion completed successfully!"
-            )
-
-            self.conversion_finished.emit(
-                True, f"PDF saved to: {self.output_path}"
-            )
 
-        except Exception as e:
-            self.progress_updated.emit(0.0)
-            self.status_updated.emit(
-                f"[WEASYPRINT] Conversion failed: {str(e)}"
-            )
-            self.conversion_finished.emit(
-                False, f"Conversion failed: {str(e)}"
-            )
+class QuickLookThread(QThread):
+    """Thread rendering the first pages of a document as images."""
 
-    def convert_with_wkhtml(self):
-        """Convert markdown to PDF using wkhtmltopdf."""
-        self.progress_updated.emit(0.3)
-        self.status_updated.emit("Preparing conversion with wkhtmltopdf...")
-        
-        if not self.wkhtmltopdf_path:
-            self.conversion_finished.emit(
-                False, "wkhtmltopdf executable not found."
-            )
-            return
+    preview_finished = pyqtSignal(bool, str, list)
 
-        self.progress_updated.emit(0.5)
-        self.status_updated.emit(
-            "[WKHTMLTOPDF] Converting Markdown to HTML..."
+    def __init__(self, ui_bus, converter, job, output_path, cursor=None):
+        """Prepare a preview of ``job`` written to ``output_path``."""
+        super().__init__()
+        self.ui_bus = ui_bus
+        self.converter = converter
+        self.job = preview_job(
+            job, QUICK_LOOK_PAGES, cursor, output_path=output_path
         )
 
+    def run(self):
+        """Render the preview PDF, then rasterise its pages."""
+        start = time.perf_counter()
         try:
-            html_content = self.md_to_html(
-                self.md_content, self.css_content, self.pdf_title
-            )
-            self.progress_updated.emit(0.7)
-            self.status_updated.emit("Generating PDF with wkhtmltopdf...")
-
-            options = {
-                'page-size': 'A4',
-                # 'margin-top': '20mm',
-                # 'margin-right': '20mm',
-                # 'margin-bottom': '20mm',
-                # 'margin-left': '20mm',
-                'encoding': "UTF-8",
-                'no-outline': None,
-                'enable-local-file-access': None,
-                'print-media-type': None,
-                'disable-smart-shrinking': None,
-                'dpi': 300,
-                'image-dpi': 300,
-                'image-quality': 100,
-                'lowquality': False,
-                'minimum-font-size': 8,
-                'zoom': 1.0,
-                'enable-javascript': None,
-                'javascript-delay': 1000
-            }
-
-            # Set the path to wkhtmltopdf if we found it
-            config = (
-                pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf_path)
-                if self.wkhtmltopdf_path != "wkhtmltopdf"
-                else None
-            )
-
-            # Convert to PDF using pdfkit
-            pdfkit.from_string(
-                html_content, self.output_path, 
-                options=options, configuration=config
-            )
-            self.progress_updated.emit(1.0)
-            self.status_updated.emit(
-                "[WKHTMLTOPDF] Conversion completed successfully!"
-            )
-
-            self.conversion_finished.emit(
-                True, f"PDF saved to: {self.output_path}"
+            for event in self.converter.iter_convert(self.job):
+                self.ui_bus.post_event(id(self), event)
+            if event.stage == "failed":
+                self.preview_finished.emit(
+                    False, f"Quick look failed: {event.error}", []
+                )
+                return
+            images = render_pages(self.job.output_path, QUICK_LOOK_PAGES)
+            self.preview_finished.emit(
+                True, f"Quick look ready in "
+                f"{time.perf_counter() - start:.1f} s.", images
             )
-            
         except Exception as e:
-            self.progress_updated.emit(0.0)
-            self.status_updated.emit(
-                f"[WKHTMLTOPDF] Conversion failed: {str(e)}"
-            )
-            self.conversion_finished.emit(
-                False, f"Conversion failed: {str(e)}"
+            self.preview_finished.emit(
+                False, f"Quick look failed: {str(e)}", []
             )
 
-    async def html_to_pdf_async(self, html_content, output_path):
-        """Convert HTML to PDF using Playwright asynchronously."""
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
 
-            # Set HTML content and wait for network idle
-            await page.set_content(html_content, wait_until="networkidle")
+class ProjectBuildThread(QThread):
+    """Thread rebuilding the outdated outputs of a project."""
 
-            # Generate PDF with options
-            await page.pdf(
-                path=output_path,
-                format='A4',
-                print_background=True
-            )
-
-            await browser.close()
+    build_finished = pyqtSignal(bool, str)
 
-    def convert_with_playwright(self):
-        """Convert markdown to PDF using Playwright."""
-        self.progress_updated.emit(0.3)
-        self.status_updated.emit("Preparing conversion with Playwright...")
+    def __init__(self, ui_bus, converter, project_path):
+        """Prepare a build of the project file at ``project_path``."""
+        super().__init__()
+        self.ui_bus = ui_bus
+        self.converter = converter
+        self.project_path = project_path
 
+    def run(self):
+        """Build the project and summarise what was rebuilt."""
         try:
-            self.progress_updated.emit(0.5)
-            self.status_updated.emit(
-                "[PLAYWRIGHT] Converting Markdown to HTML..."
-            )
-
-            html_content = self.md_to_html(
-                self.md_content, self.css_content, self.pdf_title
+            project = Project(self.project_path)
+            results = project.build(
+                self.converter,
+                on_event=lambda event: self.ui_bus.post_event(
+                    (id(self), event.output_path), event
+                )
             )
+        except Exception as e:
+            self.build_finished.emit(False, f"Project build failed: {e}")
+            return
+        lines = []
+        for result in results:
+            name = project.relative(result.output)
+            if result.status == "failed":
+                lines.append(f"{name}: failed: {result.error}")
+            elif result.status == "built":
+                lines.append(f"{name}: rebuilt, {result.reason}")
+            else:
+                lines.append(f"{name}: up to date")
+        failed = any(result.status == "failed" for result in results)
+        self.build_finished.emit(not failed, "\n".join(lines))
 
-            self.progress_updated.emit(0.7)
-            self.status_updated.emit("Generating PDF with Playwright...")
 
-            asyncio.run(self.html_to_pdf_async(html_content, self.output_path))
+class PlainTextEdit(QPlainTextEdit):
+    """Markdown editor with incremental syntax highlighting.
 
-            self.progress_updated.emit(1.0)
-            self.status_updated.emit(
-                "[PLAYWRIGHT] Conversion completed successfully!"
-            )
+    QPlainTextEdit pastes plain text only and lays out large documents
+    block by block, which keeps typing responsive on very long files.
+    """
 
-            self.conversion_finished.emit(
-                True, f"PDF saved to: {self.output_path}"
-            )
-
-        except Exception as e:
-            self.progress_updated.emit(0.0)
-            self.status_updated.emit(
-                f"[PLAYWRIGHT] Conversion failed: {str(e)}"
-            )
-            self.conversion_finished.emit(
-                False, f"Conversion failed: {str(e)}"
-            )
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.highlighter = MarkdownHighlighter(self.document())
 
-class PlainTextEdit(QTextEdit):
-    def insertFromMimeData(self, source: QMimeData):
-        if source.hasText():
-            self.insertPlainText(source.text())
-        else:
-            super().insertFromMimeData(source)
 
 class MarkdownToPDFConverter(QMainWindow):
     """Main application window for the Markdown to PDF converter."""
@@ -286,7 +205,21 @@ class MarkdownToPDFConverter(QMainWindow):
         super().__init__()
         self.setup_window()
         self.create_widgets()
-        self.wkhtmltopdf_path = self.find_wkhtmltopdf()
+        self.wkhtmltopdf_path = find_wkhtmltopdf()
+        # Engines run warm in supervised worker processes, so a crash or
+        # leak in one of them cannot take the window down
+        self.converter = WorkerPool(
+            wkhtmltopdf_path=self.wkhtmltopdf_path, timeout=600
+        )
+        # In-process engines need this process's event loop instead
+        self.local_converter = Converter(self.wkhtmltopdf_path)
+        self.quick_look_thread = None
+        self.quick_look_dialog = None
+        self.build_thread = None
+        fd, self.quick_look_path = tempfile.mkstemp(
+            prefix="dasmdf-quicklook-", suffix=".pdf"
+        )
+        os.close(fd)
 
     def setup_window(self):
         """Configure the main application window."""
@@ -340,8 +273,8 @@ class MarkdownToPDFConverter(QMainWindow):
         md_label.setFont(md_font)
         content_layout.addWidget(md_label, 0, 0)
 
-        # Markdown textbox with monospace font
-        # Use PlainTextEdit for better handling of pasted text
+        # Markdown textbox with monospace font and syntax highlighting
+        # Use PlainTextEdit for plain-text pasting and large documents
         self.md_textbox = PlainTextEdit()
         mono_font = QFont("Consolas", 10)
         self.md_textbox.setFont(mono_font)
@@ -377,16 +310,68 @@ class MarkdownToPDFConverter(QMainWindow):
         preview_btn.clicked.connect(self.preview_document)
         button_layout.addWidget(preview_btn)
 
+        quick_look_btn = QPushButton("Quick Look")
+        quick_look_btn.setToolTip(
+            f"Render the first {QUICK_LOOK_PAGES} pages with the selected "
+            "engine and show them here"
+        )
+        quick_look_btn.clicked.connect(self.quick_look)
+        button_layout.addWidget(quick_look_btn)
+
+        build_btn = QPushButton("Build Project")
+        build_btn.setToolTip(
+            "Rebuild the PDFs of a dasmdf.json project whose markdown, "
+            "includes, CSS or images changed"
+        )
+        build_btn.clicked.connect(self.build_project)
+        button_layout.addWidget(build_btn)
+
+        self.at_cursor_check = QCheckBox("At cursor")
+        self.at_cursor_check.setToolTip(
+            "Quick Look the section the cursor is in instead of the start"
+        )
+        button_layout.addWidget(self.at_cursor_check)
+
         # Engine selection
         engine_label = QLabel("Engine:")
         button_layout.addWidget(engine_label)
 
         self.engine_combo = QComboBox()
-        self.engine_combo.addItems(
-            ["playwright", "weasyprint", "wkhtml"]
-        )
+        self.engine_combo.addItems(list(ENGINE_CHOICES))
+        self.engine_combo.currentTextChanged.connect(self.on_engine_changed)
         button_layout.addWidget(self.engine_combo)
 
+        # Quality profile: built-in draft/final plus ~/.dasmdf/profiles.json
+        profile_label = QLabel("Quality:")
+        button_layout.addWidget(profile_label)
+
+        self.profile_combo = QComboBox()
+        profile_error = None
+        try:
+            self.profile_combo.addItems(profile_names())
+        except ConversionError as e:
+            self.profile_combo.addItems(["final", "draft"])
+            profile_error = e
+        self.profile_combo.setCurrentText("final")
+        self.profile_combo.setToolTip(
+            "draft renders review copies quickly; final is for print"
+        )
+        button_layout.addWidget(self.profile_combo)
+
+        self.prune_css_check = QCheckBox("Prune unused CSS")
+        self.prune_css_check.setToolTip(
+            "Drop CSS rules that match nothing in the document before "
+            "rendering (faster with WeasyPrint)"
+        )
+        button_layout.addWidget(self.prune_css_check)
+
+        self.reproducible_check = QCheckBox("Reproducible")
+        self.reproducible_check.setToolTip(
+            "Pin the PDF's dates (to SOURCE_DATE_EPOCH) and identifiers so "
+            "the same document always gives an identical file"
+        )
+        button_layout.addWidget(self.reproducible_check)
+
         convert_btn = QPushButton("Convert to PDF")
         convert_btn.clicked.connect(self.convert_to_pdf)
         convert_btn.setStyleSheet(
@@ -395,6 +380,20 @@ class MarkdownToPDFConverter(QMainWindow):
         )
         button_layout.addWidget(convert_btn)
 
+        # Opt-in stall watchdog, enabled by DASMDF_WATCHDOG=<ms>
+        self.watchdog = None
+        self.stall_dialog = None
+        threshold = stall_threshold()
+        if threshold is not None:
+            self.watchdog = StallWatchdog(threshold, parent=self)
+            stalls_btn = QPushButton("Stalls")
+            stalls_btn.setToolTip(
+                "List the code paths that blocked the window the longest"
+            )
+            stalls_btn.clicked.connect(self.show_stalls)
+            button_layout.addWidget(stalls_btn)
+            self.watchdog.start()
+
         # Progress bar
         self.progress_bar = QProgressBar()
         content_layout.addWidget(self.progress_bar, 3, 0, 1, 2)
@@ -404,6 +403,13 @@ class MarkdownToPDFConverter(QMainWindow):
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         content_layout.addWidget(self.status_label, 4, 0, 1, 2)
 
+        # Worker progress and status reach the widgets through this bus
+        self.ui_bus = UiUpdateBus(
+            self.progress_bar, self.status_label, parent=self
+        )
+        if profile_error is not None:
+            self.update_status(f"Ignoring custom profiles: {profile_error}")
+
         # Add default content
         self.add_default_content()
 
@@ -416,7 +422,11 @@ class MarkdownToPDFConverter(QMainWindow):
             "<ul>"
             "<li>Support for multiple conversion engines: <b>Playwright</b>, <b>WeasyPrint</b>, and <b>wkhtmltopdf</b></li>"
             "<li>Live HTML preview in your default browser (independent of selected engine)</li>"
+            "<li>Quick Look: the first pages (or the section at the cursor) rendered with the selected engine, shown in the app</li>"
+            "<li>Build Project: rebuild the PDFs of a dasmdf.json project whose markdown, includes, CSS or images changed</li>"
             "<li>Option to apply custom CSS for better styling</li>"
+            "<li>Quality profiles: <b>draft</b> for quick review copies, <b>final</b> for print, or your own in ~/.dasmdf/profiles.json</li>"
+            "<li>Reproducible PDFs: identical files for identical documents, dated from SOURCE_DATE_EPOCH</li>"
             "</ul><br>"
 
             "<b>🛠️ Conversion Engines:</b><br>"
@@ -436,6 +446,15 @@ class MarkdownToPDFConverter(QMainWindow):
             "<tr><td><b>wkhtmltopdf</b></td>"
             "<td>Stable and mature.<br>Fast rendering.</td>"
             "<td>Outdated rendering engine.<br>Poor emoji and modern CSS support.</td></tr>"
+
+            "<tr><td><b>Qt WebEngine</b></td>"
+            "<td>Chromium built into the app: no browser to launch.<br>"
+            "Fast once warm.</td>"
+            "<td>Needs PyQt6-WebEngine.<br>Only available in this app.</td></tr>"
+
+            "<tr><td><b>Qt draft</b></td>"
+            "<td>Instant drafts of prose, tables and code, laid out by Qt itself.</td>"
+            "<td>No math, diagrams or remote images: such documents go to Playwright.</td></tr>"
             "</table><br>"
 
             "<b>📘 How to Use:</b>"
@@ -647,8 +666,9 @@ th {
                 )
                 return
 
-            html_content = ConversionThread.md_to_html(
-                self, md_content, css_content, pdf_title="DasMDF Preview"
+            html_content = render_html(
+                md_content, css_content, title="DasMDF Preview",
+                prune_css=self.prune_css_check.isChecked()
             )
 
             with tempfile.NamedTemporaryFile(
@@ -666,37 +686,54 @@ th {
                 self, "Error", f"Failed to preview HTML: {str(e)}"
             )
 
-    def find_wkhtmltopdf(self):
-        """Find the wkhtmltopdf executable in the system PATH."""
-        # First, try searching in PATH
-        for path in os.environ["PATH"].split(os.pathsep):
-            exe_path = Path(path) / "wkhtmltopdf"
-            if exe_path.exists() and exe_path.is_file():
-                return str(exe_path)
-
-        # Then, try common installation paths (Windows)
-        common_paths = [
-            r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            r"C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe",
-            r"wkhtmltopdf\bin\wkhtmltopdf.exe",  # Relative path
-            # If in PATH as a command
-        ]
-        for path in common_paths:
-            try:
-                if os.path.exists(path):
-                    return path
-                elif path == "wkhtmltopdf":
-                    subprocess.run(
-                        [path, "--version"], capture_output=True, check=True
-                    )
-                    return path
-            except Exception:
-                continue
-        return None
+    def quick_look(self):
+        """Render the first pages with the selected engine and show them."""
+        md_content = self.md_textbox.toPlainText()
+        if not md_content.strip():
+            QMessageBox.warning(
+                self, "Warning", "No markdown content to preview!"
+            )
+            return
+        if self.quick_look_thread and self.quick_look_thread.isRunning():
+            self.update_status("Quick look already in progress...")
+            return
+
+        engine, fallback, _ = ENGINE_CHOICES[self.engine_combo.currentText()]
+        job = ConversionJob(
+            md_content, self.quick_look_path, engine,
+            self.css_textbox.toPlainText(), "DasMDF Preview",
+            self.prune_css_check.isChecked(), fallback=fallback,
+            timeouts=ENGINE_TIMEOUTS, profile=QUICK_LOOK_PROFILE
+        )
+        cursor = None
+        if self.at_cursor_check.isChecked():
+            cursor = self.md_textbox.textCursor().position()
+
+        self.quick_look_thread = QuickLookThread(
+            self.ui_bus, self.converter_for(engine, fallback), job,
+            self.quick_look_path, cursor
+        )
+        self.quick_look_thread.preview_finished.connect(
+            self.on_quick_look_finished
+        )
+        self.quick_look_thread.start()
+
+    def on_quick_look_finished(self, success, message, images):
+        """Show the rendered pages, or the reason there are none."""
+        if not success:
+            QMessageBox.critical(self, "Error", message)
+            self.update_status("Ready to convert")
+            return
+        if self.quick_look_dialog is None:
+            self.quick_look_dialog = QuickLookDialog(self)
+        self.quick_look_dialog.show_pages(images)
+        self.update_status(message)
 
     def convert_to_pdf(self):
         """Convert the markdown content to PDF."""
-        engine = self.engine_combo.currentText()
+        engine, fallback, race = ENGINE_CHOICES[
+            self.engine_combo.currentText()
+        ]
         md_content = self.md_textbox.toPlainText().strip()
 
         if not md_content:
@@ -705,6 +742,14 @@ th {
             )
             return
 
+        source_date = None
+        if self.reproducible_check.isChecked():
+            try:
+                source_date = source_date_epoch()
+            except ConversionError as e:
+                QMessageBox.critical(self, "Error", str(e))
+                return
+
         # Get PDF title
         pdf_title, ok = QInputDialog.getText(
             self, "Save as PDF", "Please enter a title for your PDF:"
@@ -731,31 +776,88 @@ th {
 
         # Create and start conversion thread
         self.conversion_thread = ConversionThread(
-            engine, md_content, css_content, output_path, 
-            pdf_title, self.wkhtmltopdf_path
+            self.ui_bus, self.converter_for(engine, fallback), engine,
+            md_content, css_content, output_path,
+            pdf_title, prune_css=self.prune_css_check.isChecked(),
+            fallback=fallback, race=race,
+            profile=self.profile_combo.currentText(),
+            source_date=source_date
         )
         # Connect signals
-        self.conversion_thread.progress_updated.connect(self.update_progress)
-        self.conversion_thread.status_updated.connect(self.update_status)
         self.conversion_thread.conversion_finished.connect(
             self.on_conversion_finished
         )
 
         self.conversion_thread.start()
 
-    def update_status(self, message):
-        """Update the status label with a new message."""
-        self.status_label.setText(message)
-        QApplication.processEvents()
+    def build_project(self):
+        """Rebuild the outdated outputs of a project file."""
+        if self.build_thread and self.build_thread.isRunning():
+            self.update_status("Project build already in progress...")
+            return
+        project_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Project File",
+            "",
+            "DasMDF projects (*.json);;All files (*.*)"
+        )
+        if not project_path:
+            return
+        self.update_status(f"Building {Path(project_path).parent.name}...")
+        self.build_thread = ProjectBuildThread(
+            self.ui_bus, self.converter, project_path
+        )
+        self.build_thread.build_finished.connect(self.on_build_finished)
+        self.build_thread.start()
 
-    def update_progress(self, value):
-        """Update the progress bar value."""
-        self.progress_bar.setValue(int(value * 100))
+    def on_build_finished(self, success, message):
+        """Report which outputs were rebuilt."""
+        if success:
+            QMessageBox.information(self, "Project Built", message)
+        else:
+            QMessageBox.critical(self, "Error", message)
+        self.update_status("Ready to convert")
+
+    def converter_for(self, engine, fallback=()):
+        """Return the converter that can run ``engine`` and ``fallback``."""
+        if any(name in IN_PROCESS_ENGINES for name in (engine, *fallback)):
+            return self.local_converter
+        return self.converter
+
+    def on_engine_changed(self, choice):
+        """Start Qt WebEngine's Chromium as soon as it is picked."""
+        engine, fallback, _ = ENGINE_CHOICES[choice]
+        if webengine is not None and "qtwebengine" in (engine, *fallback):
+            webengine.warm_up()
+
+    def show_stalls(self):
+        """Show the worst GUI stalls recorded by the watchdog."""
+        if self.stall_dialog is None:
+            self.stall_dialog = StallReportDialog(self.watchdog, self)
+        else:
+            self.stall_dialog.refresh()
+        self.stall_dialog.show()
+        self.stall_dialog.raise_()
+        self.stall_dialog.activateWindow()
+
+    def closeEvent(self, event):
+        """Shut down the engine workers when the window closes."""
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        self.converter.close()
+        self.local_converter.close()
+        try:
+            os.remove(self.quick_look_path)
+        except OSError:
+            pass
+        super().closeEvent(event)
+
+    def update_status(self, message):
+        """Show a status message on the next UI frame."""
+        self.ui_bus.post_status(message)
 
     def on_conversion_finished(self, success, message):
         """Handle conversion completion."""
-        self.progress_bar.setValue(0)
-
         if success:
             self.update_status("Conversion completed successfully!")
             self.save_default_css()  # Save CSS if modified
@@ -785,7 +887,13 @@ th {
 
 def main():
     """Main entry point."""
+    # Needed by the highlighting worker pool in frozen Windows builds
+    multiprocessing.freeze_support()
+    isolate_parses()
+
     app = QApplication(sys.argv)
+    if webengine is not None:
+        webengine.install()
     app.setStyle('Fusion')  # Modern look
 
     # Set dark theme
@@ -798,7 +906,7 @@ def main():
             background-color: #2b2b2b;
             color: #ffffff;
         }
-        QTextEdit {
+        QTextEdit, QPlainTextEdit {
             background-color: #3c3c3c;
             border: 1px solid #555555;
             color: #ffffff;
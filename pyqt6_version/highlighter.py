@@ -0,0 +1,135 @@
+"""
+DasMDF - Markdown editor highlighting
+
+Incremental syntax highlighting for the markdown editor. Qt only calls
+``highlightBlock`` for the lines that changed, and keeps going to the
+following lines only while their block state changes. Open fenced code
+and display-math blocks are carried in that state, so a keystroke
+re-highlights a single line unless it opens or closes such a block.
+"""
+
+import re
+
+from PyQt6.QtGui import QColor, QFont, QSyntaxHighlighter, QTextCharFormat
+
+# Block states; a fenced block stores FENCE + the length of its fence so
+# only a matching closing fence ends it.
+NORMAL = 0
+MATH = 1
+FENCE = 16
+
+FENCE_RE = re.compile(r'^[ \t]*(`{3,})')
+MATH_FENCE_RE = re.compile(r'^[ \t]*\$\$')
+HEADING_RE = re.compile(r'^#{1,6}(?:\s|$)')
+BLOCKQUOTE_RE = re.compile(r'^[ \t]*>')
+LIST_RE = re.compile(r'^[ \t]*(?:[*+-]|\d+[.)])[ \t]')
+TABLE_RE = re.compile(r'^[ \t]*\|')
+TABLE_RULE_RE = re.compile(
+    r'^[ \t]*\|?[ \t]*:?-{3,}:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$'
+)
+
+# Inline patterns, applied in order; later ones win where they overlap.
+INLINE_PATTERNS = (
+    ('emphasis', re.compile(r'(?<![*\w])\*(?!\s)[^*\n]+?\*(?!\*)'
+                            r'|(?<![_\w])_(?!\s)[^_\n]+?_(?![_\w])')),
+    ('strong', re.compile(r'\*\*(?!\s).+?\*\*|__(?!\s).+?__')),
+    ('strike', re.compile(r'~~(?!\s).+?~~')),
+    ('link', re.compile(r'!?\[[^\]\n]*\]\([^)\n]*\)')),
+    ('table', re.compile(r'\|')),
+    ('math', re.compile(r'(?<![\\$])\$(?![\s$])[^$\n]+?(?<![\s\\])\$'
+                        r'|\\\(.+?\\\)')),
+    ('code', re.compile(r'(`+)(?!`).+?(?<!`)\1(?!`)')),
+)
+
+
+def _format(color, bold=False, italic=False, strike=False):
+    """Build a character format for the editor's dark theme."""
+    fmt = QTextCharFormat()
+    if color:
+        fmt.setForeground(QColor(color))
+    if bold:
+        fmt.setFontWeight(QFont.Weight.Bold)
+    fmt.setFontItalic(italic)
+    fmt.setFontStrikeOut(strike)
+    return fmt
+
+
+class MarkdownHighlighter(QSyntaxHighlighter):
+    """Highlight headings, emphasis, code, tables and math in markdown."""
+
+    def __init__(self, document):
+        """Attach the highlighter to a QTextDocument."""
+        super().__init__(document)
+        self.formats = {
+            'heading': _format("#569cd6", bold=True),
+            'emphasis': _format(None, italic=True),
+            'strong': _format(None, bold=True),
+            'strike': _format("#9e9e9e", strike=True),
+            'link': _format("#4ec9b0"),
+            'code': _format("#ce9178"),
+            'fence': _format("#6a9955"),
+            'math': _format("#dcdcaa"),
+            'quote': _format("#9e9e9e", italic=True),
+            'list': _format("#d7ba7d", bold=True),
+            'table': _format("#c586c0"),
+        }
+
+    def highlightBlock(self, text):
+        """Highlight one line, carrying fence and math state forward."""
+        state = self.previousBlockState()
+
+        if state >= FENCE:
+            match = FENCE_RE.match(text)
+            if match and len(match.group(1)) >= state - FENCE \
+                    and not text[match.end():].strip():
+                self.setFormat(0, len(text), self.formats['fence'])
+                self.setCurrentBlockState(NORMAL)
+            else:
+                self.setFormat(0, len(text), self.formats['code'])
+                self.setCurrentBlockState(state)
+            return
+
+        if state == MATH:
+            self.setFormat(0, len(text), self.formats['math'])
+            closed = text.rstrip().endswith('$$')
+            self.setCurrentBlockState(NORMAL if closed else MATH)
+            return
+
+        match = FENCE_RE.match(text)
+        if match:
+            self.setFormat(0, len(text), self.formats['fence'])
+            self.setCurrentBlockState(FENCE + len(match.group(1)))
+            return
+
+        if MATH_FENCE_RE.match(text):
+            self.setFormat(0, len(text), self.formats['math'])
+            rest = text.strip()[2:]
+            self.setCurrentBlockState(NORMAL if '$$' in rest else MATH)
+            return
+
+        self.setCurrentBlockState(NORMAL)
+
+        if HEADING_RE.match(text):
+            self.setFormat(0, len(text), self.formats['heading'])
+            return
+        if TABLE_RE.match(text) and TABLE_RULE_RE.match(text):
+            self.setFormat(0, len(text), self.formats['table'])
+            return
+        if BLOCKQUOTE_RE.match(text):
+            self.setFormat(0, len(text), self.formats['quote'])
+        else:
+            match = LIST_RE.match(text)
+            if match:
+                self.setFormat(0, match.end(), self.formats['list'])
+
+        is_table = '|' in text and (
+            TABLE_RE.match(text) or text.count('|') >= 2
+        )
+        for name, pattern in INLINE_PATTERNS:
+            if name == 'table' and not is_table:
+                continue
+            fmt = self.formats[name]
+            for match in pattern.finditer(text):
+                self.setFormat(
+                    match.start(), match.end() - match.start(), fmt
+                )
@@ -0,0 +1,68 @@
+"""
+DasMDF - Quick look
+
+Shows the first pages of a preview PDF as images inside the app, so
+styling can be checked without opening a PDF viewer. Pages are
+rasterised with Qt's own PDF module; ``render_pages`` only touches
+QImage and can run on a worker thread.
+"""
+
+from PyQt6.QtCore import QSize, Qt
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtPdf import QPdfDocument
+from PyQt6.QtWidgets import (
+    QDialog, QLabel, QScrollArea, QVBoxLayout, QWidget
+)
+
+# Width in pixels pages are rasterised at
+PAGE_WIDTH = 800
+
+
+def render_pages(pdf_path, pages, width=PAGE_WIDTH):
+    """Rasterise the first ``pages`` pages of a PDF to QImages."""
+    document = QPdfDocument(None)
+    try:
+        if document.load(pdf_path) != QPdfDocument.Error.None_:
+            raise RuntimeError(f"Cannot open the preview PDF {pdf_path}")
+        images = []
+        for page in range(min(pages, document.pageCount())):
+            size = document.pagePointSize(page)
+            height = round(width * size.height() / size.width())
+            images.append(document.render(page, QSize(width, height)))
+        return images
+    finally:
+        document.close()
+
+
+class QuickLookDialog(QDialog):
+    """A non-modal window showing rendered pages one below the other."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("DasMDF - Quick Look")
+        self.resize(PAGE_WIDTH + 60, 900)
+
+        self.pages_layout = QVBoxLayout()
+        self.pages_layout.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        container = QWidget()
+        container.setLayout(self.pages_layout)
+
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(container)
+        layout = QVBoxLayout()
+        layout.addWidget(scroll)
+        self.setLayout(layout)
+
+    def show_pages(self, images):
+        """Replace the pages on show with ``images`` and raise the window."""
+        while self.pages_layout.count():
+            self.pages_layout.takeAt(0).widget().deleteLater()
+        for image in images:
+            label = QLabel()
+            label.setPixmap(QPixmap.fromImage(image))
+            label.setStyleSheet("border: 1px solid #555555;")
+            self.pages_layout.addWidget(label)
+        self.show()
+        self.raise_()
+        self.activateWindow()
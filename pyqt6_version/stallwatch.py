@@ -0,0 +1,243 @@
+"""
+DasMDF - Stall watchdog
+
+Finds out what freezes the window. A heartbeat timer on the GUI thread
+measures how late the event loop gets round to it; a watchdog thread
+notices when the heartbeat has been held up for longer than the
+threshold and captures the GUI thread's Python stack while it is still
+blocked. When the loop resumes, the stall is logged to the
+``dasmdf.watchdog`` logger with its duration and stack, and
+``StallReportDialog`` lists the code paths that stalled the longest.
+
+Off unless ``DASMDF_WATCHDOG`` is set to the threshold in milliseconds:
+
+    DASMDF_WATCHDOG=200 python dasmdf.py
+
+A stack can only be taken while the blocking call lets other Python
+threads run. Stalls inside C++ code that holds the interpreter lock are
+still measured, but reported without a stack.
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, Qt, QTimer
+from PyQt6.QtWidgets import (
+    QDialog, QHeaderView, QLabel, QPlainTextEdit, QTableWidget,
+    QTableWidgetItem, QVBoxLayout
+)
+
+logger = logging.getLogger("dasmdf.watchdog")
+
+# Milliseconds between heartbeats on the GUI thread
+HEARTBEAT_MS = 50
+# Latency samples kept for the summary
+LATENCY_SAMPLES = 10000
+# Stalls kept, the most recent ones
+MAX_STALLS = 1000
+# Code under the app's folder is blamed before Qt, the standard library
+# and third-party packages
+_APP_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def stall_threshold():
+    """Return the threshold in seconds from DASMDF_WATCHDOG, or None."""
+    value = os.environ.get("DASMDF_WATCHDOG", "").strip()
+    if not value or float(value) <= 0:
+        return None
+    return float(value) / 1000
+
+
+@dataclass
+class Stall:
+    """A time the GUI thread did not get back to its event loop."""
+
+    started: float
+    duration: float
+    stack: list = field(default_factory=list)
+
+    @property
+    def site(self):
+        """Return 'file:line in function' for the code to blame."""
+        if not self.stack:
+            return "(no Python stack: blocked in native code)"
+        frame = self.stack[-1]
+        for candidate in reversed(self.stack):
+            if candidate.filename.startswith(_APP_ROOT):
+                frame = candidate
+                break
+        return (f"{os.path.basename(frame.filename)}:{frame.lineno} "
+                f"in {frame.name}")
+
+    def format_stack(self):
+        """Return the captured stack as traceback text."""
+        if not self.stack:
+            return "No stack was captured for this stall.\n"
+        return "".join(traceback.format_list(self.stack))
+
+
+class StallWatchdog(QObject):
+    """Measure event-loop latency and record stalls of the GUI thread."""
+
+    def __init__(self, threshold, parent=None):
+        """Watch the calling thread for stalls over ``threshold`` s."""
+        super().__init__(parent)
+        self.threshold = threshold
+        self.interval = HEARTBEAT_MS / 1000
+        self.stalls = collections.deque(maxlen=MAX_STALLS)
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+        self._thread_id = threading.get_ident()
+        self._lock = threading.Lock()
+        self._beat = time.monotonic()
+        self._stack = None
+        self._stop = threading.Event()
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._heartbeat)
+        self._watcher = threading.Thread(
+            target=self._watch, name="dasmdf-watchdog", daemon=True
+        )
+
+    def start(self):
+        """Start the heartbeat and the watchdog thread."""
+        self._beat = time.monotonic()
+        self._timer.start(HEARTBEAT_MS)
+        self._watcher.start()
+
+    def stop(self):
+        """Stop watching and log the summary."""
+        self._timer.stop()
+        self._stop.set()
+        if self.stalls:
+            logger.warning("GUI stall summary:\n%s", self.format_summary())
+
+    def _heartbeat(self):
+        """Measure how late this beat is and close any stall it ends."""
+        now = time.monotonic()
+        with self._lock:
+            latency = max(now - self._beat - self.interval, 0.0)
+            stack = self._stack
+            self._beat = now
+            self._stack = None
+        self.latencies.append(latency)
+        if latency <= self.threshold:
+            return
+        stall = Stall(time.time() - latency, latency, stack or [])
+        self.stalls.append(stall)
+        logger.warning(
+            "GUI thread stalled for %.0f ms at %s\n%s",
+            latency * 1000, stall.site, stall.format_stack().rstrip()
+        )
+
+    def _watch(self):
+        """Take the GUI thread's stack once a heartbeat is overdue."""
+        period = max(self.threshold / 4, 0.005)
+        while not self._stop.wait(period):
+            with self._lock:
+                overdue = time.monotonic() - self._beat - self.interval
+                if overdue <= self.threshold or self._stack is not None:
+                    continue
+                frame = sys._current_frames().get(self._thread_id)
+                if frame is not None:
+                    self._stack = traceback.extract_stack(frame)
+                del frame
+
+    def latency_summary(self):
+        """Return (samples, mean, 99th percentile, max) latency in s."""
+        samples = sorted(self.latencies)
+        if not samples:
+            return 0, 0.0, 0.0, 0.0
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return len(samples), sum(samples) / len(samples), p99, samples[-1]
+
+    def worst_offenders(self):
+        """Return (site, count, total s, worst Stall) by total time."""
+        sites = {}
+        for stall in self.stalls:
+            count, total, worst = sites.get(stall.site, (0, 0.0, stall))
+            if stall.duration > worst.duration:
+                worst = stall
+            sites[stall.site] = (count + 1, total + stall.duration, worst)
+        return sorted(
+            ((site, *values) for site, values in sites.items()),
+            key=lambda row: row[2], reverse=True
+        )
+
+    def format_summary(self):
+        """Return the worst offenders as text, one line per site."""
+        lines = []
+        for site, count, total, worst in self.worst_offenders():
+            lines.append(
+                f"{total * 1000:8.0f} ms {count:4} stalls "
+                f"(worst {worst.duration * 1000:.0f} ms)  {site}"
+            )
+        return "\n".join(lines)
+
+
+class StallReportDialog(QDialog):
+    """Lists the sites that stalled the GUI thread longest."""
+
+    def __init__(self, watchdog, parent=None):
+        super().__init__(parent)
+        self.watchdog = watchdog
+        self.setWindowTitle("DasMDF - GUI Stalls")
+        self.resize(900, 600)
+
+        self.latency_label = QLabel()
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(
+            ["Total (ms)", "Stalls", "Worst (ms)", "Where"]
+        )
+        self.table.horizontalHeader().setSectionResizeMode(
+            3, QHeaderView.ResizeMode.Stretch
+        )
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(
+            QTableWidget.SelectionBehavior.SelectRows
+        )
+        self.table.currentCellChanged.connect(self.show_stack)
+        self.stack_view = QPlainTextEdit()
+        self.stack_view.setReadOnly(True)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.latency_label)
+        layout.addWidget(self.table, 1)
+        layout.addWidget(QLabel("Stack of the worst stall:"))
+        layout.addWidget(self.stack_view, 1)
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        """Reload the latency figures and the offenders."""
+        samples, mean, p99, worst = self.watchdog.latency_summary()
+        self.latency_label.setText(
+            f"Event-loop latency over {samples:,} heartbeats: mean "
+            f"{mean * 1000:.1f} ms, 99th percentile {p99 * 1000:.1f} ms, "
+            f"max {worst * 1000:.0f} ms. Stalls are over "
+            f"{self.watchdog.threshold * 1000:.0f} ms."
+        )
+        self.rows = self.watchdog.worst_offenders()
+        self.table.setRowCount(len(self.rows))
+        for row, (site, count, total, stall) in enumerate(self.rows):
+            for column, text in enumerate((
+                    f"{total * 1000:.0f}", str(count),
+                    f"{stall.duration * 1000:.0f}", site)):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        if self.rows:
+            self.table.selectRow(0)
+        else:
+            self.stack_view.setPlainText("No stalls so far.")
+
+    def show_stack(self, row, *args):
+        """Show the stack of the worst stall at the selected site."""
+        if 0 <= row < len(self.rows):
+            self.stack_view.setPlainText(self.rows[row][3].format_stack())
@@ -0,0 +1,116 @@
+"""
+DasMDF - UI update bus
+
+Collects progress and status updates from any number of worker threads
+and applies them to the window at a fixed frame rate. Workers only touch
+a lock-protected state; the first update after a frame wakes the GUI
+thread once through a queued signal, and everything posted until the
+next frame is coalesced into a single repaint. The event loop is never
+pumped by hand.
+"""
+
+import threading
+import time
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+
+class UiUpdateBus(QObject):
+    """Coalesce worker updates into at most one UI refresh per frame."""
+
+    _wake = pyqtSignal()
+
+    def __init__(self, progress_bar, status_label, fps=30, parent=None):
+        """Drive ``progress_bar`` and ``status_label`` at ``fps``."""
+        super().__init__(parent)
+        self.progress_bar = progress_bar
+        self.status_label = status_label
+        self.frame_ms = max(1, int(1000 / fps))
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._status = None
+        self._active = {}
+        self._busy_since = None
+        self._completed = 0
+        self._pages = 0
+        # Progress shown once no job is active: the end of the last run
+        self._final = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._flush)
+        self._wake.connect(self._schedule)
+
+    def post_status(self, message):
+        """Show ``message`` on the next frame; safe from any thread."""
+        with self._lock:
+            self._status = message
+            self._mark_dirty()
+
+    def post_event(self, key, event):
+        """Record a dasmdf ProgressEvent for the job identified by ``key``."""
+        with self._lock:
+            if self._busy_since is None:
+                self._busy_since = time.monotonic()
+                self._completed = 0
+                self._pages = 0
+                self._final = None
+            self._status = event.message
+            if event.finished:
+                self._active.pop(key, None)
+                self._completed += 1
+                self._pages += event.pages or 0
+                if not self._active:
+                    self._final = 1.0 if event.stage == "done" else 0.0
+            else:
+                self._active[key] = event.progress
+            self._mark_dirty()
+
+    def throughput(self):
+        """Return (jobs per minute, pages per second) for the current run."""
+        with self._lock:
+            return self._throughput(time.monotonic())
+
+    def _throughput(self, now):
+        """Compute throughput since the queue became busy; lock held."""
+        if self._busy_since is None:
+            return 0.0, 0.0
+        elapsed = max(now - self._busy_since, 1e-6)
+        return self._completed * 60 / elapsed, self._pages / elapsed
+
+    def _mark_dirty(self):
+        """Wake the GUI thread for the first update of a frame; lock held."""
+        if not self._dirty:
+            self._dirty = True
+            self._wake.emit()
+
+    def _schedule(self):
+        """Start the frame timer on the GUI thread."""
+        if not self._timer.isActive():
+            self._timer.start(self.frame_ms)
+
+    def _flush(self):
+        """Apply everything posted since the last frame."""
+        with self._lock:
+            self._dirty = False
+            status = self._status
+            self._status = None
+            active = list(self._active.values())
+            final = self._final
+            jobs_per_min, pages_per_s = self._throughput(time.monotonic())
+            draining = bool(active) and self._completed > 0
+            if not active:
+                self._busy_since = None
+
+        progress = sum(active) / len(active) if active else final
+        if progress is not None:
+            self.progress_bar.setValue(int(progress * 100))
+
+        if status is not None:
+            if draining:
+                status += f"  ({jobs_per_min:.1f} jobs/min"
+                if pages_per_s:
+                    status += f", {pages_per_s:.1f} pages/s"
+                status += ")"
+            self.status_label.setText(status)
@@ -0,0 +1,310 @@
+"""
+DasMDF - Qt WebEngine engine
+
+Renders with the Chromium built into Qt WebEngine, inside the app's own
+process: no browser is launched and Playwright is not needed. One
+QWebEnginePage stays alive on the GUI thread between conversions, so
+after the first render the engine is warm. Renders are requested from
+conversion threads, which wait while the GUI thread loads and prints
+each document in turn.
+
+Qt WebEngine must be imported before the QApplication is created, so
+import this module early and call ``install()`` once the application
+exists. Run this file to benchmark the engines with this one included:
+
+    python pyqt6_version/webengine.py [-e qtwebengine,playwright]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path
+
+from PyQt6.QtCore import (
+    QEvent, QMarginsF, QObject, QTimer, QUrl, pyqtSignal
+)
+from PyQt6.QtGui import QPageLayout, QPageRanges, QPageSize
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
+from PyQt6.QtWidgets import QApplication
+
+# Make the shared dasmdf core package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dasmdf import ConversionError, Engine, register_engine  # noqa: E402
+from dasmdf.pdf import count_pdf_pages  # noqa: E402
+
+# Seconds MathJax may take to typeset once the page has loaded
+MATHJAX_WAIT = 10.0
+# Seconds between checks on MathJax and on cancelled renders
+POLL_INTERVAL = 0.1
+
+# True once MathJax has typeset the page, or when the page has no MathJax
+_TYPESET_JS = """(function () {
+    if (!window.MathJax || !MathJax.startup || !MathJax.startup.promise) {
+        return true;
+    }
+    MathJax.startup.promise.then(function () {
+        window.dasmdfTypeset = true;
+    });
+    return window.dasmdfTypeset === true;
+})()"""
+
+_printer = None
+
+
+class _Request:
+    """One document to print, and how printing it went."""
+
+    def __init__(self, html_path, output_path, page_size, max_pages,
+                 javascript, on_progress, cancel):
+        self.html_path = html_path
+        self.output_path = output_path
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.javascript = javascript
+        self.on_progress = on_progress
+        self.cancel = cancel
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel is not None and self.cancel.is_set()
+
+    def report(self, fraction):
+        if self.on_progress is not None:
+            self.on_progress(fraction, None, None)
+
+    def finish(self, error=None):
+        self.error = error
+        self.done.set()
+
+
+class _Printer(QObject):
+    """Loads and prints requests one at a time on the GUI thread."""
+
+    requested = pyqtSignal(object)
+    stop_requested = pyqtSignal(object)
+    close_requested = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.page = None
+        self.pending = deque()
+        self.current = None
+        self.waited = 0.0
+        self.requested.connect(self._enqueue)
+        self.stop_requested.connect(self._stop)
+        self.close_requested.connect(self.close)
+
+    def warm_up(self):
+        """Create the page, which starts Chromium's renderer process."""
+        if self.page is None:
+            self.page = QWebEnginePage(self)
+            self.page.loadFinished.connect(self._loaded)
+            self.page.pdfPrintingFinished.connect(self._printed)
+            self.page.setUrl(QUrl("about:blank"))
+
+    def close(self):
+        """Drop the page; pending renders fail."""
+        for request in self.pending:
+            request.finish(ConversionError("Qt WebEngine was shut down."))
+        self.pending.clear()
+        if self.current is not None:
+            self.current.finish(ConversionError("Qt WebEngine was shut down."))
+            self.current = None
+        if self.page is not None:
+            self.page.deleteLater()
+            self.page = None
+
+    def _enqueue(self, request):
+        self.pending.append(request)
+        if self.current is None:
+            self._next()
+
+    def _next(self):
+        """Start loading the next request that is still wanted."""
+        self.current = None
+        while self.pending:
+            request = self.pending.popleft()
+            if request.cancelled:
+                request.finish(ConversionError("Rendering was cancelled."))
+                continue
+            self.warm_up()
+            self.current = request
+            self.page.settings().setAttribute(
+                QWebEngineSettings.WebAttribute.JavascriptEnabled,
+                request.javascript
+            )
+            request.report(0.1)
+            self.page.load(QUrl.fromLocalFile(request.html_path))
+            return
+
+    def _fail(self, error):
+        self.current.finish(error)
+        self._next()
+
+    def _stop(self, request):
+        """Abandon ``request`` if it is still loading."""
+        if request is self.current and self.page is not None:
+            self.page.triggerAction(QWebEnginePage.WebAction.Stop)
+
+    def _loaded(self, ok):
+        request = self.current
+        if request is None:
+            return  # the blank page loaded by warm_up
+        if request.cancelled:
+            self._fail(ConversionError("Rendering was cancelled."))
+        elif not ok:
+            self._fail(
+                ConversionError("Qt WebEngine could not load the document.")
+            )
+        elif request.javascript:
+            request.report(0.3)
+            self.waited = 0.0
+            self._check_typeset()
+        else:
+            self._print()
+
+    def _check_typeset(self):
+        """Print once MathJax is done, or has had its time."""
+        def checked(typeset):
+            if self.current is None:
+                return
+            if self.current.cancelled:
+                self._fail(ConversionError("Rendering was cancelled."))
+            elif typeset or self.waited >= MATHJAX_WAIT:
+                self._print()
+            else:
+                self.waited += POLL_INTERVAL
+                QTimer.singleShot(
+                    int(POLL_INTERVAL * 1000), self._check_typeset
+                )
+        self.page.runJavaScript(_TYPESET_JS, checked)
+
+    def _print(self):
+        request = self.current
+        request.report(0.5)
+        size_id = getattr(QPageSize.PageSizeId, request.page_size or "A4")
+        layout = QPageLayout(
+            QPageSize(size_id), QPageLayout.Orientation.Portrait,
+            QMarginsF()
+        )
+        if request.max_pages:
+            ranges = QPageRanges()
+            ranges.addRange(1, request.max_pages)
+            self.page.printToPdf(request.output_path, layout, ranges)
+        else:
+            self.page.printToPdf(request.output_path, layout)
+
+    def _printed(self, path, success):
+        if self.current is None or path != self.current.output_path:
+            return
+        if success:
+            self.current.report(1.0)
+            self.current.finish()
+            self._next()
+        else:
+            self._fail(
+                ConversionError("Qt WebEngine could not write the PDF.")
+            )
+
+
+def install():
+    """Make the engine usable; call on the GUI thread after QApplication."""
+    global _printer
+    if _printer is None:
+        _printer = _Printer()
+
+
+def warm_up():
+    """Start the engine's Chromium ahead of the first render."""
+    install()
+    _printer.warm_up()
+
+
+@register_engine
+class QtWebEngineEngine(Engine):
+    """Rendering through Qt WebEngine's printToPdf in this process."""
+
+    name = "qtwebengine"
+    label = "QTWEBENGINE"
+    display_name = "Qt WebEngine"
+
+    def __init__(self):
+        """Use the printer installed on the GUI thread."""
+        if _printer is None:
+            raise ConversionError(
+                "The Qt WebEngine engine only runs inside the DasMDF app."
+            )
+
+    def render(self, html, output_path, on_progress=None, cancel=None,
+               page_size=None, max_pages=None, profile=None,
+               source_date=None):
+        """Print HTML to PDF on the GUI thread and wait for it.
+
+        The document is loaded from a temporary file, which avoids the
+        size limit on HTML set directly. Dates are left for
+        ``make_reproducible`` to pin.
+        """
+        if threading.current_thread() is threading.main_thread():
+            raise ConversionError(
+                "Qt WebEngine renders must be requested off the GUI thread."
+            )
+        if not isinstance(html, str):
+            html = "".join(html)
+        fd, html_path = tempfile.mkstemp(prefix="dasmdf-", suffix=".html")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(html)
+            request = _Request(
+                html_path, os.path.abspath(output_path), page_size,
+                max_pages, profile is None or profile.uses_javascript,
+                on_progress, cancel
+            )
+            request.report(0.0)
+            _printer.requested.emit(request)
+            stopped = False
+            while not request.done.wait(POLL_INTERVAL):
+                if request.cancelled and not stopped:
+                    _printer.stop_requested.emit(request)
+                    stopped = True
+        finally:
+            os.remove(html_path)
+        if request.error is not None:
+            raise request.error
+        return count_pdf_pages(output_path)
+
+    def close(self):
+        """Release the page; safe to call from any thread."""
+        if _printer is not None:
+            _printer.close_requested.emit()
+
+
+def main(argv=None):
+    """Run the engine benchmark with Qt WebEngine's event loop going."""
+    from dasmdf import bench
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication(sys.argv[:1])
+    install()
+    status = []
+    worker = threading.Thread(
+        target=lambda: status.append(bench.main(argv)),
+        name="dasmdf-bench", daemon=True
+    )
+    worker.start()
+    timer = QTimer()
+    timer.timeout.connect(lambda: worker.is_alive() or app.quit())
+    timer.start(int(POLL_INTERVAL * 1000))
+    app.exec()
+    _printer.close()
+    # Delete the page before the application, as Qt WebEngine expects
+    app.sendPostedEvents(None, QEvent.Type.DeferredDelete.value)
+    return status[0] if status else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
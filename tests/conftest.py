@@ -0,0 +1,30 @@
+"""Shared fixtures for the dasmdf test suite."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def run_dasmdf(tmp_path):
+    """Run ``python -m dasmdf`` in a fresh interpreter inside tmp_path."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH")])
+    )
+    env["DASMDF_CACHE_DIR"] = str(tmp_path / "cache")
+    env.pop("QT_HASH_SEED", None)
+
+    def run(*args, cwd=tmp_path, **settings):
+        return subprocess.run(
+            [sys.executable, "-m", "dasmdf", *args], cwd=cwd,
+            env={**env, **settings}, capture_output=True, text=True,
+            timeout=300
+        )
+    return run
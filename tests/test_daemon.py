@@ -0,0 +1,93 @@
+"""The daemon renders each request as its client would in-process."""
+
+import threading
+import time
+
+import pytest
+
+from dasmdf import daemon
+
+pytest.importorskip("PyQt6.QtGui")
+pypdf = pytest.importorskip("pypdf")
+
+pytestmark = pytest.mark.skipif(
+    not daemon.supported(), reason="needs Unix domain sockets"
+)
+
+
+@pytest.fixture
+def served(tmp_path, run_dasmdf):
+    """Start a daemon in a directory of its own; yield its socket."""
+    socket_path = str(tmp_path / "d.sock")
+    (tmp_path / "elsewhere").mkdir()
+    thread = threading.Thread(target=run_dasmdf, args=(
+        "daemon", "--socket", socket_path, "--idle-timeout", "60"
+    ), kwargs={"cwd": tmp_path / "elsewhere"})
+    thread.start()
+    deadline = time.monotonic() + daemon.START_TIMEOUT
+    while daemon.ping(socket_path) is None:
+        assert time.monotonic() < deadline, "the daemon did not start"
+        time.sleep(0.05)
+    yield socket_path
+    run_dasmdf("daemon", "--stop", "--socket", socket_path)
+    thread.join()
+
+
+def _write_document(directory):
+    """Write a markdown file showing an image next to it."""
+    from PyQt6.QtGui import QColor, QImage
+
+    directory.mkdir()
+    image = QImage(32, 32, QImage.Format.Format_RGB32)
+    image.fill(QColor("red"))
+    assert image.save(str(directory / "pic.png"))
+    (directory / "doc.md").write_text("# Doc\n\n![pic](pic.png)\n")
+
+
+def test_images_resolve_against_the_input_directory(
+        tmp_path, run_dasmdf, served):
+    _write_document(tmp_path / "docs")
+    result = run_dasmdf(
+        "convert", "docs/doc.md", "-e", "qt-draft", "--socket", served
+    )
+    assert result.returncode == 0, result.stderr
+    reader = pypdf.PdfReader(tmp_path / "docs" / "doc.pdf")
+    assert len(reader.pages[0].images) == 1
+
+
+def test_settings_apply_to_each_request(tmp_path, run_dasmdf, served):
+    _write_document(tmp_path / "docs")
+    args = ("convert", "docs/doc.md", "-e", "qt-draft", "--socket", served)
+    result = run_dasmdf(*args, DASMDF_PARSER="missing")
+    assert result.returncode == 1
+    assert "parser not available: missing" in result.stderr
+    result = run_dasmdf(*args)
+    assert result.returncode == 0, result.stderr
+
+
+def _write_dot(path):
+    """Write a stand-in for Graphviz that logs each run next to itself.
+
+    It rejects every diagram, which leaves the fence as code.
+    """
+    path.write_text("#!/bin/sh\necho run >> \"$0.log\"\nexit 1\n")
+    path.chmod(0o755)
+    return path
+
+
+def test_settings_apply_to_large_documents(tmp_path, run_dasmdf, served):
+    from dasmdf import guard
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    # Over ISOLATE_SIZE, so the daemon parses it in a helper process
+    (docs / "doc.md").write_text(
+        "```dot\ndigraph { a -> b }\n```\n\n"
+        + "Some text.\n\n" * (guard.ISOLATE_SIZE // 10)
+    )
+    args = ("convert", "docs/doc.md", "-e", "qt-draft", "--socket", served)
+    for name in ("first", "second"):
+        dot = _write_dot(tmp_path / name)
+        result = run_dasmdf(*args, DASMDF_DOT=str(dot))
+        assert result.returncode == 0, result.stderr
+        assert (tmp_path / f"{name}.log").read_text() == "run\n"
@@ -0,0 +1,112 @@
+"""Typing in a long document must stay fast with highlighting on."""
+
+import os
+import statistics
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+
+pytest.importorskip("PyQt6.QtWidgets")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Appended so the dasmdf package still wins over pyqt6_version/dasmdf.py
+sys.path.append(str(ROOT / "pyqt6_version"))
+
+from PyQt6.QtCore import Qt  # noqa: E402
+from PyQt6.QtGui import QTextCursor  # noqa: E402
+from PyQt6.QtTest import QTest  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QPlainTextEdit  # noqa: E402
+
+from highlighter import MarkdownHighlighter  # noqa: E402
+
+LINES = 50000
+KEYSTROKES = 200
+# Milliseconds per keystroke, repaint included. Typing measured about
+# 2 ms median here; QTextEdit, the editor before, took about 25 ms
+MEDIAN_LIMIT = 10.0
+WORST_LIMIT = 100.0
+
+SECTION = """## Section {n}
+
+Some *emphasis*, **strong** text, `code` and a [link](http://x/{n}).
+
+| a | b |
+|---|---|
+| 1 | $x^{n}$ |
+
+```python
+def f{n}(x):
+    return x * {n}
+```
+"""
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture(scope="module")
+def editor(app):
+    """The editor's widget set-up, holding a LINES-line document."""
+    widget = QPlainTextEdit()
+    widget.highlighter = MarkdownHighlighter(widget.document())
+    sections = []
+    while len(sections) * SECTION.count("\n") < LINES:
+        sections.append(SECTION.format(n=len(sections)))
+    widget.setPlainText("\n".join(sections))
+    widget.resize(800, 600)
+    widget.show()
+    app.processEvents()
+    yield widget
+    widget.close()
+
+
+def _type(app, editor, block, text):
+    """Type ``text`` at the end of line ``block``; return ms per key."""
+    cursor = QTextCursor(editor.document().findBlockByNumber(block))
+    cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock)
+    editor.setTextCursor(cursor)
+    editor.ensureCursorVisible()
+    app.processEvents()
+    times = []
+    for char in text:
+        start = time.perf_counter()
+        QTest.keyClick(editor, char)
+        app.processEvents()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+@pytest.mark.parametrize("where", ["prose", "fenced code"])
+def test_keystroke_latency(app, editor, where):
+    count = editor.document().blockCount()
+    assert count >= LINES
+    # The middle of the file, on a prose line or inside a fenced block
+    block = count // 2
+    while True:
+        text = editor.document().findBlockByNumber(block).text()
+        if (where == "prose") == text.startswith("Some"):
+            if where == "prose" or text.startswith("    return"):
+                break
+        block += 1
+
+    times = _type(app, editor, block, ("typing *a* `b` " * 20)[:KEYSTROKES])
+    assert statistics.median(times) < MEDIAN_LIMIT, times
+    assert max(times) < WORST_LIMIT, times
+
+
+def test_opening_a_fence_restyles_following_lines(app, editor):
+    """Highlighting state still propagates where it has to."""
+    document = editor.document()
+    block = document.blockCount() // 3
+    while not document.findBlockByNumber(block).text().startswith("Some"):
+        block += 1
+    cursor = QTextCursor(document.findBlockByNumber(block))
+    editor.setTextCursor(cursor)
+    QTest.keyClicks(editor, "```")
+    QTest.keyClick(editor, Qt.Key.Key_Return)
+    app.processEvents()
+    assert document.findBlockByNumber(block + 2).userState() > 0
@@ -0,0 +1,37 @@
+"""The input guard defuses what stalls parsers and leaves the rest."""
+
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+from dasmdf import guard
+
+# A library script without a ``__main__`` guard
+SCRIPT = """
+import dasmdf
+
+body = dasmdf.render_html("Some *text* here.\\n\\n" * 1000)
+print(body.count("<em>"))
+"""
+
+
+def test_defuse_only_touches_runs_over_the_limits():
+    glossary = "- **term**: `a*b` and *em*\n" * guard.MAX_SPAN_MARKS
+    assert guard.defuse(glossary) == glossary
+    run = "Text `a*b` " + "*a " * (guard.MAX_SPAN_MARKS + 1) + "\n"
+    defused = guard.defuse(run)
+    assert "*a" not in defused and "`a*b`" in defused
+
+
+def test_library_scripts_parse_large_documents_in_process(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text(SCRIPT, encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=str(ROOT),
+               DASMDF_CACHE_DIR=str(tmp_path / "cache"))
+    result = subprocess.run(
+        [sys.executable, str(script)], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=300
+    )
+    assert result.stdout.strip() == "1000", result.stderr
+    assert result.stderr == ""
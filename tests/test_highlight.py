@@ -0,0 +1,55 @@
+"""Code is highlighted even where worker processes cannot run."""
+
+import os
+import subprocess
+import sys
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+
+from conftest import ROOT
+from dasmdf import highlight
+
+# A library script without a ``__main__`` guard, so the pool's workers
+# cannot start
+SCRIPT = """
+import dasmdf
+
+md = "".join(f"```python\\nx = {i}\\n```\\n\\n" for i in range(20))
+print(dasmdf.render_html(md).count('class="codehilite"'))
+"""
+
+
+class _BrokenPool:
+    def map(self, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def test_broken_pool_falls_back_in_process(monkeypatch):
+    monkeypatch.setattr(highlight, "_pool", _BrokenPool())
+    monkeypatch.setattr(highlight, "_pool_broken", False)
+    blocks = [
+        ("python", f"x = '{uuid.uuid4()}'")
+        for _ in range(highlight.PARALLEL_THRESHOLD)
+    ]
+    highlight.prehighlight(blocks, {})
+    lexer = highlight.get_lexer("python")
+    for _, code in blocks:
+        key = highlight.cache_key(code, lexer, {})
+        assert highlight._highlight_cache.get(key) is not None
+    assert highlight._get_pool() is None
+
+
+def test_unguarded_scripts_highlight_in_process(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text(SCRIPT, encoding="utf-8")
+    env = dict(os.environ, PYTHONPATH=str(ROOT),
+               DASMDF_CACHE_DIR=str(tmp_path / "cache"))
+    result = subprocess.run(
+        [sys.executable, str(script)], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "20"
@@ -0,0 +1,36 @@
+"""A conversion that fails never costs the user the PDF already there."""
+
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Times a render out, then waits for the cancelled render to stop
+SCRIPT = """
+import threading
+from dasmdf import ConversionJob, Converter
+
+with Converter() as converter:
+    for event in converter.iter_convert(ConversionJob(
+            "# Heading\\n\\ntext\\n" * 3000, "doc.pdf", "qt-draft",
+            timeouts={"qt-draft": 0.01})):
+        pass
+    print(event.stage)
+    for thread in threading.enumerate():
+        if thread.name == "dasmdf-render":
+            thread.join()
+"""
+
+
+def test_timeout_keeps_the_existing_pdf(tmp_path):
+    (tmp_path / "doc.pdf").write_bytes(b"previous")
+    env = dict(os.environ, PYTHONPATH=str(ROOT),
+               DASMDF_CACHE_DIR=str(tmp_path / "cache"))
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=300
+    )
+    assert result.stdout.strip() == "failed", result.stderr
+    assert (tmp_path / "doc.pdf").read_bytes() == b"previous"
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".part"] == []
@@ -0,0 +1,25 @@
+"""The default parser keeps documents rendering as they always have."""
+
+import pytest
+
+from conftest import ROOT
+from dasmdf import parsers
+
+
+def test_markdown2_is_the_default(monkeypatch):
+    monkeypatch.delenv("DASMDF_PARSER", raising=False)
+    assert parsers.get_parser().name == "markdown2"
+
+
+def test_markdown_it_differs_only_on_commonmark_lists():
+    if not parsers.PARSERS["markdown-it"].available():
+        pytest.skip("markdown-it-py is not installed")
+    corpus = {
+        **parsers.CORPUS,
+        **parsers.read_corpus([str(ROOT / "README.md")]),
+    }
+    differing = {
+        doc for doc, diff in parsers.compare("markdown-it", corpus=corpus)
+        .items() if diff is not None
+    }
+    assert differing == {"loose-list", "paren-list", str(ROOT / "README.md")}
@@ -0,0 +1,48 @@
+"""Killing a worker also kills the engine processes it started."""
+
+import os
+import sys
+import time
+
+import pytest
+
+from dasmdf import ConversionJob
+from dasmdf.pool import WorkerPool
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="reads /proc"
+)
+
+HANGING_ENGINE = """#!/bin/sh
+echo $$ > "{pid_file}"
+exec sleep 300
+"""
+
+
+def _running(pid):
+    """Whether ``pid`` exists and is not a zombie waiting to be reaped."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return not any(line.startswith("State:\tZ") for line in f)
+    except FileNotFoundError:
+        return False
+
+
+def test_timeout_kills_the_engine_process(tmp_path):
+    pid_file = tmp_path / "engine.pid"
+    engine = tmp_path / "wkhtmltopdf"
+    engine.write_text(HANGING_ENGINE.format(pid_file=pid_file))
+    engine.chmod(0o755)
+
+    with WorkerPool(1, wkhtmltopdf_path=str(engine), timeout=2) as pool:
+        events = list(pool.iter_convert(
+            ConversionJob("# x", str(tmp_path / "x.pdf"), "wkhtml")
+        ))
+    assert events[-1].error_type == "timeout"
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while _running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if _running(pid):
+        os.kill(pid, 9)
+        pytest.fail("the engine process outlived its worker")
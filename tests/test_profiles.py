@@ -0,0 +1,20 @@
+"""Quality profiles reach the engines and the names of outputs."""
+
+from dasmdf import ConversionJob
+from dasmdf.profiles import get_profile
+from dasmdf.variants import expand_variants, variant_jobs
+
+
+def test_draft_lowers_image_resolution_for_every_engine():
+    draft = get_profile("draft")
+    assert draft.wkhtml["image-dpi"] < 300
+    assert draft.weasyprint["dpi"] < 300
+    assert draft.key() != get_profile("final").key()
+
+
+def test_variant_names_can_include_the_profile(tmp_path):
+    job = ConversionJob("# x", str(tmp_path / "notes.pdf"), profile="draft")
+    jobs = variant_jobs(
+        job, expand_variants(["A4"]), "{stem}.{variant}.{profile}.pdf"
+    )
+    assert jobs[0].output_path == str(tmp_path / "notes.A4.draft.pdf")
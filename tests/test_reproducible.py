@@ -0,0 +1,47 @@
+"""Reproducible output must not depend on the process that rendered it."""
+
+import pytest
+
+DOCUMENT = """# Reproducible
+
+Some *italic*, **bold** and `monospaced` text.
+
+```python
+print("hello")
+```
+
+| a | b |
+|---|---|
+| 1 | 2 |
+"""
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_text(DOCUMENT, encoding="utf-8")
+    return path
+
+
+def test_qt_draft_builds_match_across_processes(tmp_path, document,
+                                                run_dasmdf):
+    pytest.importorskip("PyQt6.QtGui")
+    for name in ("a.pdf", "b.pdf"):
+        result = run_dasmdf(
+            "convert", str(document), "-o", name, "-e", "qt-draft",
+            "--reproducible", "--no-daemon", "-q"
+        )
+        assert result.returncode == 0, result.stderr
+    first = (tmp_path / "a.pdf").read_bytes()
+    assert first.startswith(b"%PDF-")
+    assert first == (tmp_path / "b.pdf").read_bytes()
+
+
+def test_verify_passes_for_qt_draft(tmp_path, document, run_dasmdf):
+    pytest.importorskip("PyQt6.QtGui")
+    result = run_dasmdf(
+        "convert", str(document), "-o", "c.pdf", "-e", "qt-draft",
+        "--verify", "--no-daemon"
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Reproducible: both conversions hash to" in result.stderr
@@ -0,0 +1,45 @@
+"""Low-memory rendering splits documents at clean block boundaries."""
+
+from dasmdf.memory import split_markdown
+
+
+def _paragraphs(count, words=50):
+    return "".join(
+        f"Paragraph {i} " + "word " * words + "\n\n" for i in range(count)
+    )
+
+
+def test_splits_at_top_level_headings():
+    doc = "".join(f"# H{i}\n\n" + _paragraphs(5) for i in range(8))
+    parts = split_markdown(doc, 4)
+    assert len(parts) == 4
+    assert all(part.startswith("# H") for part in parts)
+    assert "".join(parts) == doc
+
+
+def test_falls_back_to_lower_headings():
+    doc = "".join(f"### H{i}\n\n" + _paragraphs(5) for i in range(8))
+    parts = split_markdown(doc, 4)
+    assert len(parts) == 4
+    assert all(part.startswith("### H") for part in parts)
+
+
+def test_falls_back_to_paragraphs():
+    doc = _paragraphs(100)
+    parts = split_markdown(doc, 4)
+    assert len(parts) == 4
+    assert all(part.startswith("Paragraph ") for part in parts)
+    assert "".join(parts) == doc
+
+
+def test_keeps_fences_lists_and_setext_headings_whole():
+    fence = "```\n" + "".join(f"line {i}\n\nx\n" for i in range(500))
+    assert len(split_markdown(fence + "```\n", 4)) == 1
+    items = "".join(f"- item {i}\n\n  more\n\n" for i in range(500))
+    assert len(split_markdown(items, 4)) == 1
+    setext = "".join(f"Title {i}\n---\n" for i in range(500))
+    assert len(split_markdown(setext, 4)) == 1
+
+
+def test_reports_an_unsplittable_document_as_one_part():
+    assert split_markdown("word " * 10000, 4) == ["word " * 10000]
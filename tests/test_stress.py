@@ -0,0 +1,34 @@
+"""The stress check tells slow parses from ones that were cut short."""
+
+import pytest
+
+from dasmdf import guard, stress
+from dasmdf.parsers import PARSERS, get_parser
+
+
+@pytest.fixture
+def isolated():
+    """Parse large documents in the guard's helper processes."""
+    guard.isolate_parses()
+    yield
+    guard.isolate_parses(False)
+
+
+def test_default_parser_parses_corpus_linearly(isolated):
+    # Above ISOLATE_SIZE, where the guard parses in a helper process
+    size = guard.ISOLATE_SIZE + 1024
+    results = stress.stress(get_parser().name, size=size)
+    assert results.keys() == stress.CASES.keys()
+    assert {name: r for name, r in results.items() if r[2]} == {}
+
+
+def test_timed_out_parse_is_reported_as_fallback(isolated):
+    if not PARSERS["markdown-it"].available():
+        pytest.skip("no linear-time backend to fall back to")
+    size = guard.ISOLATE_SIZE + 1024
+    results = stress.stress(
+        "markdown2", size=size, timeout=0.001, cases=["emphasis-run"]
+    )
+    _, _, failure = results["emphasis-run"]
+    assert failure.startswith("timed out after 0.001 s, fell back to")
+
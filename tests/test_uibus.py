@@ -0,0 +1,44 @@
+"""The progress bar ends a run at 100% on success and 0% on failure."""
+
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+from dasmdf.jobs import ProgressEvent
+
+pytest.importorskip("PyQt6.QtWidgets")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.append(str(ROOT / "pyqt6_version"))
+
+from PyQt6.QtWidgets import QApplication, QLabel, QProgressBar  # noqa: E402
+
+from uibus import UiUpdateBus  # noqa: E402
+
+
+def _event(stage, progress):
+    return ProgressEvent(0, stage, progress, stage, "qt-draft", "x.pdf", 0.0)
+
+
+def test_final_progress_is_kept_until_the_next_job():
+    app = QApplication.instance() or QApplication([])  # noqa: F841
+    bar = QProgressBar()
+    bus = UiUpdateBus(bar, QLabel())
+
+    bus.post_event("a", _event("render", 0.5))
+    bus._flush()
+    assert bar.value() == 50
+    bus.post_event("a", _event("done", 1.0))
+    bus._flush()
+    assert bar.value() == 100
+    bus.post_status("Ready")
+    bus._flush()
+    assert bar.value() == 100
+
+    bus.post_event("b", _event("render", 0.2))
+    bus._flush()
+    assert bar.value() == 20
+    bus.post_event("b", _event("failed", 0.0))
+    bus._flush()
+    assert bar.value() == 0